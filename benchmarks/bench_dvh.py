@@ -0,0 +1,105 @@
+'''
+Benchmark of the DVH accumulation pipeline in `oncotools.data_elements.dvh`.
+
+Compares the vectorized cumulate / normalize steps with the previous pure-Python
+loops (kept below for reference), for 200, 2,000 and 20,000 bins, and times the
+whole compute_dvh call on a synthetic dose mask with about 10^6 voxels.
+
+Usage (from the repository root, so that oncotools can be imported):
+    python -m benchmarks.bench_dvh
+'''
+
+import timeit
+
+import numpy as np
+
+from oncotools.data_elements import dvh
+from oncotools.data_elements.image import Image
+
+
+def legacy_cumulate_dose(d):
+    ''' Previous dose accumulation: one Python iteration per bin '''
+    for i in range(1, len(d)):
+        d[i] += d[i - 1]
+    return d
+
+
+def legacy_cumulate_volume(v):
+    ''' Previous volume accumulation: one Python iteration per bin '''
+    i = len(v) - 2
+    while i >= 0:
+        v[i] += v[i + 1]
+        i -= 1
+    return v
+
+
+def legacy_cumulative_dvh(hist, voxel_volume):
+    ''' Previous end of compute_dvh: reverse loop, then list comprehension '''
+    dvh_volume_data = np.array(hist) * voxel_volume
+    i = len(dvh_volume_data) - 2
+    while i >= 0:
+        dvh_volume_data[i] += dvh_volume_data[i + 1]
+        i -= 1
+    dvh_volume_data[:] = [v / dvh_volume_data[0] for v in dvh_volume_data]
+    return dvh_volume_data
+
+
+def vectorized_cumulative_dvh(hist, voxel_volume):
+    ''' Current end of compute_dvh: reversed cumsum and in-place normalization '''
+    dvh_volume_data = hist * voxel_volume
+    dvh.cumulate_volume(dvh_volume_data)
+    dvh_volume_data /= dvh_volume_data[0]
+    return dvh_volume_data
+
+
+def synthetic_dose_mask(shape=(100, 100, 100), seed=0):
+    '''
+    Dose values inside a spherical region of a [Z,Y,X] grid
+    '''
+    rng = np.random.RandomState(seed)
+    z, y, x = np.ogrid[:shape[0], :shape[1], :shape[2]]
+    r2 = sum((c - n / 2.0)**2 / (n / 2.0)**2 for c, n in zip((z, y, x), shape))
+    dose_mask = Image()
+    dose_mask.set_image(np.where(r2 <= 1, 7000 * (1.2 - r2) + rng.rand(*shape), 0.0))
+    dose_mask.spacing = [0.1, 0.1, 0.25]
+    return dose_mask
+
+
+def best_of(func, repeat=5, number=1):
+    ''' Best wall-clock time of a few runs, in milliseconds '''
+    return 1000 * min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def run():
+    rng = np.random.RandomState(0)
+    dose_mask = synthetic_dose_mask()
+    print('compute_dvh on {} voxels'.format(np.count_nonzero(dose_mask.data)))
+    header = '{:>8} | {:>12} {:>12} | {:>12} {:>12} | {:>12} {:>12} | {:>12}'
+    print(header.format('bins', 'cum dose old', 'new', 'cum vol old', 'new',
+                        'normalize old', 'new', 'compute_dvh'))
+    for bins in [200, 2000, 20000]:
+        d = rng.rand(bins)
+        v = rng.rand(bins)
+        hist = rng.randint(0, 1000, bins)
+
+        # Vectorized versions must give the same values
+        assert np.allclose(legacy_cumulate_dose(d.copy()), dvh.cumulate_dose(d.copy()))
+        assert np.allclose(legacy_cumulate_volume(v.copy()), dvh.cumulate_volume(v.copy()))
+        assert np.allclose(legacy_cumulative_dvh(hist, 0.0025),
+                           vectorized_cumulative_dvh(hist, 0.0025))
+
+        times = [
+            best_of(lambda: legacy_cumulate_dose(d.copy())),
+            best_of(lambda: dvh.cumulate_dose(d.copy()), number=100),
+            best_of(lambda: legacy_cumulate_volume(v.copy())),
+            best_of(lambda: dvh.cumulate_volume(v.copy()), number=100),
+            best_of(lambda: legacy_cumulative_dvh(hist, 0.0025)),
+            best_of(lambda: vectorized_cumulative_dvh(hist, 0.0025), number=100),
+            best_of(lambda: dvh.compute_dvh(dose_mask=dose_mask, bins=bins)),
+        ]
+        row = '{:>8} | ' + ' | '.join(['{:>10.3f}ms {:>10.3f}ms'] * 3) + ' | {:>10.1f}ms'
+        print(row.format(bins, *times))
+
+
+if __name__ == '__main__':
+    run()
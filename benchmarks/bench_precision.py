@@ -0,0 +1,105 @@
+'''
+Benchmark of the float32 dose pipeline (Dose.dose_dtype).
+
+Maps a synthetic float32 dose grid onto a spherical mask of about 10^6 voxels with
+the default float64 dose values and with float32 dose values, and compares the
+time and memory of the dose mask and DVH computation, as well as the DVH metrics
+(D_v, V_d and statistics) of both pipelines.
+
+Usage (from the repository root, so that oncotools can be imported):
+    python -m benchmarks.bench_precision
+'''
+
+import timeit
+
+import numpy as np
+
+from oncotools.data_elements.dose import Dose
+from oncotools.data_elements.dose_map import compute_dose_mask
+from oncotools.data_elements.dvh import compute_dvh, dose_to_volume, volume_with_dose
+from oncotools.data_elements.image import Mask
+
+
+def synthetic_dose(shape=(120, 160, 160), seed=0):
+    '''
+    Smooth float32 dose grid (in cGy) with some noise, in [Z,Y,X] order
+    '''
+    rng = np.random.RandomState(seed)
+    z, y, x = np.mgrid[:shape[0], :shape[1], :shape[2]].astype(np.float32)
+    data = 7000 * np.exp(-((x - 80)**2 + (y - 80)**2) / 3000.0 - (z - 60)**2 / 2000.0)
+    data += rng.rand(*shape).astype(np.float32) * 50
+    dose = Dose()
+    dose.set_dose(data.astype(np.float32))
+    dose.set_size(shape[::-1])
+    dose.set_spacing([0.25, 0.25, 0.3])
+    dose.set_origin([-20.0, -20.0, -18.0])
+    dose.update_end()
+    dose.origin_modified = True
+    return dose
+
+
+def synthetic_mask(shape=(150, 200, 200)):
+    '''
+    Spherical mask on a finer grid than the dose
+    '''
+    z, y, x = np.ogrid[:shape[0], :shape[1], :shape[2]]
+    r2 = sum((c - n / 2.0)**2 / (n / 2.2)**2 for c, n in zip((z, y, x), shape))
+    mask = Mask()
+    mask.set_image((r2 <= 1).astype(np.uint8))
+    mask.set_spacing([0.15, 0.15, 0.2])
+    mask.set_origin([-15.0, -15.0, -15.0])
+    mask.update_end()
+    return mask
+
+
+def best_of(func, repeat=3):
+    ''' Best wall-clock time of a few runs, in milliseconds '''
+    return 1000 * min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def pipeline(dose, mask, dtype):
+    dose.dose_dtype = dtype
+    dose_mask, _ = compute_dose_mask(dose=dose, mask=mask)
+    (dose_data, volume_data), _ = compute_dvh(dose_mask=dose_mask)
+    return dose_mask, dose_data, volume_data
+
+
+def run():
+    dose, mask = synthetic_dose(), synthetic_mask()
+    print('Dose grid {} ({}), mask with {} voxels'.format(
+        dose.data.shape, dose.data.dtype, mask.count_voxels()))
+
+    results = {}
+    print('{:>8} | {:>14} | {:>12} | {:>14}'.format(
+        'dtype', 'dose mask (ms)', 'DVH (ms)', 'dose mask (MB)'))
+    for dtype in [np.float64, np.float32]:
+        dose_mask, dose_data, volume_data = pipeline(dose, mask, dtype)
+        results[dtype] = dose_mask, dose_data, volume_data
+        t_mask = best_of(lambda: compute_dose_mask(dose=dose, mask=mask))
+        t_dvh = best_of(lambda: compute_dvh(dose_mask=dose_mask))
+        print('{:>8} | {:>14.1f} | {:>12.1f} | {:>14.1f}'.format(
+            np.dtype(dtype).name, t_mask, t_dvh, dose_mask.data.nbytes / 1e6))
+
+    # Accuracy of the float32 pipeline, relative to float64
+    mask64, dose64, volume64 = results[np.float64]
+    mask32, dose32, volume32 = results[np.float32]
+    values64 = mask64.data[mask64.data.nonzero()]
+    values32 = mask32.data[mask32.data.nonzero()].astype(np.float64)
+    print('\nMax voxel dose difference: {:.3g} cGy'.format(np.max(np.abs(values64 - values32))))
+    print('{:>10} | {:>14} | {:>14} | {:>12}'.format('metric', 'float64', 'float32', 'difference'))
+    rows = [
+        ('mean', values64.mean(), values32.mean()),
+        ('std', values64.std(), values32.std()),
+    ]
+    for v in [0.98, 0.95, 0.5, 0.05, 0.02]:
+        rows.append(('D{:g}'.format(100 * v), dose_to_volume(dose64, volume64, v),
+                     dose_to_volume(dose32, volume32, v)))
+    for d in [1000, 2000, 4000, 6000]:
+        rows.append(('V{:g}'.format(d), volume_with_dose(dose64, volume64, d),
+                     volume_with_dose(dose32, volume32, d)))
+    for name, a, b in rows:
+        print('{:>10} | {:>14.6f} | {:>14.6f} | {:>12.3g}'.format(name, a, b, abs(a - b)))
+
+
+if __name__ == '__main__':
+    run()
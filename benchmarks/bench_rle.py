@@ -0,0 +1,89 @@
+'''
+Round-trip benchmark of the run-length codec for Oncospace binary masks.
+
+Compares the vectorized encoder/decoder in `oncotools.data_elements.image`
+with the previous implementation (kept below for reference) on synthetic
+ellipsoid masks of increasing size, on a typical 512 x 512 x 150 grid.
+
+Usage (from the repository root, so that oncotools can be imported):
+    python -m benchmarks.bench_rle
+'''
+
+import timeit
+
+import numpy as np
+
+from oncotools.data_elements import image
+
+
+def legacy_run_length_encode(mask):
+    ''' Previous encoder: diff over a copy of the whole buffer '''
+    maskdata = np.concatenate(([1], mask.data.flatten()))
+    runlength = np.nonzero(np.diff(maskdata))
+    return ','.join(map(str, runlength[0]))
+
+
+def legacy_run_length_decode(runlength, dimZYX):
+    ''' Previous decoder: one Python iteration per run '''
+    cutpoints = np.array(runlength.split(','), dtype=np.int32)
+    startpoints = cutpoints[1::2]
+    endpoints = cutpoints[2::2]
+    mybuffer = np.zeros(int(np.prod(dimZYX)), dtype=np.dtype('b'))
+    for s, e in zip(startpoints, endpoints):
+        mybuffer[s:e] = True
+    mybuffer = mybuffer.reshape([int(d) for d in dimZYX])
+    msk = image.Mask()
+    msk.set_image(mybuffer)
+    return msk
+
+
+def ellipsoid_mask(shape, radii):
+    '''
+    Binary ellipsoid in the center of a [Z,Y,X] grid
+    '''
+    z, y, x = np.ogrid[:shape[0], :shape[1], :shape[2]]
+    center = [s / 2.0 for s in shape]
+    data = ((z - center[0]) / radii[0])**2 \
+        + ((y - center[1]) / radii[1])**2 \
+        + ((x - center[2]) / radii[2])**2 <= 1
+    msk = image.Mask()
+    msk.set_image(data.astype(np.dtype('b')))
+    return msk
+
+
+def best_of(func, repeat=3):
+    ''' Best wall-clock time of a few runs, in milliseconds '''
+    return 1000 * min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def run(shape=(150, 512, 512)):
+    print('Grid: {} voxels (Z,Y,X = {})'.format(int(np.prod(shape)), shape))
+    header = '{:>10} {:>8} | {:>10} {:>10} | {:>10} {:>10} {:>10} {:>10}'
+    print(header.format('voxels', 'runs', 'enc old', 'enc new',
+                        'dec old', 'dense', 'cropped', 'packed'))
+    for radius in [4, 16, 64, 128]:
+        msk = ellipsoid_mask(shape, (min(radius, shape[0] / 2 - 1), radius, radius))
+        runlength = image.run_length_encode(msk)
+
+        # Round trip must be exact for every representation
+        assert runlength == legacy_run_length_encode(msk)
+        assert np.array_equal(legacy_run_length_decode(runlength, shape).data, msk.data)
+        for representation in ['dense', 'cropped', 'packed']:
+            decoded = image.run_length_decode(runlength, shape, representation)
+            assert np.array_equal(decoded.data != 0, msk.data != 0)
+
+        times = [
+            best_of(lambda: legacy_run_length_encode(msk)),
+            best_of(lambda: image.run_length_encode(msk)),
+            best_of(lambda: legacy_run_length_decode(runlength, shape)),
+        ] + [
+            best_of(lambda: image.run_length_decode(runlength, shape, r))
+            for r in ['dense', 'cropped', 'packed']
+        ]
+        row = '{:>10} {:>8} | ' + ' '.join(['{:>8.1f}ms'] * 2) + ' | ' \
+            + ' '.join(['{:>8.1f}ms'] * 4)
+        print(row.format(msk.count_voxels(), runlength.count(',') // 2, *times))
+
+
+if __name__ == '__main__':
+    run()
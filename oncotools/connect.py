@@ -208,20 +208,22 @@ class DatabaseManager(object):
         except:
             raise KeyError('Connection not found')
 
-    def run(self, dbname, query):
+    def run(self, dbname, query, params=None):
         '''
         Run a query on a database.
 
         Positional arguments:
             :dbname:    name of the database connection to use
             :query:     query to perform
+        Keyword arguments:
+            :params:    sequence of values for the '?' parameters of the query
         Returns:
             Query results stored in a Results object
         Raises:
             :KeyError:  if connection name was not found
         '''
         try:
-            return self.__conn[dbname].run(query)
+            return self.__conn[dbname].run(query, params=params)
         except:
             raise KeyError('Connection not found')
 
@@ -373,19 +375,49 @@ class Database(object):
         '''
         self.__conn.close()
 
-    def run(self, query):
+    def run(self, query, params=None):
         '''
         Run a query on a database
 
         Positional arguments:
             :query:     query to perform
+        Keyword arguments:
+            :params:    sequence of values for the '?' parameters of the query
         Return:
             query results stored in a Results object
         '''
         cursor = self.__conn.cursor()
-        cursor.execute(query)
+        if params is None:
+            cursor.execute(query)
+        else:
+            cursor.execute(query, params)
         return Results(cursor)
 
+    def iterate(self, query, params=None, chunk_size=10000):
+        '''
+        Run a query on a database and iterate over the resulting rows, fetching
+        them from the server chunk_size rows at a time instead of all at once.
+
+        Positional arguments:
+            :query:         query to perform
+        Keyword arguments:
+            :params:        sequence of values for the '?' parameters of the query
+            :chunk_size:    number of rows fetched at a time
+        Returns:
+            generator of pyodbc rows
+        '''
+        cursor = self.__conn.cursor()
+        if params is None:
+            cursor.execute(query)
+        else:
+            cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+
     def execute(self, query, params=None):
         '''
         Execute a statement on a database
@@ -5,7 +5,7 @@ Module to facilitate dose mapping from dose grid to mask
 from copy import deepcopy
 
 import numpy as np
-from .image import Image, Mask
+from .image import Image, Mask, LabelMap
 from .dose import Dose
 
 
@@ -26,87 +26,118 @@ def compute_dose_mask(dose=None, roi=None, mask=None):
     if mask is None:
         raise ValueError('Must provide ROI or mask')
 
-    mask_voxel_indices = np.transpose(mask.data.nonzero())
-    if len(mask_voxel_indices[0]) < 1:
+    mask_voxel_indices = np.transpose(mask.nonzero_indices())
+    if len(mask_voxel_indices) < 1:
         raise ValueError('ROI Binary mask has a volume of 0 cm^3')
 
-    # All remaining indices and point coordinates in [x,y,z]
-    mask_voxel_indices_xyz = mask_voxel_indices[:, ::-1]
-    mask_voxel_points = mask.transform_index_to_physical_point(
-        mask_voxel_indices_xyz)
-    dose_voxel_indices, inbounds = dose.transform_physical_point_to_continuous_index(
-        mask_voxel_points)
+    dose_data, inbounds = interpolate_dose(dose, mask, mask_voxel_indices)
+    return _make_dose_mask(mask, mask_voxel_indices, dose_data, inbounds)
+
+
+def compute_dose_masks(dose, masks):
+    '''
+    Look up the dose values of several binary masks that share the same geometry.
+
+    The dose grid is interpolated once over the union of the masks, instead of once
+    per mask, and the dose values of each mask are then gathered from the union.
+
+    Positional arguments:
+        :dose:  dose grid
+        :masks: list of masks with the same origin, size and spacing
+    Returns:
+        List of (dose mask, fraction outside dose grid) tuples, one per mask,
+        identical to the output of compute_dose_mask for each mask.
+    Raises:
+        :ValueError:    if the masks do not share the same geometry
+    '''
+    if dose is None:
+        raise ValueError('DVH computation requires a dose grid.')
+    if len(masks) == 0:
+        return []
+    check_mask_geometry(masks)
+
+    # Flat indices of every mask, and their union
+    template = masks[0]
+    shape = tuple(int(n) for n in np.asarray(template.size[::-1]))
+    flat_indices = []
+    for m in masks:
+        flat = np.ravel_multi_index(m.nonzero_indices(), shape)
+        if flat.size < 1:
+            raise ValueError('ROI Binary mask has a volume of 0 cm^3')
+        flat_indices.append(flat)
+    union, inverse = np.unique(np.concatenate(flat_indices), return_inverse=True)
+    union_voxel_indices = np.transpose(np.unravel_index(union, shape))
+
+    # Interpolate once, over the union of all masks
+    union_dose_data, union_inbounds = interpolate_dose(dose, template, union_voxel_indices)
+    union_dose = np.zeros(len(union_voxel_indices), dtype=union_dose_data.dtype)
+    union_dose[union_inbounds] = union_dose_data
+
+    # Split the results back into each mask
+    dose_masks = []
+    offset = 0
+    for m, flat in zip(masks, flat_indices):
+        i = inverse[offset:offset + flat.size]
+        offset += flat.size
+        inbounds = union_inbounds[i]
+        if not np.any(inbounds):
+            raise ValueError('ROI lies entirely outside the dose grid')
+        dose_data = union_dose[i][inbounds]
+        mask_voxel_indices = union_voxel_indices[i]
+        dose_masks.append(_make_dose_mask(m, mask_voxel_indices, dose_data, inbounds))
+    return dose_masks
+
+
+def correct_dose_grid_origin(mask, dose):
+    '''
+    Fix the dose grid origin to account for Pinnacle's LH coordinates.
+    The dose grid is modified in place and marked as corrected.
 
+    Positional arguments:
+        :mask:  mask in the patient representation of the dose grid
+        :dose:  dose grid
+    '''
+    # Recompute origin y coordinate
+    new_y_o = (
+        mask.origin[1] + mask.size[1] * mask.spacing[1]) - (
+            dose.origin[1] - mask.origin[1]) - (
+                dose.size[1] * dose.spacing[1])
+    dose.origin[1] = new_y_o
+    # Mark the dose grid as modified
+    dose.origin_modified = True
+
+
+def check_mask_geometry(masks):
+    '''
+    Check that all masks share the same origin, size and spacing.
+
+    Positional arguments:
+        :masks: list of masks
+    Raises:
+        :ValueError:    if mask specifications do not match
+    '''
+    for field in ['origin', 'size', 'spacing']:
+        values = set([str(list(np.asarray(getattr(m, field), dtype=float)))
+                      for m in masks])
+        if len(values) != 1:
+            raise ValueError('Too many different values for field, {}: {}'.
+                             format(field, list(values)))
+
+
+def _make_dose_mask(mask, mask_voxel_indices, dose_data, inbounds):
+    '''
+    Helper function: store the interpolated dose values in an image with the
+    geometry of the mask
+    '''
     # How much of the ROI is outside the dose grid?
     fraction_outside_dosegrid = 0.0
     if np.any(~inbounds):
         fraction_outside_dosegrid = 1.0 - float(len(inbounds.nonzero()[0])) / len(inbounds)
         mask_voxel_indices = mask_voxel_indices[inbounds, :]
-        mask_voxel_indices_xyz = mask_voxel_indices_xyz[inbounds, :]
-        dose_voxel_indices = dose_voxel_indices[inbounds, :]
-
-    mask_slice_indices, i = np.unique(
-        mask_voxel_indices_xyz[:, -1], return_index=True)
-    if len(mask_slice_indices) < 1:
-        raise ValueError('ROI lies entirely outside the dose grid')
-    dose_slice_indices = dose_voxel_indices[i, -1]
-
-    # 2. Interpolate dose grid at binary mask slices
-    # 2a. Reslice the dose grid into the planes of the binary mask
-    dose_resliced = Dose()
-    dose_resliced.copy_information(dose)
-    dose_resliced.origin[2] = mask.origin[2]
-    dose_resliced.size[2] = mask_slice_indices[-1] + 1
-    dose_resliced.spacing[2] = mask.spacing[2]
-    dose_resliced.fill_buffer(0.0)
-
-    lower_idx = np.floor(dose_voxel_indices.min(0)).astype(np.int_)
-    lower_idx = [li if li >= 0 else 0 for li in lower_idx]
-    upper_idx = np.ceil(dose_voxel_indices.max(0)).astype(np.int_)
-    upper_idx = [
-        ui if ui < mask.size[i] else mask.size[i] - 1
-        for i, ui in enumerate(upper_idx)
-    ]
-    ix = np.arange(lower_idx[0], upper_idx[0] + 1)
-    iy = np.arange(lower_idx[1], upper_idx[1] + 1)
-    iz = dose_slice_indices
-    dose_resliced.data[mask_slice_indices, iy[0]:(iy[-1]+1), ix[0]:(ix[-1]+1)] = \
-        dose.interpolate_slice(ix, iy, iz)
-
-    # 2b. Bilinear interpolation of voxels from the resliced dose grid
-    ix = dose_voxel_indices[:, 0]
-    ix0 = np.floor(ix).astype(np.int_)
-    ix1 = ix0 + 1
-    ix1[ix1 == dose_resliced.data.shape[
-        2]] -= 1  # Allow ROI binary mask voxels to fall on the edge of the dose grid
-    iy = dose_voxel_indices[:, 1]
-    iy0 = np.floor(iy).astype(np.int_)
-    iy1 = iy0 + 1
-    iy1[iy1 == dose_resliced.data.shape[
-        1]] -= 1  # Allow ROI binary mask voxels to fall on the edge of the dose grid
-    iz = mask_voxel_indices_xyz[:, 2]
-
-    if np.any(ix0 < 0) or np.any(ix1 >= dose_resliced.data.shape[2]) \
-    or np.any(iy0 < 0) or np.any(iy1 >= dose_resliced.data.shape[1]) \
-    or np.any(iz < 0) or np.any(iz >= dose_resliced.data.shape[0]):
-        try:
-            _ = dose_resliced.data[iz, iy0,
-                                      ix0] + dose_resliced.data[iz, iy1, ix1]
-        except Exception as e:
-            raise Exception(
-                'The ROI binary mask extends outside the dose grid.\n' +
-                str(e))
-
-    # Compute the dose data by interpolation
-    dose_data = \
-        dose_resliced.data[iz, iy0, ix0] * (ix1 - ix) * (iy1 - iy) + \
-        dose_resliced.data[iz, iy0, ix1] * (ix - ix0) * (iy1 - iy) + \
-        dose_resliced.data[iz, iy1, ix0] * (ix1 - ix) * (iy - iy0) + \
-        dose_resliced.data[iz, iy1, ix1] * (ix - ix0) * (iy - iy0)
 
     dose_mask = Image()
     dose_mask.copy_information(mask)
-    dose_mask.fill_buffer(0.0)
+    dose_mask.fill_buffer(0.0, dtype=dose_data.dtype)
     try:
         mi = mask_voxel_indices
         dose_mask.data[mi[:, 0], mi[:, 1], mi[:, 2]] = dose_data
@@ -116,6 +147,36 @@ def compute_dose_mask(dose=None, roi=None, mask=None):
     return dose_mask, fraction_outside_dosegrid
 
 
+def interpolate_dose(dose, mask, mask_voxel_indices):
+    '''
+    Interpolate the dose grid at the given mask voxels.
+
+    The dose is sampled directly by trilinear interpolation (see Dose.sample).
+
+    Positional arguments:
+        :dose:                  dose grid
+        :mask:                  image defining the geometry of the voxel indices
+        :mask_voxel_indices:    N x 3 array of [Z,Y,X] voxel indices
+    Returns:
+        :dose_data: dose values at the voxels inside the dose grid, of type dose.dose_dtype
+        :inbounds:  boolean array marking the voxels inside the dose grid
+    '''
+    # All remaining indices and point coordinates in [x,y,z]
+    mask_voxel_points = mask.transform_index_to_physical_point(
+        mask_voxel_indices[:, ::-1])
+    dose_voxel_indices, inbounds = dose.transform_physical_point_to_continuous_index(
+        mask_voxel_points)
+
+    if np.any(~inbounds):
+        dose_voxel_indices = dose_voxel_indices[inbounds, :]
+
+    if len(dose_voxel_indices) < 1:
+        raise ValueError('ROI lies entirely outside the dose grid')
+
+    # Gather the eight neighbors of every voxel from the dose grid
+    return dose.sample(dose_voxel_indices, dtype=dose.dose_dtype), inbounds
+
+
 class DoseMask(Mask):
     '''
     The DoseMask class is an extension of the mask class.
@@ -128,9 +189,13 @@ class DoseMask(Mask):
     Positional arguments:
         :msk:   mask object to map dose onto
         :dsg:   dose grid
+    Keyword arguments:
+        :precomputed:   (dose mask, fraction outside dose grid) tuple, as returned by
+            compute_dose_mask, to skip the dose interpolation (see DoseMask.from_masks)
+        :exact:         compute an exact DVH from the sorted voxel doses (see compute_dvh)
     '''
 
-    def __init__(self, msk, dsg, dim=3):
+    def __init__(self, msk, dsg, dim=3, precomputed=None, exact=False):
         Mask.__init__(self, dim=3)
         self.mask = deepcopy(msk)
         self.dose = dsg
@@ -141,23 +206,43 @@ class DoseMask(Mask):
             self.__correct_dg_origin()
 
         self.data = None
+        self.precomputed = precomputed
+        # Sorted voxel doses and cumulative volumes of an exact DVH
+        self.sorted_dose = None
+        self.sorted_volume = None
         # Compute the dose mask
         self.compute_dose_mask()
         # Update the information
         self.copy_information(self.mask)
         # self.map_points(self.__dose_data)
 
-        self.compute_dvh()
+        self.compute_dvh(exact=exact)
+
+    @classmethod
+    def from_masks(cls, masks, dsg, exact=False):
+        '''
+        Create the dose masks of several masks that share the same geometry.
+
+        The dose grid is interpolated only once, over the union of the masks
+        (see compute_dose_masks).
+
+        Positional arguments:
+            :masks: list of masks with the same origin, size and spacing
+            :dsg:   dose grid
+        Keyword arguments:
+            :exact: compute exact DVHs from the sorted voxel doses
+        Returns:
+            List of DoseMask objects, one per mask
+        '''
+        if len(masks) == 0:
+            return []
+        if not dsg.origin_modified:
+            correct_dose_grid_origin(masks[0], dsg)
+        return [cls(m, dsg, precomputed=p, exact=exact)
+                for m, p in zip(masks, compute_dose_masks(dsg, masks))]
 
     def __correct_dg_origin(self):
-        # Recompute origin y coordinate
-        new_y_o = (
-            self.mask.origin[1] + self.mask.size[1] * self.mask.spacing[1]) - (
-                self.dose.origin[1] - self.mask.origin[1]) - (
-                    self.dose.size[1] * self.dose.spacing[1])
-        self.dose.origin[1] = new_y_o
-        # Mark the dose grid as modified
-        self.dose.origin_modified = True
+        correct_dose_grid_origin(self.mask, self.dose)
 
     def __str__(self):
         outputStr = Image.__str__(self) + '\n' \
@@ -174,16 +259,20 @@ class DoseMask(Mask):
         Returns:
             List of dose values corresponding to each nonzero index in the mask
         '''
-        dose_mask, self.fraction_outside_dosegrid = \
-            compute_dose_mask(dose=self.dose, mask=self.mask)
+        if getattr(self, 'precomputed', None) is not None:
+            dose_mask, self.fraction_outside_dosegrid = self.precomputed
+            self.precomputed = None
+        else:
+            dose_mask, self.fraction_outside_dosegrid = \
+                compute_dose_mask(dose=self.dose, mask=self.mask)
         self.data = dose_mask.data
 
         # Compute and store dose statistics
         nonzero_data = self.data[np.nonzero(self.data)]
         self.min_dose = nonzero_data.min()
         self.max_dose = nonzero_data.max()
-        self.mean_dose = nonzero_data.mean()
-        self.std_dose = nonzero_data.std()
+        self.mean_dose = nonzero_data.mean(dtype=np.float64)
+        self.std_dose = nonzero_data.std(dtype=np.float64)
 
         return self
 
@@ -205,14 +294,19 @@ class DoseMask(Mask):
             pt = [points[j][i] for j in range(3)]
             self.data[pt[0]][pt[1]][pt[2]] = dosePts[i]
 
-    def compute_dvh(self, edge_voxel_weight=1.0, bins=200):
+    def compute_dvh(self, edge_voxel_weight=1.0, bins=200, exact=False):
         '''
         Compute a DVH curve for the given ROI from the given dose grid.
 
+        With exact=True, the DVH has one point per voxel: the sorted voxel doses are
+        kept in self.sorted_dose and self.sorted_volume, and dose / volume lookups are
+        answered exactly from them by binary search, whatever the number of bins.
+
         Keyword arguments:
             :mask:              mask over which to compute the DVH
             :edge_voxel_weight: weight given to voxels on the surface of the mask
             :bins:              number of bins to use, or an array of bin edges
+            :exact:             sort the voxel doses instead of binning them
         Returns:
             List of tuples of the DVH data.
         '''
@@ -224,41 +318,368 @@ class DoseMask(Mask):
 
         (dvh_dose_data, dvh_volume_data), self.fraction_outside_dosegrid = cdvh(
             dose_mask=self,
+            mask=self.mask,
             edge_voxel_weight=edge_voxel_weight,
-            bins=bins)
+            bins=bins,
+            exact=exact)
 
         self.dvh_data = np.vstack((dvh_dose_data, dvh_volume_data)).T
+        if exact:
+            self.sorted_dose = dvh_dose_data
+            self.sorted_volume = dvh_volume_data
+        else:
+            self.sorted_dose = None
+            self.sorted_volume = None
         return self.dvh_data
 
     def get_dose_to_volume(self, v):
         '''
-        Get the dose delivered to v percent of the volume.
+        Get the dose delivered to v percent of the volume (see dvh.dose_to_volume).
 
         Keyword arguments:
-            :v:     fraction of the volume (from 0 to 1)
+            :v:     fraction of the volume (from 0 to 1), or an array of fractions
         Returns:
-            :dose:  dose delivered to specified volume in cGy
+            :dose:  dose delivered to specified volume in cGy, or an array of doses
         '''
+        from .dvh import dose_to_volume, exact_dose_to_volume
+
         if self.dvh_data is None:
             self.compute_dvh()
 
-        idx = (np.abs(self.dvh_data[:, 1] - v)).argmin()
-        return self.dvh_data[idx, 0]
+        if self.sorted_dose is not None:
+            return exact_dose_to_volume(self.sorted_dose, self.sorted_volume, v)
+        return dose_to_volume(self.dvh_data[:, 0], self.dvh_data[:, 1], v)
 
     def get_volume_with_dose(self, d):
         '''
-        Get the dose delivered to v percent of the volume.
+        Get the fraction of the volume receiving a dose (see dvh.volume_with_dose).
 
         Keyword arguments:
-            :d:     dose value
+            :d:     dose value, or an array of dose values
         Returns:
-            :v:     fraction of volume receiving specified dose
+            :v:     fraction of volume receiving specified dose, or an array of fractions
         '''
+        from .dvh import volume_with_dose, exact_volume_with_dose
+
         if self.dvh_data is None:
             self.compute_dvh()
 
-        if d <= self.max_dose:
-            idx = (np.abs(self.dvh_data[:, 0] - d)).argmin()
-            return self.dvh_data[idx, 1]
-        else:
+        if self.sorted_dose is not None:
+            return exact_volume_with_dose(self.sorted_dose, self.sorted_volume, d)
+        return volume_with_dose(self.dvh_data[:, 0], self.dvh_data[:, 1], d)
+
+
+def compute_region_dose_statistics(dose, label_map, bins=200):
+    '''
+    Compute the dose statistics of every region of a label map in a single pass.
+
+    The dose grid is interpolated once at the labelled voxels. The statistics are
+    then grouped by label with numpy.bincount (mean, standard deviation and DVH)
+    and with a sort by label (minimum and maximum), so the cost does not grow with
+    the number of regions. As for DoseMask, only voxels with a nonzero dose count,
+    and each DVH has 'bins' dose values spanning the dose range of its region.
+
+    Positional arguments:
+        :dose:      dose grid
+        :label_map: LabelMap over which to compute the statistics
+    Keyword arguments:
+        :bins:      number of dose values in each DVH
+    Returns:
+        Dictionary of per-region numpy arrays with the keys 'mean', 'min', 'max',
+        'std', 'fraction_outside_dosegrid', and 'dvh' (list of bins x 2 arrays of
+        dose and relative cumulative volume). Regions without any dose have NaN
+        statistics and a DVH of None.
+    '''
+    if dose is None:
+        raise ValueError('DVH computation requires a dose grid.')
+    n = label_map.num_regions
+    flat = np.flatnonzero(label_map.data)
+    if flat.size < 1:
+        raise ValueError('ROI Binary mask has a volume of 0 cm^3')
+    labels = label_map.data.ravel()[flat].astype(np.intp) - 1
+    mask_voxel_indices = np.transpose(np.unravel_index(flat, label_map.data.shape))
+
+    # Dose of every labelled voxel (0 outside the dose grid)
+    dose_data, inbounds = interpolate_dose(dose, label_map, mask_voxel_indices)
+    values = np.zeros(flat.size, dtype=dose.dose_dtype)
+    values[inbounds] = dose_data
+
+    counts = np.bincount(labels, minlength=n).astype(float)
+    outside = np.bincount(labels, weights=(~inbounds).astype(float), minlength=n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction_outside_dosegrid = np.where(counts > 0, outside / counts, 0.0)
+
+    # Only keep the voxels with a dose, grouped by label
+    nonzero = values != 0
+    labels, values = labels[nonzero], values[nonzero]
+    order = np.argsort(labels, kind='mergesort')
+    labels, values = labels[order], values[order]
+    present, starts = np.unique(labels, return_index=True)
+
+    stats = {
+        'mean': np.full(n, np.nan),
+        'min': np.full(n, np.nan),
+        'max': np.full(n, np.nan),
+        'std': np.full(n, np.nan),
+        'fraction_outside_dosegrid': fraction_outside_dosegrid,
+        'dvh': [None] * n
+    }
+    if present.size == 0:
+        return stats
+    dose_counts = np.bincount(labels, minlength=n)
+    mean = np.bincount(labels, weights=values, minlength=n)[present] / dose_counts[present]
+    stats['mean'][present] = mean
+    stats['min'][present] = np.minimum.reduceat(values, starts)
+    stats['max'][present] = np.maximum.reduceat(values, starts)
+    stats['std'][present] = np.sqrt(np.bincount(
+        labels, weights=(values - stats['mean'][labels])**2, minlength=n)[present]
+        / dose_counts[present])
+
+    # Histogram of every region over its own dose range, with the same bin
+    # edges and bin assignment as numpy.histogram
+    num_bins = bins - 1
+    first, last = stats['min'][present], stats['max'][present]
+    flat_range = first == last
+    first = np.where(flat_range, first - 0.5, first)
+    last = np.where(flat_range, last + 0.5, last)
+    edges = first[:, None] + np.arange(bins) * ((last - first) / num_bins)[:, None]
+    edges[:, -1] = last
+    group = np.repeat(np.arange(present.size), np.diff(np.append(starts, values.size)))
+    idx = ((values - first[group]) * (num_bins / (last - first))[group]).astype(np.intp)
+    idx[idx == num_bins] -= 1
+    idx[values < edges[group, idx]] -= 1
+    idx[(values >= edges[group, idx + 1]) & (idx != num_bins - 1)] += 1
+
+    # One row of 'bins' volumes per region: the last dose bin has a volume of 0
+    hist = np.bincount(group * bins + idx, minlength=present.size * bins)
+    hist = hist.reshape(present.size, bins).astype(float)
+    volume = hist * abs(np.prod(np.asarray(label_map.spacing, dtype=float)))
+    volume = np.cumsum(volume[:, ::-1], axis=1)[:, ::-1]
+    volume /= volume[:, :1]
+    for i, r in enumerate(present):
+        stats['dvh'][r] = np.vstack((edges[i], volume[i])).T
+    return stats
+
+
+class DoseRegion(object):
+    '''
+    Dose statistics of one region of a DoseLabelMap.
+
+    Exposes the same statistics and DVH lookups as DoseMask, so that a DoseLabelMap
+    can be used in place of a list of dose masks.
+    '''
+
+    def __init__(self, region, min_dose, max_dose, mean_dose, std_dose,
+                 dvh_data, fraction_outside_dosegrid):
+        self.region = region
+        self.min_dose = min_dose
+        self.max_dose = max_dose
+        self.mean_dose = mean_dose
+        self.std_dose = std_dose
+        self.dvh_data = dvh_data
+        self.fraction_outside_dosegrid = fraction_outside_dosegrid
+
+    def get_dose_to_volume(self, v):
+        '''
+        Get the dose delivered to v percent of the volume (see dvh.dose_to_volume).
+
+        Keyword arguments:
+            :v:     fraction of the volume (from 0 to 1), or an array of fractions
+        Returns:
+            :dose:  dose delivered to specified volume in cGy, or an array of doses
+        '''
+        from .dvh import dose_to_volume
+        return dose_to_volume(self.dvh_data[:, 0], self.dvh_data[:, 1], v)
+
+    def get_volume_with_dose(self, d):
+        '''
+        Get the fraction of the volume receiving a dose (see dvh.volume_with_dose).
+
+        Keyword arguments:
+            :d:     dose value, or an array of dose values
+        Returns:
+            :v:     fraction of volume receiving specified dose, or an array of fractions
+        '''
+        from .dvh import volume_with_dose
+        return volume_with_dose(self.dvh_data[:, 0], self.dvh_data[:, 1], d)
+
+
+class DoseLabelMap(LabelMap):
+    '''
+    The DoseLabelMap class maps the dose onto every region of a label map at once.
+
+    Instead of one full-size DoseMask per region, the dose grid is interpolated a
+    single time and the statistics of all regions are computed in one pass (see
+    compute_region_dose_statistics). Indexing or iterating over a DoseLabelMap gives
+    one DoseRegion per region, with the same statistics as a DoseMask.
+
+    Positional arguments:
+        :label_map: LabelMap to map dose onto
+        :dsg:       dose grid
+    Keyword arguments:
+        :bins:      number of dose values in each DVH
+    '''
+
+    def __init__(self, label_map, dsg, bins=200):
+        LabelMap.__init__(self, dim=3)
+        self.copy_information(label_map)
+        self.data = label_map.data
+        self.regions = label_map.regions
+        self.dose = dsg
+
+        # If the dose grid hasn't already been corrected
+        if not self.dose.origin_modified:
+            # Fix the dose grid origin to account for Pinnacle's LH coordinates
+            correct_dose_grid_origin(self, self.dose)
+
+        self.statistics = compute_region_dose_statistics(self.dose, self, bins=bins)
+        self.min_dose = self.statistics['min']
+        self.max_dose = self.statistics['max']
+        self.mean_dose = self.statistics['mean']
+        self.std_dose = self.statistics['std']
+        self.fraction_outside_dosegrid = self.statistics['fraction_outside_dosegrid']
+
+    def __len__(self):
+        return self.num_regions
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.num_regions
+        if i < 0 or i >= self.num_regions:
+            raise IndexError('Region index out of range')
+        return DoseRegion(
+            self.regions[i], float(self.min_dose[i]), float(self.max_dose[i]),
+            float(self.mean_dose[i]), float(self.std_dose[i]),
+            self.statistics['dvh'][i], float(self.fraction_outside_dosegrid[i]))
+
+    def __iter__(self):
+        return (self[i] for i in range(self.num_regions))
+
+
+class DoseAccumulator(object):
+    '''
+    Accumulate the dose of several dose grids (e.g. the fractions or sessions of a
+    plan sum) at the voxels of a mask.
+
+    Each dose grid is interpolated at the mask voxels only (see Dose.sample) and added
+    to a running dose vector, so the summed dose grid is never built: the memory used
+    stays proportional to the number of mask voxels, whatever the number of doses.
+    The accumulated dose is stored as the dose_dtype of the first dose grid (see Dose).
+    Like DoseMask, the origin of each dose grid is corrected for Pinnacle's LH
+    coordinates if it has not been corrected yet (see correct_dose_grid_origin).
+
+    The number of dose grids that cover each mask voxel is kept in 'coverage'.
+    Voxels that lie outside every accumulated dose grid are left out of the dose mask,
+    like in compute_dose_mask, and voxels that lie outside some of the grids only hold
+    the dose of the other grids. Both count as outside the dose grid in
+    fraction_outside_dosegrid.
+
+    Positional arguments:
+        :mask:  mask over which to accumulate the dose
+    Raises:
+        :ValueError:    if the mask is empty
+    '''
+
+    def __init__(self, mask):
+        self.mask = mask
+        self.mask_voxel_indices = np.transpose(mask.nonzero_indices())
+        if len(self.mask_voxel_indices) < 1:
+            raise ValueError('ROI Binary mask has a volume of 0 cm^3')
+
+        # Physical coordinates of the mask voxels, computed once for all dose grids
+        self.__points = mask.transform_index_to_physical_point(self.mask_voxel_indices[:, ::-1])
+        # Accumulated dose, of the dose_dtype of the first dose grid
+        self.dose_data = None
+        self.coverage = np.zeros(len(self.mask_voxel_indices), dtype=np.intp)
+        self.num_doses = 0
+
+    @property
+    def fraction_outside_dosegrid(self):
+        '''
+        Fraction of the mask voxels that lie outside of at least one accumulated dose grid
+        '''
+        if self.num_doses == 0:
             return 0.0
+        return float(np.count_nonzero(self.coverage < self.num_doses)) / len(self.coverage)
+
+    def add(self, dose, weight=1.0):
+        '''
+        Add the dose of a dose grid to the accumulated dose.
+
+        Positional arguments:
+            :dose:      dose grid
+        Keyword arguments:
+            :weight:    factor applied to the dose before it is added
+        Returns:
+            the accumulator
+        '''
+        # If the dose grid hasn't already been corrected
+        if not dose.origin_modified:
+            # Fix the dose grid origin to account for Pinnacle's LH coordinates
+            correct_dose_grid_origin(self.mask, dose)
+
+        if self.dose_data is None:
+            self.dose_data = np.zeros(len(self.mask_voxel_indices), dtype=dose.dose_dtype)
+
+        dose_voxel_indices, inbounds = dose.transform_physical_point_to_continuous_index(
+            self.__points)
+        if np.any(inbounds):
+            self.dose_data[inbounds] += weight * dose.sample(
+                dose_voxel_indices[inbounds], dtype=self.dose_data.dtype)
+            self.coverage += inbounds
+        self.num_doses += 1
+        return self
+
+    def add_doses(self, doses, weights=None):
+        '''
+        Add the doses of several dose grids, one at a time.
+
+        Positional arguments:
+            :doses:     iterable of dose grids, e.g. a generator that loads them one
+                        by one (see RadiotherapySessionsQueries.iter_doses)
+        Keyword arguments:
+            :weights:   factor applied to each dose grid (default: 1 for all grids)
+        Returns:
+            the accumulator
+        '''
+        if weights is None:
+            for dose in doses:
+                self.add(dose)
+        else:
+            for dose, weight in zip(doses, weights):
+                self.add(dose, weight=weight)
+        return self
+
+    def get_dose_mask(self):
+        '''
+        Get the accumulated dose as a dose mask.
+
+        Returns:
+            (dose mask, fraction outside dose grid) tuple, like compute_dose_mask
+        Raises:
+            :ValueError:    if the mask lies outside every accumulated dose grid
+        '''
+        covered = self.coverage > 0
+        if not np.any(covered):
+            raise ValueError('ROI lies entirely outside the dose grid')
+        dose_mask, _ = _make_dose_mask(self.mask, self.mask_voxel_indices,
+                                       self.dose_data[covered], covered)
+        return dose_mask, self.fraction_outside_dosegrid
+
+    def compute_dvh(self, edge_voxel_weight=None, bins=200, exact=False):
+        '''
+        Compute the DVH of the accumulated dose (see dvh.compute_dvh).
+
+        Keyword arguments:
+            :edge_voxel_weight: weight given to voxels on the surface of the mask
+            :bins:              number of bins to use, or an array of bin edges
+            :exact:             sort the voxel doses instead of binning them
+        Returns:
+            ((dose data, volume data), fraction outside dose grid) tuple
+        '''
+        from .dvh import compute_dvh as cdvh
+
+        dose_mask, fraction_outside_dosegrid = self.get_dose_mask()
+        dose_mask.fraction_outside_dosegrid = fraction_outside_dosegrid
+        return cdvh(dose_mask=dose_mask, mask=self.mask,
+                    edge_voxel_weight=edge_voxel_weight, bins=bins, exact=exact)
@@ -8,11 +8,14 @@ from copy import deepcopy
 import numpy as np
 import warnings
 
-# Define how to cumulate / differentiate dose and volume
+from . import image
+
+# Define how to cumulate / differentiate dose and volume.
+# Numpy arrays are accumulated in place (like the lists they replaced), other
+# sequences are converted to new arrays.
 def cumulate_dose(d):
-    for i in range(1, len(d)):
-        d[i] += d[i - 1]
-    return d
+    d = np.asarray(d)
+    return np.cumsum(d, out=d if d.dtype.kind == 'f' else None)
 
 
 def differentiate_dose(d):
@@ -20,10 +23,10 @@ def differentiate_dose(d):
 
 
 def cumulate_volume(v):
-    i = len(v) - 2
-    while i >= 0:
-        v[i] += v[i + 1]
-        i -= 1
+    v = np.asarray(v)
+    if v.dtype.kind != 'f':
+        return np.cumsum(v[::-1])[::-1]
+    np.cumsum(v[::-1], out=v[::-1])
     return v
 
 
@@ -33,7 +36,7 @@ def differentiate_volume(v):
 
 def compute_dvh(dose_mask=None, mask=None, dose=None,
                 edge_voxel_weight=None, bins=200,
-                type='cum'):
+                type='cum', exact=False):
     '''
     Compute a DVH curve for the given ROI from the given dose grid. Returns
     the DVH data. If no binary mask is specified, one will be computed for
@@ -42,8 +45,17 @@ def compute_dvh(dose_mask=None, mask=None, dose=None,
     may be specified as an integer number of bins to include in the histogram,
     or it may be a vector of bin edges (see np.histogram).
 
+    With an integer number of bins, the DVH has 'bins' dose points spanning the
+    dose range, and the last point has a volume of 0. With a vector of bin edges,
+    the DVH has one dose point per edge: the last bin extends from the last edge
+    to infinity, and doses below the first edge are left out of every bin. The
+    cumulative DVH is normalized by the volume of the whole mask in both cases.
+
     If an edge_voxel_weight is specified, all edge voxels in the x-y plane of
     the binary mask are multipled by the specified weight.
+
+    If exact is True, the dose values are not binned: the DVH has one dose point
+    per voxel, sorted in increasing order (see sort_dose), and bins is ignored.
     '''
     from .dose_map import compute_dose_mask as cdm
 
@@ -61,51 +73,256 @@ def compute_dvh(dose_mask=None, mask=None, dose=None,
     # Compute histogram
     voxelVolume = abs(
         dose_mask.spacing[0] * dose_mask.spacing[1] * dose_mask.spacing[2])
-    try:
-        # modifiedBins = bins - 1
-        useModifiedBins = True
-    except ValueError:
-        useModifiedBins = False
+    useModifiedBins = np.ndim(bins) == 0
 
-    # Compute the weight associated with each dose point
+    # Compute the weight associated with each dose point. Unit weights are
+    # left out, so that numpy can count the voxels in each bin directly.
     mask_voxel_indices = dose_mask.data.nonzero()
-    dose_weights = np.ones_like(
-        dose_mask.data[mask_voxel_indices], dtype=np.float_)
+    dose_values = dose_mask.data[mask_voxel_indices]
+    dose_weights = None
     if (edge_voxel_weight is not None) and (edge_voxel_weight != 1):
-        edge_mask = mask.get_mask_edge_voxels(exclude_z=True)
-        dose_weights[edge_mask.data[mask_voxel_indices] > 0] *= edge_voxel_weight
+        dose_weights = np.ones_like(dose_values, dtype=np.float64)
+        dose_weights[_is_edge(mask, dose_mask, mask_voxel_indices)] *= edge_voxel_weight
 
-    if useModifiedBins:
+    if exact:
+        # One dose point per voxel, weighted by the volume of the voxel
+        edges, hist = sort_dose(dose_values, dose_weights)
+    elif useModifiedBins:
         # Last dose bin has a volume of 0
         hist, edges = np.histogram(
-            dose_mask.data[mask_voxel_indices],
-            bins=bins - 1,
+            dose_values,
+            bins=int(bins) - 1,
             density=False,
             weights=dose_weights)
         hist = np.append(hist, 0)
     else:
-        # Last dose bin may not have a volume of 0
+        # Last dose bin holds every dose above the last edge
         hist, edges = np.histogram(
-            dose_mask.data[mask_voxel_indices],
-            bins=bins,
+            dose_values,
+            bins=np.append(np.asarray(bins, dtype=np.float64), np.inf),
             density=False,
             weights=dose_weights)
         edges = edges[:-1]
 
     dose_data = np.array(edges)
-    dvh_volume_data = np.array(hist) * voxelVolume
+    dvh_volume_data = hist.astype(np.float64) * voxelVolume
 
-    # If requesting a cumulative dvh, accumulate the volumes
+    # If requesting a cumulative dvh, accumulate and normalize the volumes in place
     if 'cum' in type:
-        i = len(dvh_volume_data) - 2
-        while i >= 0:
-            dvh_volume_data[i] += dvh_volume_data[i + 1]
-            i -= 1
-        dvh_volume_data[:] = [v / dvh_volume_data[0] for v in dvh_volume_data]
+        cumulate_volume(dvh_volume_data)
+        total_volume = dvh_volume_data[0] if len(dvh_volume_data) else 0
+        if not (exact or useModifiedBins):
+            # Add the volume below the first edge, which is left out of the bins
+            below = dose_values < dose_data[0]
+            if dose_weights is None:
+                total_volume += np.count_nonzero(below) * voxelVolume
+            else:
+                total_volume += dose_weights[below].sum() * voxelVolume
+        if total_volume > 0:
+            dvh_volume_data /= total_volume
 
     return (dose_data, dvh_volume_data), fraction_outside_dosegrid
 
 
+def _is_edge(mask, dose_mask, mask_voxel_indices):
+    '''
+    Helper function: look up which voxels are on the edge (in the x-y plane) of the
+    mask, through the edges cached on the mask. Without a mask, the edges are found
+    from the nonzero voxels of the dose mask.
+    '''
+    from .image import Mask, get_mask_edge_voxels
+
+    if mask is None:
+        mask = dose_mask
+    if isinstance(mask, Mask):
+        return mask.get_edges(exclude_z=True).is_edge(mask_voxel_indices)
+    return get_mask_edge_voxels(mask, exclude_z=True).data[mask_voxel_indices] > 0
+
+
+def sort_dose(dose_values, weights=None):
+    '''
+    Sort the dose values of a set of voxels, along with their weights.
+
+    A cumulative DVH computed from the sorted dose values is exact: the volume at
+    the i-th point is the volume receiving at least the i-th dose, and it can be
+    looked up by binary search (see exact_dose_to_volume and exact_volume_with_dose).
+
+    Positional arguments:
+        :dose_values:   dose value of each voxel
+    Keyword arguments:
+        :weights:       weight of each voxel (default: 1 for every voxel)
+    Returns:
+        (sorted dose values, weights in the same order) tuple
+    '''
+    dose_values = np.ravel(dose_values)
+    order = np.argsort(dose_values, kind='mergesort')
+    if weights is None:
+        sorted_weights = np.ones(dose_values.size, dtype=np.float64)
+    else:
+        sorted_weights = np.asarray(weights, dtype=np.float64)[order]
+    return dose_values[order], sorted_weights
+
+
+def exact_dose_to_volume(sorted_dose, volume_data, volumes):
+    '''
+    Look up the dose to each of the given volumes (D_v) on an exact cumulative DVH.
+
+    D_v is the highest voxel dose that at least a volume v receives, found by binary
+    search on the curve, without interpolation.
+
+    Positional arguments:
+        :sorted_dose:   voxel dose values, in increasing order (see sort_dose)
+        :volume_data:   cumulative volume receiving at least each dose value
+        :volumes:       volume or array of volumes to look up, in the units of volume_data
+    Returns:
+        dose or numpy array of doses with the same shape as volumes
+    '''
+    sorted_dose = np.asarray(sorted_dose)
+    volumes = np.asarray(volumes, dtype=float)
+    if sorted_dose.size == 0:
+        return np.full(volumes.shape, np.nan)[()]
+
+    # Index of the last point that receives at least v
+    reversed_volume = np.asarray(volume_data, dtype=float)[::-1]
+    i = sorted_dose.size - 1 - np.searchsorted(reversed_volume, volumes, side='left')
+    return sorted_dose[np.clip(i, 0, sorted_dose.size - 1)][()]
+
+
+def exact_volume_with_dose(sorted_dose, volume_data, doses):
+    '''
+    Look up the volume receiving at least each of the given doses (V_d) on an exact
+    cumulative DVH, by binary search on the sorted dose values.
+
+    Positional arguments:
+        :sorted_dose:   voxel dose values, in increasing order (see sort_dose)
+        :volume_data:   cumulative volume receiving at least each dose value
+        :doses:         dose or array of doses to look up
+    Returns:
+        volume or numpy array of volumes with the same shape as doses
+    '''
+    # Append a volume of 0 for doses above the maximum dose
+    volume_data = np.append(np.asarray(volume_data, dtype=float), 0.0)
+    i = np.searchsorted(sorted_dose, doses, side='left')
+    return volume_data[i][()]
+
+
+def compute_dvhs(dose, masks, workers=None, exact=False):
+    '''
+    Compute the DVHs of several masks (e.g. all the ROIs of a patient) from one dose grid.
+
+    The dose grid is interpolated once for each group of masks that share the same
+    geometry, over the union of the masks (see dose_map.compute_dose_masks), and each
+    DVH is then histogrammed from the dose values of its mask. The DVHs are the same
+    as the ones computed one mask at a time.
+
+    Positional arguments:
+        :dose:      dose grid
+        :masks:     dictionary of masks, e.g. {ROI name: mask}
+    Keyword arguments:
+        :workers:   number of threads used to histogram the DVHs
+        :exact:     compute exact DVHs from the sorted voxel doses (see compute_dvh)
+    Returns:
+        dictionary of Dvh objects, with the same keys as masks
+    '''
+    from .dose_map import compute_dose_masks
+
+    if dose is None:
+        raise ValueError('DVH computation requires a dose grid to compute DVH data')
+
+    # Group the masks by geometry
+    groups = {}
+    for key, msk in masks.items():
+        geometry = tuple(str(list(np.asarray(getattr(msk, field), dtype=float)))
+                         for field in ['origin', 'size', 'spacing'])
+        groups.setdefault(geometry, []).append(key)
+
+    # Interpolate the dose once per group
+    dose = _view_dose(dose)
+    precomputed = {}
+    for keys in groups.values():
+        dose_masks = compute_dose_masks(dose, [masks[key] for key in keys])
+        precomputed.update(zip(keys, dose_masks))
+
+    def make_dvh(key):
+        return key, Dvh(mask=masks[key], dose=dose, exact=exact, precomputed=precomputed[key])
+
+    if workers is not None and workers > 1 and len(masks) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return dict(executor.map(make_dvh, list(masks)))
+    return dict(make_dvh(key) for key in masks)
+
+
+def _view_dose(dose):
+    '''
+    Helper function: read-only view of a dose grid (see image.read_only_view)
+    '''
+    if dose is None:
+        return None
+    # The dose statistics are cached by the dose grid: compute them before taking
+    # the view, so that every DVH viewing the grid shares them
+    dose.min, dose.max, dose.mean, dose.std
+    return image.read_only_view(dose)
+
+
+def dose_to_volume(dose_data, volume_data, volumes):
+    '''
+    Look up the dose to each of the given volumes (D_v) on a cumulative DVH curve.
+
+    D_v is the highest dose that at least a volume v receives. It is found by binary
+    search (np.searchsorted) on the curve, and linearly interpolated between the two
+    surrounding points, so a batch of k queries costs O(k log n).
+
+    Positional arguments:
+        :dose_data:     increasing dose values of the curve
+        :volume_data:   cumulative (non-increasing) volume at each dose value
+        :volumes:       volume or array of volumes to look up, in the units of volume_data
+    Returns:
+        dose or numpy array of doses with the same shape as volumes
+    '''
+    dose_data = np.asarray(dose_data, dtype=float)
+    volumes = np.asarray(volumes, dtype=float)
+    if dose_data.size < 2:
+        return np.full(volumes.shape, dose_data[0] if dose_data.size else np.nan)[()]
+
+    # Reverse the curve so that volumes are sorted in increasing order
+    reversed_dose = dose_data[::-1]
+    reversed_volume = np.asarray(volume_data, dtype=float)[::-1]
+    upper = np.clip(np.searchsorted(reversed_volume, volumes, side='left'),
+                    1, len(reversed_volume) - 1)
+    lower = upper - 1
+
+    # Interpolate between the last point below v and the first point at or above v
+    v0, v1 = reversed_volume[lower], reversed_volume[upper]
+    d0, d1 = reversed_dose[lower], reversed_dose[upper]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(v1 > v0, (volumes - v0) / (v1 - v0), 1.0)
+    return (d0 + np.clip(t, 0, 1) * (d1 - d0))[()]
+
+
+def volume_with_dose(dose_data, volume_data, doses):
+    '''
+    Look up the volume receiving at least each of the given doses (V_d) on a
+    cumulative DVH curve.
+
+    The curve is linearly interpolated between the two points surrounding each dose
+    (found by binary search). Doses below the curve get its first volume, and doses
+    above it get a volume of 0.
+
+    Positional arguments:
+        :dose_data:     increasing dose values of the curve
+        :volume_data:   cumulative (non-increasing) volume at each dose value
+        :doses:         dose or array of doses to look up
+    Returns:
+        volume or numpy array of volumes with the same shape as doses
+    '''
+    volume_data = np.asarray(volume_data, dtype=float)
+    doses = np.asarray(doses, dtype=float)
+    volumes = np.interp(doses, np.asarray(dose_data, dtype=float), volume_data,
+                        left=volume_data[0], right=0.0)
+    return np.asarray(volumes)[()]
+
+
 class Dvh(object):
     '''
     Dose Volume Histogram representation.
@@ -113,25 +330,35 @@ class Dvh(object):
     Initialize the DVH class with either the data
     or both a structure and dose class.
 
+    By default, the DVH does not copy the mask and dose grid: it holds views of
+    them whose data buffers are read-only (see image.read_only_view), so that
+    building a DVH costs no more than the dose lookup itself.
+
     Keyword arguments:
         :data:  points defining a dose volume histogram
         :roi:   Roi class
         :mask:  Mask class
         :dose:  Dose class
+        :exact: compute an exact DVH from the sorted voxel doses (see compute_dvh)
+        :copy:  store deep copies of the roi, mask and dose instead of read-only views
+        :precomputed:   (dose mask, fraction outside dose grid) tuple, as returned by
+            compute_dose_mask, to skip the dose interpolation (see compute_dvhs)
     '''
 
-    def __init__(self, data=None, roi=None, mask=None, dose=None):
+    def __init__(self, data=None, roi=None, mask=None, dose=None, exact=False, copy=False,
+                 precomputed=None):
         # DVH data: Nx2 numpy array [[dose,volume]] tuples
         self.data = data
         # An ROI class
-        self.roi = deepcopy(roi)
+        self.roi = deepcopy(roi) if copy else roi
         # Get a mask either from the ROI class or mask argument
+        self.mask = None
         if mask is not None:
-            self.mask = deepcopy(mask)
+            self.mask = deepcopy(mask) if copy else image.read_only_view(mask)
         elif self.roi is not None:
-            self.mask = self.roi.mask
+            self.mask = self.roi.mask if copy else image.read_only_view(self.roi.mask)
         # A dose class
-        self.dose = deepcopy(dose)
+        self.dose = deepcopy(dose) if copy else _view_dose(dose)
 
         # If data wasn't provided, must have a dose and mask
         if self.data is None:
@@ -155,10 +382,14 @@ class Dvh(object):
         # DVH values
         self.dose_data = []
         self.volume_data = []
+        # Sorted voxel doses and cumulative volumes of an exact DVH
+        self.sorted_dose = None
+        self.sorted_volume = None
         if data is not None:
             self.set_data(data)
 
         # These are updated by self.compute_dvh
+        self.precomputed = precomputed
         self.dose_mask = None
         self.min_dose = None
         self.max_dose = None
@@ -166,8 +397,9 @@ class Dvh(object):
         self.std_dose = None
         self.fraction_outside_dosegrid = None
 
-        # Compute the DVH
-        self.compute_dvh()
+        # Compute the DVH, unless its data was provided
+        if self.data is None:
+            self.compute_dvh(exact=exact)
 
     def __str__(self):
         outputStr = 'Dose type:     ' + str(self.dose_type) + '\n' \
@@ -190,6 +422,8 @@ class Dvh(object):
             :data:  list of (dose, volume) tuples
         '''
         self.data = np.array(data)
+        self.sorted_dose = None
+        self.sorted_volume = None
         if len(self.data.shape) > 1 and self.data.shape[1] > 0:
             self.dose_data = self.data[:, 0]
             # Update dose statistics
@@ -386,7 +620,11 @@ class Dvh(object):
         '''
         from .dose_map import compute_dose_mask as cdm
 
-        self.dose_mask, self.fraction_outside_dosegrid = cdm(dose=self.dose, mask=self.mask)
+        if getattr(self, 'precomputed', None) is not None:
+            self.dose_mask, self.fraction_outside_dosegrid = self.precomputed
+            self.precomputed = None
+        else:
+            self.dose_mask, self.fraction_outside_dosegrid = cdm(dose=self.dose, mask=self.mask)
         # Compute stats
         self.min_dose = self.dose.min
         self.max_dose = self.dose.max
@@ -394,7 +632,7 @@ class Dvh(object):
         self.std_dose = self.dose.std
         return self.dose_mask
 
-    def compute_dvh(self):
+    def compute_dvh(self, exact=False):
         '''
         Compute a DVH curve for the given ROI from the given dose grid. Returns
         the DVH data. If no binary mask is specified, one will be computed for
@@ -405,45 +643,316 @@ class Dvh(object):
 
         If an edge_voxel_weight is specified, all edge voxels in the x-y plane of
         the binary mask are multipled by the specified weight.
+
+        If exact is True, the sorted voxel doses are kept in self.sorted_dose and
+        self.sorted_volume, and dose / volume lookups are answered exactly from them.
         '''
         self.dose_mask = self.compute_dose_mask()
         (self.dose_data, self.volume_data), frac_outside_dosegrid = compute_dvh(
-            dose_mask=self.dose_mask)
+            dose_mask=self.dose_mask, exact=exact)
         if frac_outside_dosegrid is not None:
             self.fraction_outside_dosegrid = frac_outside_dosegrid
 
         self.data = np.vstack((self.dose_data, self.volume_data)).T
+        if exact:
+            self.sorted_dose = self.dose_data
+            self.sorted_volume = self.volume_data
+        else:
+            self.sorted_dose = None
+            self.sorted_volume = None
         return self.data
 
     def get_dose_to_volume(self, v):
         '''
-        Get the dose delivered to v percent of the volume.
+        Get the dose delivered to v percent of the volume (see dose_to_volume).
 
         Keyword arguments:
-            :v:     fraction of the volume (from 0 to 1)
+            :v:     fraction of the volume (from 0 to 1), or an array of fractions
         Returns:
-            :d:     dose delivered to specified volume in cGy
+            :d:     dose delivered to specified volume in cGy, or an array of doses
         '''
         if self.data is None:
             self.compute_dvh()
 
-        idx = (np.abs(self.data[:, 1] - v)).argmin()
-        return self.data[idx, 0]
+        if self.sorted_dose is not None:
+            return exact_dose_to_volume(self.sorted_dose, self.sorted_volume, v)
+        return dose_to_volume(self.data[:, 0], self.data[:, 1], v)
 
     def get_volume_with_dose(self, d):
         '''
-        Get the dose delivered to v percent of the volume.
+        Get the fraction of the volume receiving a dose (see volume_with_dose).
 
         Keyword arguments:
-            :d:     dose value
+            :d:     dose value, or an array of dose values
         Returns:
-            :v:     fraction of volume receiving specified dose
+            :v:     fraction of volume receiving specified dose, or an array of fractions
         '''
         if self.data is None:
             self.compute_dvh()
 
-        if d <= self.max_dose:
-            idx = (np.abs(self.data[:, 0] - d)).argmin()
-            return self.data[idx, 1]
-        else:
-            return 0.0
+        if self.sorted_dose is not None:
+            return exact_volume_with_dose(self.sorted_dose, self.sorted_volume, d)
+        return volume_with_dose(self.data[:, 0], self.data[:, 1], d)
+
+
+class DvhCollection(object):
+    '''
+    Columnar store of many cumulative DVH curves (e.g. a whole cohort).
+
+    The points of all the curves are concatenated in two flat arrays, 'dose_data' and
+    'volume_data', and the points of the i-th curve are found between offsets[i] and
+    offsets[i + 1]. Key columns (e.g. ROI name, session or patient IDs) hold one value
+    per curve, so that curves can be selected and metrics extracted for every curve
+    at once, without building Dvh objects.
+
+    Positional arguments:
+        :dose_data:     flat array of the dose values of all the curves
+        :volume_data:   flat array of the cumulative volumes of all the curves
+        :offsets:       index of the first point of each curve, followed by the total
+                        number of points
+    Keyword arguments:
+        :keys:          dictionary of key columns, e.g. {'roi': [...], 'patient': [...]},
+                        with one value per curve
+    Raises:
+        :ValueError:    if the arrays do not describe the same number of points and curves
+    '''
+
+    def __init__(self, dose_data, volume_data, offsets, keys=None):
+        self.dose_data = np.asarray(dose_data)
+        self.volume_data = np.asarray(volume_data)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.keys = {}
+        if len(self.offsets) < 1 or self.offsets[0] != 0 \
+                or self.offsets[-1] != len(self.dose_data) \
+                or len(self.volume_data) != len(self.dose_data) \
+                or np.any(np.diff(self.offsets) < 0):
+            raise ValueError('DVH collection offsets do not match the dose and volume data')
+        for name, values in (keys or {}).items():
+            values = np.asarray(values)
+            if len(values) != len(self):
+                raise ValueError('Key "{}" has {} values for {} DVH curves'.format(
+                    name, len(values), len(self)))
+            self.keys[name] = values
+
+    @classmethod
+    def from_curves(cls, curves, keys=None):
+        '''
+        Create a collection from a list of DVH curves.
+
+        Positional arguments:
+            :curves:    list of Nx2 [[dose, volume]] arrays, or of Dvh objects
+        Keyword arguments:
+            :keys:      dictionary of key columns, with one value per curve
+        Returns:
+            DvhCollection
+        '''
+        curves = [np.asarray(c.data if isinstance(c, Dvh) else c, dtype=np.float64).reshape(-1, 2)
+                  for c in curves]
+        offsets = np.zeros(len(curves) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(c) for c in curves])
+        data = np.concatenate(curves) if curves else np.zeros((0, 2))
+        return cls(data[:, 0].copy(), data[:, 1].copy(), offsets, keys=keys)
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        '''
+        Load a collection saved with DvhCollection.save. By default, the arrays are
+        memory-mapped instead of being read into memory.
+
+        Positional arguments:
+            :directory: directory holding the .npy files of the collection
+        Keyword arguments:
+            :mmap_mode: memory-map mode (see np.load), or None to read the arrays
+        Returns:
+            DvhCollection
+        '''
+        import os
+
+        def load_array(name):
+            return np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode)
+
+        keys = {}
+        for filename in sorted(os.listdir(directory)):
+            if filename.startswith('key_') and filename.endswith('.npy'):
+                name = filename[len('key_'):-len('.npy')]
+                keys[name] = load_array('key_' + name)
+        return cls(load_array('dose'), load_array('volume'), load_array('offsets'), keys=keys)
+
+    def save(self, directory):
+        '''
+        Save the collection as .npy files (dose, volume, offsets and one file per key
+        column) that can be memory-mapped by DvhCollection.load.
+
+        Positional arguments:
+            :directory: directory to write the files to (created if needed)
+        '''
+        import os
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        arrays = [('dose', self.dose_data), ('volume', self.volume_data), ('offsets', self.offsets)]
+        arrays += [('key_' + name, values) for name, values in self.keys.items()]
+        for name, values in arrays:
+            np.save(os.path.join(directory, name + '.npy'), values, allow_pickle=False)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        '''
+        Get the Nx2 [[dose, volume]] data of the i-th curve.
+        '''
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError('DVH index out of range')
+        start, stop = self.offsets[i], self.offsets[i + 1]
+        return np.vstack((self.dose_data[start:stop], self.volume_data[start:stop])).T
+
+    @property
+    def lengths(self):
+        '''
+        Number of points of each curve.
+        '''
+        return np.diff(self.offsets)
+
+    def get_dvh(self, i):
+        '''
+        Get the i-th curve as a Dvh object.
+        '''
+        d = Dvh(data=self[i])
+        d.dose_type = 'cum'
+        d.volume_type = 'cum'
+        return d
+
+    def select(self, indices=None, **keys):
+        '''
+        Select a subset of the curves, by index and / or by key values.
+
+        Keyword arguments:
+            :indices:   indices or boolean array of the curves to select
+            :keys:      key column values to match, e.g. roi='Parotid_L'. A list of
+                        values matches any of them.
+        Returns:
+            new DvhCollection with the selected curves
+        '''
+        selected = np.ones(len(self), dtype=bool)
+        if indices is not None:
+            selected = np.zeros(len(self), dtype=bool)
+            selected[indices] = True
+        for name, values in keys.items():
+            selected &= np.isin(self.keys[name], np.atleast_1d(values))
+
+        curves = np.flatnonzero(selected)
+        lengths = self.lengths[curves]
+        offsets = np.zeros(len(curves) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(lengths)
+        points = np.repeat(self.offsets[curves] - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return DvhCollection(self.dose_data[points], self.volume_data[points], offsets,
+                             keys={name: values[curves] for name, values in self.keys.items()})
+
+    def __curve_ids(self):
+        return np.repeat(np.arange(len(self)), self.lengths)
+
+    def __per_curve(self, values):
+        '''
+        Broadcast a scalar, or an array with one value per curve, to every point
+        '''
+        values = np.asarray(values, dtype=float)
+        if values.ndim == 0:
+            return np.full(len(self.dose_data), float(values)), np.full(len(self), float(values))
+        return values[self.__curve_ids()], values
+
+    def get_dose_to_volume(self, v):
+        '''
+        Get the dose delivered to a fraction v of the volume, for every curve at once
+        (same interpolation as dose_to_volume).
+
+        Positional arguments:
+            :v:     volume, or array with one volume per curve
+        Returns:
+            array with one dose per curve (NaN for empty curves)
+        '''
+        v_points, v = self.__per_curve(v)
+        dose = np.asarray(self.dose_data, dtype=float)
+        volume = np.asarray(self.volume_data, dtype=float)
+        lengths = self.lengths
+        result = np.full(len(self), np.nan)
+        valid = lengths > 0
+        if not np.any(valid):
+            return result
+
+        # Index k of the last point receiving at least v, clipped like dose_to_volume
+        count = np.add.reduceat((volume >= v_points).astype(np.int64), self.offsets[:-1][valid])
+        k = np.clip(count - 1, 0, np.maximum(lengths[valid] - 2, 0))
+        upper = self.offsets[:-1][valid] + k
+        lower = np.minimum(upper + 1, self.offsets[1:][valid] - 1)
+
+        v0, v1 = volume[lower], volume[upper]
+        d0, d1 = dose[lower], dose[upper]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = np.where(v1 > v0, (v[valid] - v0) / (v1 - v0), 1.0)
+        result[valid] = d0 + np.clip(t, 0, 1) * (d1 - d0)
+        return result
+
+    def get_volume_with_dose(self, d):
+        '''
+        Get the fraction of the volume receiving a dose d, for every curve at once
+        (same interpolation as volume_with_dose).
+
+        Positional arguments:
+            :d:     dose, or array with one dose per curve
+        Returns:
+            array with one volume per curve (NaN for empty curves)
+        '''
+        d_points, d = self.__per_curve(d)
+        dose = np.asarray(self.dose_data, dtype=float)
+        volume = np.asarray(self.volume_data, dtype=float)
+        lengths = self.lengths
+        result = np.full(len(self), np.nan)
+        valid = lengths > 0
+        if not np.any(valid):
+            return result
+        starts, stops = self.offsets[:-1][valid], self.offsets[1:][valid]
+        d = d[valid]
+
+        # Index of the first point above d, within each curve
+        count = np.add.reduceat((dose <= d_points).astype(np.int64), starts)
+        upper = np.minimum(starts + count, stops - 1)
+        lower = np.maximum(upper - 1, starts)
+
+        x0, x1 = dose[lower], dose[upper]
+        y0, y1 = volume[lower], volume[upper]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = np.where(x1 > x0, (d - x0) / (x1 - x0), 1.0)
+        interpolated = y0 + np.clip(t, 0, 1) * (y1 - y0)
+        result[valid] = np.where(d < dose[starts], volume[starts],
+                                 np.where(d > dose[stops - 1], 0.0, interpolated))
+        return result
+
+    def estimate_mean(self):
+        '''
+        Estimate the mean dose of every curve from its differential volumes
+        (see Dvh.estimate_mean).
+
+        Returns:
+            array with one mean dose per curve (0 when a curve has no volume)
+        '''
+        dose = np.asarray(self.dose_data, dtype=float)
+        volume = np.asarray(self.volume_data, dtype=float)
+        lengths = self.lengths
+        result = np.zeros(len(self))
+        valid = lengths > 0
+        if not np.any(valid):
+            return result
+
+        # Differentiate the volumes within each curve
+        differential = np.empty_like(volume)
+        differential[:-1] = volume[:-1] - volume[1:]
+        differential[self.offsets[1:][valid] - 1] = volume[self.offsets[1:][valid] - 1]
+        starts = self.offsets[:-1][valid]
+        total = np.add.reduceat(differential, starts)
+        weighted = np.add.reduceat(dose * differential, starts)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result[valid] = np.where(total > 0, weighted / total, 0)
+        return result
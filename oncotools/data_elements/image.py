@@ -48,7 +48,7 @@ class Image(object):
         ] * dim  # Spacing between pixels/voxels. Corresponds to pixel/voxel size
         self.direction = [1.0, 0.0, 0.0, 0.0, 1.0,
                           0.0]  # Direction cosines (TODO not yet implemented)
-        self.data = np.empty(
+        self.data = np.zeros(
             shape=self.size[::-1], dtype=float
         )  # Image data. Currently supports one data element per pixel. Vector images not supported
 
@@ -70,9 +70,18 @@ class Image(object):
         Returns:
             Indices of an image's center of mass in the data matrix (X,Y,Z).
         '''
-        pts = self.data.nonzero()
+        pts = self.nonzero_indices()
         return np.mean(pts, axis=1)[::-1]
 
+    def nonzero_indices(self):
+        '''
+        Get the indices of the nonzero voxels in the data buffer.
+
+        Returns:
+            tuple of index arrays in [Z,Y,X] order, as returned by numpy.nonzero
+        '''
+        return np.nonzero(self.data)
+
     def set_image(self,
                   img,
                   origin=None,
@@ -324,7 +333,7 @@ class Image(object):
         Returns:
             numpy array of (x,y,z) points corresponding to nonzero values in image
         '''
-        msk_idx = self.data.nonzero()
+        msk_idx = self.nonzero_indices()
         msk_idx = np.fliplr(np.asarray(msk_idx).T)
         msk_pts = self.transform_index_to_physical_point(msk_idx)
         return msk_pts
@@ -488,6 +497,82 @@ class Image(object):
         return template_indices, self_lower_indices, self_upper_indices, weights
 
 
+# Number of set bits in every possible byte value
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount(packed):
+    '''
+    Count the set bits in a bit-packed buffer.
+
+    Positional arguments:
+        :packed:    numpy array of uint8, as returned by numpy.packbits
+    Returns:
+        number of set bits
+    '''
+    return int(_POPCOUNT_TABLE[packed].sum(dtype=np.int64))
+
+
+def get_bounding_box(data):
+    '''
+    Get the bounding box of the nonzero elements of an array.
+
+    Positional arguments:
+        :data:  N-D numpy array
+    Returns:
+        tuple of slices (one per dimension), or None if the array is all zeros
+    '''
+    box = []
+    for axis in range(data.ndim):
+        other_axes = tuple(a for a in range(data.ndim) if a != axis)
+        nz = np.flatnonzero(np.any(data, axis=other_axes))
+        if nz.size == 0:
+            return None
+        box.append(slice(int(nz[0]), int(nz[-1]) + 1))
+    return tuple(box)
+
+
+def crop_to_bounding_box(data):
+    '''
+    Crop an array to the bounding box of its nonzero elements.
+
+    Positional arguments:
+        :data:  N-D numpy array
+    Returns:
+        :crop:      copy of the data inside the bounding box
+        :offset:    index of the first element of the crop in the original array
+    '''
+    data = np.asarray(data)
+    box = get_bounding_box(data)
+    if box is None:
+        return np.zeros((0,) * data.ndim, dtype=data.dtype), np.zeros(data.ndim, dtype=int)
+    return data[box].copy(), np.array([b.start for b in box], dtype=int)
+
+
+def read_only_view(img):
+    '''
+    Create a shallow copy of an image whose numpy arrays are read-only views of the
+    arrays of the original image. No image data is copied, and the original image
+    stays writeable.
+
+    Positional arguments:
+        :img:   image (or any object holding numpy arrays as attributes)
+    Returns:
+        shallow copy of the image, or None if img is None
+    '''
+    if img is None:
+        return None
+    # Copy the attributes directly: __getstate__ may drop caches or re-encode the data
+    view = img.__class__.__new__(img.__class__)
+    view.__dict__.update(vars(img))
+    for name, value in vars(img).items():
+        if isinstance(value, np.ndarray):
+            value = value.view()
+            value.flags.writeable = False
+            setattr(view, name, value)
+    return view
+
+
 def get_mask_edge_voxels(msk, exclude_z=False):
     mask_neg = np.logical_not(msk.data)
 
@@ -552,23 +637,195 @@ def get_mask_edge_voxels(msk, exclude_z=False):
 
 
 def run_length_encode(mask):
-    ''' Return a run-length-encoded string representation of the ROI binary mask '''
-    maskdata = np.concatenate(([1], mask.data.flatten()))
-    runlength = np.nonzero(np.diff(maskdata))
-    return ','.join(map(str, runlength[0]))
-
-
-def run_length_decode(runlength, dimZYX):
-    ''' Return an ROI instance in the binary mask representation from the runlength string'''
-    cutpoints = np.fromstring(runlength, dtype=np.int32, sep=',')
-    startpoints = cutpoints[1::2]
-    endpoints = cutpoints[2::2]
-    mybuffer = np.zeros(int(np.prod(dimZYX)), dtype=np.dtype('b'))
-    for s, e in zip(startpoints, endpoints):
-        mybuffer[s:e] = True
-    mybuffer = mybuffer.reshape([int(d) for d in dimZYX])
-    msk = Mask()
-    msk.set_image(mybuffer)
+    '''
+    Return a run-length-encoded string representation of the ROI binary mask.
+
+    The string lists the flat indices at which the mask value changes, starting from
+    a virtual voxel with value 1 in front of the buffer.
+    '''
+    if isinstance(mask, (CroppedMask, PackedMask, SparseMask)) and mask._data is None:
+        # Build the runs from the voxel indices to avoid allocating the full buffer
+        shape = tuple(np.asarray(mask.size[::-1]).astype(int))
+        flat = np.ravel_multi_index(mask.nonzero_indices(), shape)
+        flat.sort()
+        breaks = np.flatnonzero(np.diff(flat) != 1) + 1
+        starts = flat[np.concatenate(([0], breaks))[:flat.size]]
+        ends = flat[np.concatenate((breaks - 1, [flat.size - 1]))[:flat.size]] + 1
+        cutpoints = np.empty(2 * starts.size, dtype=np.int64)
+        cutpoints[0::2] = starts
+        cutpoints[1::2] = ends
+        # No cut point at the end of a run that ends on the last voxel
+        if cutpoints.size and cutpoints[-1] == np.prod(shape):
+            cutpoints = cutpoints[:-1]
+        first_inside = flat.size > 0 and flat[0] == 0
+        if first_inside:
+            cutpoints = cutpoints[1:]
+    else:
+        flat = np.asarray(mask.data).ravel() != 0
+        cutpoints = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+        first_inside = flat.size > 0 and flat[0]
+
+    # The virtual voxel is inside the mask, so the buffer starts with a cut point
+    # unless the first voxel is also inside the mask
+    if not first_inside:
+        cutpoints = np.concatenate(([0], cutpoints))
+    return ','.join(map(str, cutpoints.tolist()))
+
+
+def run_length_to_runs(runlength, count):
+    '''
+    Get the runs of voxels inside the mask from a run-length-encoded string.
+
+    Positional arguments:
+        :runlength: run-length-encoded string
+        :count:     number of voxels in the mask
+    Returns:
+        :starts:    flat index of the first voxel of each run
+        :ends:      flat index after the last voxel of each run
+    '''
+    if not runlength.strip():
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    cutpoints = np.array(runlength.split(','), dtype=np.int64)
+    # The encoded buffer starts with a virtual 1 and every cut point toggles the
+    # value, so runs inside the mask lie between bounds [0,1], [2,3], ...
+    # A trailing open run ends at the last voxel.
+    bounds = np.minimum(np.concatenate(([0], cutpoints, [count])), count)
+    starts, ends = bounds[0:-1:2], bounds[1::2]
+    keep = ends > starts
+    return starts[keep], ends[keep]
+
+
+def runs_to_buffer(starts, ends, count, dtype=np.uint8):
+    '''
+    Expand sorted runs into a flat binary buffer.
+
+    Positional arguments:
+        :starts:    flat index of the first voxel of each run
+        :ends:      flat index after the last voxel of each run
+        :count:     length of the buffer
+    Keyword arguments:
+        :dtype:     data type of the buffer
+    '''
+    bounds = np.empty(2 * len(starts) + 2, dtype=np.int64)
+    bounds[0] = 0
+    bounds[1:-1:2] = starts
+    bounds[2:-1:2] = ends
+    bounds[-1] = count
+    values = np.zeros(bounds.size - 1, dtype=dtype)
+    values[1::2] = 1
+    return np.repeat(values, np.diff(bounds))
+
+
+def run_length_to_indices(runlength, count):
+    '''
+    Get the sorted flat indices of the voxels inside the mask from a run-length-encoded
+    string, without allocating the full data buffer.
+
+    Positional arguments:
+        :runlength: run-length-encoded string
+        :count:     number of voxels in the mask
+    Returns:
+        sorted numpy array of flat [Z,Y,X] indices
+    '''
+    return runs_to_indices(*run_length_to_runs(runlength, count))
+
+
+def runs_to_indices(starts, ends):
+    '''
+    Expand sorted runs into the flat indices of their voxels.
+
+    Positional arguments:
+        :starts:    flat index of the first voxel of each run
+        :ends:      flat index after the last voxel of each run
+    '''
+    lengths = ends - starts
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return np.arange(offsets.size, dtype=np.int64) + offsets
+
+
+def _runs_to_crop(starts, ends, shape, dtype):
+    '''
+    Helper function: expand runs into the bounding box of the mask
+    '''
+    if len(starts) == 0:
+        return np.zeros((0, 0, 0), dtype=dtype), np.zeros(3, dtype=int)
+    nz, ny, nx = shape
+
+    # Split runs that wrap around the end of a row into one piece per row
+    row0 = starts // nx
+    row1 = (ends - 1) // nx
+    count = row1 - row0 + 1
+    run = np.repeat(np.arange(len(starts)), count)
+    row = row0[run] + np.arange(run.size) - np.repeat(np.cumsum(count) - count, count)
+    x0 = np.where(row == row0[run], starts[run] % nx, 0)
+    x1 = np.where(row == row1[run], (ends[run] - 1) % nx + 1, nx)
+    z, y = row // ny, row % ny
+
+    # Re-index the pieces inside the bounding box
+    lower = np.array([z.min(), y.min(), x0.min()], dtype=int)
+    crop_shape = np.array([z.max() + 1, y.max() + 1, x1.max()], dtype=int) - lower
+    crop_starts = ((z - lower[0]) * crop_shape[1] + (y - lower[1])) * crop_shape[2] \
+        + x0 - lower[2]
+    crop_ends = crop_starts + (x1 - x0)
+    crop = runs_to_buffer(crop_starts, crop_ends, int(np.prod(crop_shape)), dtype)
+    return crop.reshape(crop_shape), lower
+
+
+def _runs_to_packed(starts, ends, count, chunk_size=1 << 24):
+    '''
+    Helper function: pack runs into bits, one chunk of voxels at a time
+    '''
+    packed = [np.zeros(0, dtype=np.uint8)]
+    for a in range(0, count, chunk_size):
+        b = min(a + chunk_size, count)
+        i0 = np.searchsorted(ends, a, side='right')
+        i1 = np.searchsorted(starts, b, side='left')
+        chunk_starts = np.clip(starts[i0:i1], a, b) - a
+        chunk_ends = np.clip(ends[i0:i1], a, b) - a
+        packed.append(np.packbits(runs_to_buffer(chunk_starts, chunk_ends, b - a)))
+    return np.concatenate(packed)
+
+
+def run_length_decode(runlength, dimZYX, representation='dense'):
+    '''
+    Return an ROI instance in the binary mask representation from the runlength string
+
+    Positional arguments:
+        :runlength: run-length-encoded string
+        :dimZYX:    list of dimensions in Z, Y, and X
+    Keyword arguments:
+        :representation:    'dense' (Mask), 'cropped' (CroppedMask), 'packed' (PackedMask)
+            or 'sparse' (SparseMask). Cropped, packed and sparse masks are decoded without
+            allocating the full data buffer.
+    '''
+    shape = [int(d) for d in dimZYX]
+    count = int(np.prod(shape))
+    starts, ends = run_length_to_runs(runlength, count)
+
+    if representation == 'dense':
+        # Only expand the runs between the first and last voxel of the mask
+        buf = np.zeros(count, dtype=np.dtype('b'))
+        if len(starts):
+            first, last = starts[0], ends[-1]
+            buf[first:last] = runs_to_buffer(starts - first, ends - first,
+                                             last - first, np.dtype('b'))
+        msk = Mask()
+        msk.data = buf.reshape(shape)
+    elif representation == 'cropped':
+        msk = CroppedMask()
+        msk.set_crop(*_runs_to_crop(starts, ends, shape, np.dtype('b')))
+    elif representation == 'packed':
+        msk = PackedMask()
+        msk.packed = _runs_to_packed(starts, ends, count)
+    elif representation == 'sparse':
+        msk = SparseMask()
+        msk.indices = runs_to_indices(starts, ends)
+    else:
+        raise ValueError('Unknown mask representation: {}'.format(representation))
+    msk.dimension = len(shape)
+    msk.size = tuple(shape[::-1])
+    msk.update_end()
     return msk
 
 
@@ -599,7 +856,7 @@ class Mask(Image):
 
     def __init__(self, dim=3):
         Image.__init__(self, dim=3)
-        self.edge_mask = None
+        self._edges = {}
         self.volume = None
 
     def load(self, infile, dimX=None, dimY=None, dimZ=None):
@@ -624,7 +881,7 @@ class Mask(Image):
         Returns:
             numpy array of lower bound of the nonzero elements of the mask
         '''
-        z, y, x = np.amin(np.nonzero(self.data), 1)
+        z, y, x = np.amin(self.nonzero_indices(), 1)
         return np.array([x, y, z])
 
     @property
@@ -635,7 +892,7 @@ class Mask(Image):
         Returns:
             numpy array of upper bound of the nonzero elements of the mask
         '''
-        z, y, x = np.amax(np.nonzero(self.data), 1)
+        z, y, x = np.amax(self.nonzero_indices(), 1)
         return np.array([x + 1, y + 1, z + 1])
 
     @property
@@ -646,19 +903,51 @@ class Mask(Image):
         Returns:
             tuple of numpy arrays (lower bound, upper bound) of the nonzero elements of the mask
         '''
-        nz = np.nonzero(self.data)
+        nz = self.nonzero_indices()
         zl, yl, xl = np.amin(nz, 1)
         zu, yu, xu = np.amax(nz, 1)
         return (np.array([xl, yl, zl]), np.array([xu + 1, yu + 1, zu + 1]))
 
+    def get_edges(self, exclude_z=False):
+        '''
+        Get the edge voxels of the mask (see MaskEdges).
+
+        The edges are computed once per neighbourhood (2D or 3D) and cached on the mask.
+        Call clear_edges() after modifying the mask data in place.
+
+        Keyword arguments:
+            :exclude_z: if True, only look for edges in the x-y plane (2D neighbourhood)
+        Returns:
+            MaskEdges
+        '''
+        edges = self.__dict__.setdefault('_edges', {})
+        exclude_z = bool(exclude_z)
+        if exclude_z not in edges:
+            edges[exclude_z] = MaskEdges(self, exclude_z=exclude_z)
+        return edges[exclude_z]
+
+    def clear_edges(self):
+        '''
+        Clear the cached edge voxels of the mask.
+        '''
+        self._edges = {}
+
+    def __getstate__(self):
+        # Copies and pickles do not carry the cached edges
+        state = self.__dict__.copy()
+        state['_edges'] = {}
+        return state
+
     def get_mask_edge_voxels(self, exclude_z=False):
         '''
         Get all voxels on the edge of the mask.
+
+        Keyword arguments:
+            :exclude_z: if True, only look for edges in the x-y plane
+        Returns:
+            binary mask of the edge voxels
         '''
-        if self.edge_mask is not None:
-            return self.edge_mask
-        self.edge_mask = get_mask_edge_voxels(self, exclude_z)
-        return self.edge_mask
+        return self.get_edges(exclude_z).mask
 
     def get_volume(self, edge_voxel_weight=None):
         '''
@@ -670,16 +959,50 @@ class Mask(Image):
             volume of the binary mask
         '''
         voxelVolume = np.prod(np.array(self.spacing))
-        self.volume = len(self.data.nonzero()[0]) * voxelVolume
+        self.volume = self.count_voxels() * voxelVolume
 
         if edge_voxel_weight is not None and edge_voxel_weight != 1.0:
-            if self.edge_mask is None:
-                self.edge_mask = self.get_mask_edge_voxels(exclude_z=True)
-            self.volume -= (1 - edge_voxel_weight) * len(
-                self.edge_mask.data.nonzero()[0]) * voxelVolume
+            self.volume -= (1 - edge_voxel_weight) * \
+                self.get_edges(exclude_z=True).num_edge_voxels * voxelVolume
 
         return self.volume
 
+    def count_voxels(self):
+        '''
+        Count the voxels inside the mask.
+
+        Returns:
+            number of nonzero voxels
+        '''
+        return int(np.count_nonzero(self.data))
+
+    def crop(self):
+        '''
+        Crop the mask to the bounding box of its nonzero voxels.
+
+        Returns:
+            CroppedMask with the same image information as the current mask
+        '''
+        return CroppedMask.from_mask(self)
+
+    def pack(self):
+        '''
+        Store the mask as a bit-packed buffer.
+
+        Returns:
+            PackedMask with the same image information as the current mask
+        '''
+        return PackedMask.from_mask(self)
+
+    def sparsify(self):
+        '''
+        Store the mask as the flat indices of its voxels.
+
+        Returns:
+            SparseMask with the same image information as the current mask
+        '''
+        return SparseMask.from_mask(self)
+
     def run_length_encode(self):
         '''
         Return:
@@ -694,6 +1017,604 @@ class Mask(Image):
         Positional arguments:
             :points:    list of (x,y,z) indices that correspond to voxels in the mask
         '''
-        self.data = np.zeros(self.data.shape)
-        for pt in points:
-            self.data[pt[2], pt[1], pt[0]] = 1
+        data = np.zeros(self.data.shape, dtype=np.uint8)
+        points = np.asarray(points, dtype=int).reshape(-1, 3)
+        data[points[:, 2], points[:, 1], points[:, 0]] = 1
+        self.data = data
+        self.clear_edges()
+
+
+class MaskEdges(object):
+    '''
+    Edge voxels of a binary mask, for one neighbourhood.
+
+    A voxel of the mask is on the edge if one of its 6 neighbours (3D), or one of
+    its 4 neighbours in the x-y plane (2D, exclude_z=True), is outside the mask.
+    Masks cache one MaskEdges per neighbourhood (see Mask.get_edges), so that edge
+    weighting of volumes and DVHs is a lookup into this cache.
+
+    Positional arguments:
+        :msk:       binary mask
+    Keyword arguments:
+        :exclude_z: if True, use the 2D neighbourhood in the x-y plane
+    Attributes:
+        :mask:                  binary mask of the edge voxels
+        :edge_indices:          indices of the edge voxels, in [Z,Y,X] order
+        :num_edge_voxels:       number of edge voxels
+        :num_interior_voxels:   number of mask voxels that are not on the edge
+    '''
+
+    def __init__(self, msk, exclude_z=False):
+        self.exclude_z = exclude_z
+        self.mask = get_mask_edge_voxels(msk, exclude_z)
+        self.edge_indices = np.nonzero(self.mask.data)
+        self.num_edge_voxels = len(self.edge_indices[0])
+        self.num_interior_voxels = msk.count_voxels() - self.num_edge_voxels
+        self.__msk = msk
+        self.__interior_indices = None
+
+    @property
+    def interior_indices(self):
+        '''
+        Indices of the mask voxels that are not on the edge, in [Z,Y,X] order.
+        '''
+        if self.__interior_indices is None:
+            self.__interior_indices = np.nonzero(
+                np.logical_and(self.__msk.data, np.logical_not(self.mask.data)))
+        return self.__interior_indices
+
+    def is_edge(self, indices):
+        '''
+        Look up whether voxels are on the edge of the mask.
+
+        Positional arguments:
+            :indices:   tuple of index arrays in [Z,Y,X] order, as returned by numpy.nonzero
+        Returns:
+            boolean array, True for the edge voxels
+        '''
+        return self.mask.data[indices] > 0
+
+
+class CroppedMask(Mask):
+    '''
+    Binary mask that only stores the bounding box of its nonzero voxels.
+
+    The cropped buffer is stored in 'crop_data', and 'crop_offset' holds the index of
+    its first voxel in the full data buffer (in [Z,Y,X] order, like the buffer). The
+    origin, index, size and spacing still describe the full image, so a cropped mask
+    can be used anywhere a Mask is expected.
+
+    The full data buffer is only allocated when the 'data' attribute is accessed. From
+    then on it replaces the crop (so that in-place edits are kept) until crop() is
+    called again. Copies and pickles only ever store the crop.
+    '''
+
+    def __init__(self, dim=3):
+        self._data = None
+        Mask.__init__(self, dim=dim)
+        self.set_crop(np.zeros((0, 0, 0), dtype=np.uint8), np.zeros(3, dtype=int))
+
+    @classmethod
+    def from_mask(cls, msk):
+        '''
+        Create a cropped copy of a mask.
+
+        Positional arguments:
+            :msk:   mask to crop
+        '''
+        cropped = cls()
+        cropped.copy_information(msk)
+        if isinstance(msk, CroppedMask) and msk._data is None:
+            cropped.set_crop(msk.crop_data.copy(), msk.crop_offset)
+        else:
+            cropped.data = msk.data
+        return cropped
+
+    @classmethod
+    def from_region(cls, msk, box):
+        '''
+        Create a cropped mask holding a box of another mask, without copying any data.
+
+        The crop is a read-only view of the data of msk (or of its crop), so both masks
+        share their voxels until the full data buffer of the new mask is allocated.
+
+        Positional arguments:
+            :msk:   mask to take the region from
+            :box:   tuple of slices in [Z,Y,X] order, in the full data buffer of msk
+        '''
+        region = cls()
+        region.copy_information(msk)
+        if isinstance(msk, CroppedMask) and msk._data is None:
+            source, offset = msk.crop_data, msk.crop_offset
+        else:
+            source, offset = msk.data, np.zeros(3, dtype=int)
+        full_shape = np.asarray(msk.size[::-1]).astype(int)
+        local = []
+        for b, o, n, full in zip(box, offset, source.shape, full_shape):
+            start, stop, _ = b.indices(full)
+            start = min(max(start - o, 0), n)
+            local.append(slice(start, max(min(stop - o, n), start)))
+        view = source[tuple(local)].view()
+        view.flags.writeable = False
+        region.set_crop(view, [o + l.start for o, l in zip(offset, local)])
+        return region
+
+    @property
+    def data(self):
+        '''
+        Full [Z,Y,X] data buffer, allocated on first access.
+        '''
+        if self._data is None:
+            shape = np.asarray(self.size[::-1]).astype(int)
+            data = np.zeros(shape, dtype=self.crop_data.dtype)
+            data[self.crop_box] = self.crop_data
+            self._data = data
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = None
+        self.set_crop(*crop_to_bounding_box(value))
+
+    @property
+    def crop_box(self):
+        '''
+        Tuple of slices locating the crop inside the full data buffer.
+        '''
+        return tuple(slice(o, o + n)
+                     for o, n in zip(self.crop_offset, self.crop_data.shape))
+
+    def set_crop(self, crop_data, crop_offset):
+        '''
+        Set the cropped data buffer.
+
+        Positional arguments:
+            :crop_data:     [Z,Y,X] buffer holding the bounding box of the mask
+            :crop_offset:   [Z,Y,X] index of the first voxel of the crop in the full buffer
+        '''
+        self._data = None
+        self.crop_data = crop_data
+        self.crop_offset = np.array(crop_offset, dtype=int)
+
+    def crop(self):
+        '''
+        Drop the full data buffer (if it was allocated) and keep only the bounding box.
+
+        Returns:
+            the current mask
+        '''
+        if self._data is not None:
+            self.set_crop(*crop_to_bounding_box(self._data))
+        return self
+
+    def nonzero_indices(self):
+        '''
+        Get the indices of the nonzero voxels without allocating the full data buffer.
+
+        Returns:
+            tuple of index arrays in [Z,Y,X] order, as returned by numpy.nonzero
+        '''
+        if self._data is not None:
+            return np.nonzero(self._data)
+        return tuple(idx + offset for idx, offset in
+                     zip(np.nonzero(self.crop_data), self.crop_offset))
+
+    def count_voxels(self):
+        '''
+        Count the voxels inside the mask.
+
+        Returns:
+            number of nonzero voxels
+        '''
+        if self._data is not None:
+            return int(np.count_nonzero(self._data))
+        return int(np.count_nonzero(self.crop_data))
+
+    def __getstate__(self):
+        state = Mask.__getstate__(self)
+        if self._data is not None:
+            state['crop_data'], state['crop_offset'] = crop_to_bounding_box(self._data)
+            state['_data'] = None
+        return state
+
+
+class PackedMask(Mask):
+    '''
+    Binary mask stored as a bit-packed buffer (one bit per voxel).
+
+    The flattened [Z,Y,X] buffer is stored in 'packed', as returned by numpy.packbits.
+    Set operations and volumes work directly on the packed bytes, which takes 8 times
+    less memory than a uint8 mask (64 times less than a float64 mask).
+
+    As for CroppedMask, the full data buffer is only allocated when the 'data' attribute
+    is accessed, and it replaces the packed buffer until pack() is called again. Copies
+    and pickles only ever store the packed buffer.
+    '''
+
+    def __init__(self, dim=3):
+        self._data = None
+        Mask.__init__(self, dim=dim)
+        self.packed = np.zeros(0, dtype=np.uint8)
+
+    @classmethod
+    def from_mask(cls, msk):
+        '''
+        Create a bit-packed copy of a mask.
+
+        Positional arguments:
+            :msk:   mask to pack
+        '''
+        packed = cls()
+        packed.copy_information(msk)
+        if isinstance(msk, PackedMask):
+            packed.packed = msk.get_packed().copy()
+        else:
+            packed.data = msk.data
+        return packed
+
+    @property
+    def data(self):
+        '''
+        Full [Z,Y,X] data buffer (uint8), unpacked on first access.
+        '''
+        if self._data is None:
+            shape = np.asarray(self.size[::-1]).astype(int)
+            count = int(np.prod(shape))
+            self._data = np.unpackbits(self.packed)[:count].reshape(shape)
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = None
+        self.packed = np.packbits(np.asarray(value).ravel() != 0)
+
+    def get_packed(self):
+        '''
+        Get the bit-packed buffer, including any edits made to the unpacked data.
+        '''
+        if self._data is not None:
+            return np.packbits(self._data.ravel() != 0)
+        return self.packed
+
+    def pack(self):
+        '''
+        Drop the full data buffer (if it was allocated) and keep only the packed bits.
+
+        Returns:
+            the current mask
+        '''
+        if self._data is not None:
+            self.packed = self.get_packed()
+            self._data = None
+        return self
+
+    def nonzero_indices(self):
+        '''
+        Get the indices of the nonzero voxels.
+
+        Returns:
+            tuple of index arrays in [Z,Y,X] order, as returned by numpy.nonzero
+        '''
+        if self._data is not None:
+            return np.nonzero(self._data)
+        shape = tuple(np.asarray(self.size[::-1]).astype(int))
+        flat = np.flatnonzero(np.unpackbits(self.packed))
+        return np.unravel_index(flat[flat < np.prod(shape)], shape)
+
+    def count_voxels(self):
+        '''
+        Count the voxels inside the mask with a popcount of the packed buffer.
+
+        Returns:
+            number of nonzero voxels
+        '''
+        return popcount(self.get_packed())
+
+    def __combine(self, other, operation):
+        '''
+        Helper method: apply a bitwise operation to the packed buffers of two masks
+        '''
+        if not np.array_equal(np.asarray(self.size, dtype=int),
+                              np.asarray(other.size, dtype=int)):
+            raise ValueError('Mask sizes do not match: {} and {}'.format(
+                list(self.size), list(other.size)))
+        if isinstance(other, PackedMask):
+            other_packed = other.get_packed()
+        else:
+            other_packed = np.packbits(np.asarray(other.data).ravel() != 0)
+        result = PackedMask()
+        result.copy_information(self)
+        result.packed = operation(self.get_packed(), other_packed)
+        return result
+
+    def union(self, other):
+        '''
+        Voxels inside either mask.
+
+        Positional arguments:
+            :other:     mask with the same size as the current mask
+        Returns:
+            PackedMask
+        '''
+        return self.__combine(other, np.bitwise_or)
+
+    def intersection(self, other):
+        '''
+        Voxels inside both masks.
+
+        Positional arguments:
+            :other:     mask with the same size as the current mask
+        Returns:
+            PackedMask
+        '''
+        return self.__combine(other, np.bitwise_and)
+
+    def difference(self, other):
+        '''
+        Voxels inside the current mask but not inside the other mask.
+
+        Positional arguments:
+            :other:     mask with the same size as the current mask
+        Returns:
+            PackedMask
+        '''
+        return self.__combine(other, lambda a, b: np.bitwise_and(a, np.invert(b)))
+
+    def __getstate__(self):
+        state = Mask.__getstate__(self)
+        if self._data is not None:
+            state['packed'] = self.get_packed()
+            state['_data'] = None
+        return state
+
+
+class SparseMask(Mask):
+    '''
+    Binary mask stored as the sorted flat [Z,Y,X] indices of its voxels.
+
+    Most consumers of a mask only need the indices of its voxels (dose lookup, point
+    clouds, volumes), so this representation skips the dense buffer and the full-grid
+    scan of numpy.nonzero. As for CroppedMask, the full data buffer is only allocated
+    when the 'data' attribute is accessed, and it replaces the indices until
+    sparsify() is called again.
+    '''
+
+    def __init__(self, dim=3):
+        self._data = None
+        Mask.__init__(self, dim=dim)
+        self.indices = np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def from_mask(cls, msk):
+        '''
+        Create a sparse copy of a mask.
+
+        Positional arguments:
+            :msk:   mask to convert
+        '''
+        sparse = cls()
+        sparse.copy_information(msk)
+        sparse.indices = sparse.get_flat_indices(msk.nonzero_indices())
+        return sparse
+
+    @classmethod
+    def from_indices(cls, indices, template):
+        '''
+        Create a sparse mask from voxel indices.
+
+        Positional arguments:
+            :indices:   sorted flat [Z,Y,X] indices, or an N x 3 array of [Z,Y,X] indices
+            :template:  image with the geometry (origin, size, spacing) of the mask
+        '''
+        sparse = cls()
+        sparse.copy_information(template)
+        indices = np.asarray(indices, dtype=np.int64)
+        if indices.ndim > 1:
+            indices = np.sort(sparse.get_flat_indices(tuple(indices.T)))
+        sparse.indices = indices
+        return sparse
+
+    @property
+    def shape(self):
+        '''
+        Shape of the full [Z,Y,X] data buffer.
+        '''
+        return tuple(int(n) for n in np.asarray(self.size[::-1]))
+
+    def get_flat_indices(self, nonzero_indices):
+        '''
+        Convert a tuple of [Z,Y,X] index arrays into flat indices.
+        '''
+        return np.ravel_multi_index(nonzero_indices, self.shape).astype(np.int64)
+
+    @property
+    def data(self):
+        '''
+        Full [Z,Y,X] data buffer (uint8), built on first access.
+        '''
+        if self._data is None:
+            data = np.zeros(self.shape, dtype=np.uint8)
+            data.ravel()[self.indices] = 1
+            self._data = data
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = None
+        self.indices = np.flatnonzero(np.asarray(value)).astype(np.int64)
+
+    def sparsify(self):
+        '''
+        Drop the full data buffer (if it was allocated) and keep only the indices.
+
+        Returns:
+            the current mask
+        '''
+        if self._data is not None:
+            self.data = self._data
+        return self
+
+    def nonzero_indices(self):
+        '''
+        Get the indices of the nonzero voxels without allocating the full data buffer.
+
+        Returns:
+            tuple of index arrays in [Z,Y,X] order, as returned by numpy.nonzero
+        '''
+        if self._data is not None:
+            return np.nonzero(self._data)
+        return np.unravel_index(self.indices, self.shape)
+
+    def count_voxels(self):
+        '''
+        Count the voxels inside the mask.
+
+        Returns:
+            number of nonzero voxels
+        '''
+        if self._data is not None:
+            return int(np.count_nonzero(self._data))
+        return int(self.indices.size)
+
+    def __getstate__(self):
+        state = Mask.__getstate__(self)
+        if self._data is not None:
+            state['indices'] = np.flatnonzero(self._data).astype(np.int64)
+            state['_data'] = None
+        return state
+
+
+def label_dtype(num_labels):
+    '''
+    Get the smallest signed integer type that can store the given number of labels.
+
+    Positional arguments:
+        :num_labels:    number of labels, not counting the background label (0)
+    Returns:
+        numpy data type (int8, int16 or int32)
+    '''
+    for dtype in [np.int8, np.int16]:
+        if num_labels <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int32)
+
+
+class LabelMap(Image):
+    '''
+    Integer image that assigns each voxel to one of several disjoint regions.
+
+    Voxels outside every region have the label 0, and the i-th region (counting from
+    0) has the label i + 1. 'regions' holds one metadata dictionary per region, with
+    at least a 'name' entry. The data buffer uses the smallest integer type that fits
+    all labels (see label_dtype), so a partition into N regions takes one int8 buffer
+    instead of N full-size masks.
+    '''
+
+    def __init__(self, dim=3):
+        Image.__init__(self, dim=dim)
+        self.regions = []
+
+    @classmethod
+    def from_template(cls, template, regions):
+        '''
+        Create an empty label map.
+
+        Positional arguments:
+            :template:  image with the geometry (origin, size, spacing) of the label map
+            :regions:   list of region names, or of metadata dictionaries with a 'name'
+        '''
+        label_map = cls()
+        label_map.copy_information(template)
+        label_map.regions = [r if isinstance(r, dict) else {'name': str(r)} for r in regions]
+        label_map.fill_buffer(0, dtype=label_dtype(len(label_map.regions)))
+        return label_map
+
+    @classmethod
+    def from_masks(cls, masks, regions=None):
+        '''
+        Create a label map from a list of disjoint masks.
+
+        Positional arguments:
+            :masks:     list of masks with the same geometry
+        Keyword arguments:
+            :regions:   list of region names or metadata, by default the mask indices
+        Raises:
+            :ValueError:    if the masks overlap
+        '''
+        if regions is None:
+            regions = [str(i) for i in range(len(masks))]
+        if len(regions) != len(masks):
+            raise ValueError('Expected one region per mask')
+        label_map = cls.from_template(masks[0], regions)
+        for label, m in enumerate(masks, 1):
+            inside = m.data != 0
+            if np.any(label_map.data[inside]):
+                raise ValueError('Masks must not overlap')
+            label_map.data[inside] = label
+        return label_map
+
+    @property
+    def num_regions(self):
+        '''
+        Number of regions in the label map, not counting the background.
+        '''
+        return len(self.regions)
+
+    @property
+    def labels(self):
+        '''
+        Labels of the regions, in the same order as 'regions'.
+        '''
+        return np.arange(1, self.num_regions + 1)
+
+    def get_region_names(self):
+        '''
+        Get the name of every region.
+        '''
+        return [r['name'] for r in self.regions]
+
+    def count_voxels(self):
+        '''
+        Count the voxels in each region, in a single pass over the data buffer.
+
+        Returns:
+            numpy array with the number of voxels of each region
+        '''
+        counts = np.bincount(self.data.ravel(), minlength=self.num_regions + 1)
+        return counts[1:self.num_regions + 1]
+
+    def get_volumes(self):
+        '''
+        Compute the volume of each region.
+
+        Returns:
+            numpy array with the volume of each region
+        '''
+        return self.count_voxels() * np.prod(np.array(self.spacing))
+
+    def get_mask(self, region):
+        '''
+        Get the binary mask of a single region.
+
+        Positional arguments:
+            :region:    index of the region (from 0), or its name
+        Returns:
+            Mask with the same image information as the label map
+        '''
+        if not isinstance(region, (int, np.integer)):
+            region = self.get_region_names().index(region)
+        if region < 0 or region >= self.num_regions:
+            raise ValueError('Invalid region: ' + str(region))
+        msk = Mask()
+        msk.copy_information(self)
+        msk.data = (self.data == region + 1).astype(np.uint8)
+        return msk
+
+    def to_masks(self):
+        '''
+        Split the label map into one binary mask per region.
+
+        Returns:
+            List of Mask objects, in the same order as 'regions'
+        '''
+        return [self.get_mask(i) for i in range(self.num_regions)]
@@ -7,8 +7,9 @@ Contours should be defined according to dicompyler conventions as a dictionary w
     value: list of all contours on that plane
 '''
 
-from matplotlib.path import Path
 from . import image
+from ..utils import distance
+from ..utils.rasterize import rasterize_path, polygon_contains_polygon
 import numpy as np
 import warnings
 
@@ -77,6 +78,8 @@ class Contour(object):
         For a counter-clockwise path, the 'path.contains_point(s)' function radius will
         expand the path, whereas for a clockwise path, the radius will contract the path.
         '''
+        from matplotlib.path import Path
+
         data = self.data[:, :2]
         if direction is None:
             return Path(np.array(data))
@@ -109,6 +112,69 @@ class Contour(object):
         return np.sign(self.get_area())
 
 
+def _rasterize_slice(mask, plane, contours, radius, map_points_to_voxels):
+    '''
+    Rasterize all contours on one slice of the mask (in place).
+
+    Positional arguments:
+        :mask:      mask defining the image geometry
+        :plane:     2D slice of the mask buffer into which the contours are rasterized
+        :contours:  list of contours on the slice
+        :radius:    expansion radius applied to the contours
+        :map_points_to_voxels: map the contour points to the nearest voxel coordinates
+    '''
+    for cntr in contours:
+        # Let 'l' and 'u' correspond to the lower and upper indices of the contour
+        # on the mask
+        lowerIdx, _ = mask.transform_physical_point_to_index(cntr.min())
+        upperIdx, _ = mask.transform_physical_point_to_index(cntr.max())
+        idx = np.vstack((lowerIdx, upperIdx))
+        l = np.maximum(idx.min(0)[:2], 0)
+        u = np.minimum(idx.max(0)[:2], np.array(plane.shape[::-1]) - 1)
+        if np.any(u < l):
+            continue
+
+        if map_points_to_voxels:
+            # Better estimate Pinnacle binary masks by mapping each contour point
+            # to the center of the nearest voxel
+            contour_idx, _ = mask.transform_physical_point_to_index(cntr.data)
+            path = Contour(mask.transform_index_to_physical_point(contour_idx)).get_path()
+        else:
+            path = cntr.get_path()
+
+        # Determine which voxels are inside the current contour. Use a contour expansion
+        # to ensure that pixels along outer contour paths are added to the mask and
+        # pixels along inner contour paths are not subtracted from the mask
+        pointsInside = rasterize_path(
+            path, (u[1] - l[1] + 1, u[0] - l[0] + 1),
+            mask.origin, mask.spacing, radius=radius, offset=l)
+
+        # Add the pointsInside to the mask.
+        # (Operator ^= is compound assignment for XOR, which
+        # is used to remove masked voxels inside ring structures)
+        plane[l[1]:(1 + u[1]), l[0]:(1 + u[0])] ^= pointsInside
+
+
+_worker_state = {}
+
+
+def _init_rasterize_worker(buffer, shape, geometry):
+    '''
+    Initialize a process used by Roi.get_mask with a view on the shared mask buffer.
+    '''
+    _worker_state['data'] = np.frombuffer(buffer, dtype=np.uint8).reshape(shape)
+    _worker_state['geometry'] = geometry
+
+
+def _rasterize_shared_slice(task):
+    '''
+    Rasterize the contours of one slice into the shared mask buffer.
+    '''
+    slice_index, contours, radius, map_points_to_voxels = task
+    _rasterize_slice(_worker_state['geometry'], _worker_state['data'][slice_index],
+                     contours, radius, map_points_to_voxels)
+
+
 class Roi(object):
     '''
     Region of interest (ROI) class. Defines parameters and functions that relate
@@ -189,12 +255,12 @@ class Roi(object):
             slice_thickness = 0
 
         for plane, plane_contours in contours.items():
-            paths = [c.get_path() for c in plane_contours]
-            contains_path = np.zeros((len(paths), len(paths)))
-            for i, p1 in enumerate(paths):
-                for j, p2 in enumerate(paths):
+            polygons = [c.data[:, :2] for c in plane_contours]
+            contains_path = np.zeros((len(polygons), len(polygons)))
+            for i, p1 in enumerate(polygons):
+                for j, p2 in enumerate(polygons):
                     if i != j:
-                        contains_path[i, j] = p1.contains_path(p2)
+                        contains_path[i, j] = polygon_contains_polygon(p1, p2)
                     # A path not contained within any other path marks the outer bound of the
                     # binary mask. A path contained within one other path marks an inner boundary
                     # of a ring structure. A path contained within two other paths marks the outer
@@ -232,7 +298,8 @@ class Roi(object):
                  size=None,
                  spacing=None,
                  radius=0.0,
-                 map_points_to_voxels=False):
+                 map_points_to_voxels=False,
+                 workers=None):
         '''
         Get the binary mask for the roi.
 
@@ -244,6 +311,8 @@ class Roi(object):
             :map_points_to_voxels: boolean value.
                 If True, contour points are mapped to the nearest mask voxel coordinates
                 before generating the path.
+            :workers:   number of processes used to rasterize the mask slices.
+                By default, slices are rasterized one after another.
         '''
         # In most use cases, will always go in here
         if hasattr(self, 'mask') and self.mask is not None:
@@ -262,53 +331,38 @@ class Roi(object):
         # inner contours run clockwise (volume is subtracted from the mask)
         self.check_contour_directions()
 
-        # Evaluate each contour
+        # Group the contours by mask slice. Slices are independent of each other, so
+        # they can be rasterized in parallel, each one writing into its own plane
+        # of the mask buffer
+        slices = {}
         for cntr in self.contours:
-            # Let 'l' and 'u' correspond to the lower and upper indices of the contour
-            # on the mask
-            lowerIdx, _ = mask.transform_physical_point_to_index(
-                cntr.min())
-            upperIdx, _ = mask.transform_physical_point_to_index(
-                cntr.max())
-            idx = np.vstack((lowerIdx, upperIdx))
-            l, u = idx.min(0), idx.max(0)
-            xIndices = np.arange(l[0], u[0] + 1)
-            yIndices = np.arange(l[1], u[1] + 1)
-
-            xCoords = mask.origin[0] + xIndices * mask.spacing[0]
-            yCoords = mask.origin[1] + yIndices * mask.spacing[1]
-            points = np.vstack(np.meshgrid(xCoords, yCoords)).reshape(2, -1).T
-
-            # Determine which points are inside the current contour. Use a contour expansion
-            # to ensure that pixels along outer contour paths are added to the mask and
-            # pixels along inner contour paths are not subtracted from the mask
-            if map_points_to_voxels:
-                    # Better estimate Pinnacle binary masks by mapping each contour point
-                    # to the center of the nearest voxel
-                contour_idx, _ = mask.transform_physical_point_to_index(
-                    cntr.data)
-                mapped_contour = Contour(
-                    mask.transform_index_to_physical_point(contour_idx))
-                path = mapped_contour.get_path()
-            else:
-                path = cntr.get_path()
-
-            pointsInside = path.contains_points(points, radius=radius)
-            if len(pointsInside) > 0:
-                pointsInside = pointsInside.reshape(len(yIndices), -1)
-
-                # Add the pointsInside to the mask.
-                # (Operator ^= is compound assignment for XOR, which
-                # is used to remove masked voxels inside ring structures)
-                slice_index = int(round(
-                    (cntr.plane - mask.origin[2]) / mask.spacing[2]))
-                if slice_index < 0 or slice_index >= mask.data.shape[0]:
-                    warnings.warn('Slice index out of bounds', Warning)
-                mask.data[slice_index, l[1]:(1 + u[1]), l[0]:(
-                    1 + u[0])] ^= pointsInside
+            slice_index = int(round(
+                (cntr.plane - mask.origin[2]) / mask.spacing[2]))
+            if slice_index < 0 or slice_index >= mask.data.shape[0]:
+                warnings.warn('Slice index out of bounds', Warning)
+                continue
+            slices.setdefault(slice_index, []).append(cntr)
+
+        if workers is not None and workers > 1 and len(slices) > 1:
+            # Rasterize the slices in a pool of processes. Each worker writes its
+            # slices directly into a mask buffer shared between the processes
+            from multiprocessing import Pool, RawArray
+            buffer = RawArray('B', mask.data.size)
+            geometry = image.Mask()
+            geometry.copy_information(mask)
+            tasks = [(slice_index, slice_contours, radius, map_points_to_voxels)
+                     for slice_index, slice_contours in slices.items()]
+            with Pool(workers, initializer=_init_rasterize_worker,
+                      initargs=(buffer, mask.data.shape, geometry)) as pool:
+                pool.map(_rasterize_shared_slice, tasks)
+            mask.data[:] = np.frombuffer(buffer, dtype=np.uint8).reshape(mask.data.shape)
+        else:
+            for slice_index, slice_contours in slices.items():
+                _rasterize_slice(mask, mask.data[slice_index], slice_contours,
+                                 radius, map_points_to_voxels)
 
         voxelVolume = abs(np.prod(mask.spacing))
-        self.mask_volume = sum(sum(sum(mask.data))) * voxelVolume
+        self.mask_volume = np.count_nonzero(mask.data) * voxelVolume
         return mask
 
     def get_mask_volume(self, edge_voxel_weight=None):
@@ -621,108 +675,54 @@ class Roi(object):
         Returns:
             run-length-encoded string representation of the ROI binary mask
         '''
-        self.mask.run_length_encode()
+        return self.mask.run_length_encode()
 
-    def run_length_decode(self, runlength, dimZYX):
+    def run_length_decode(self, runlength, dimZYX, representation='dense'):
         '''
         Decode a string into an ROI object
 
         Positional arguments:
             :runlength: run-length-encoded string
             :dimZYX:    list of dimensions in Z, Y, and X
+        Keyword arguments:
+            :representation:    'dense', 'cropped', 'packed' or 'sparse' binary mask
         Returns
             roi instance of the binary mask representation
         '''
-        self.mask = image.run_length_decode(runlength, dimZYX)
+        self.mask = image.run_length_decode(runlength, dimZYX, representation)
         return self.mask
 
-    def compute_edt(self, msk=None, limits=None, verbose=True):
+    def compute_edt(self, msk=None, limits=None, verbose=False, signed=False, workers=None):
         """
         Compute the Euclidean distance transform for the given ROI binary mask.
 
+        Distances are exact and in physical units, taking the voxel spacing into account
+        (see oncotools.utils.distance).
+
         Keyword arguments:
-            :msK:       edge mask
-            :limits:
+            :msk:       binary mask (e.g., an edge mask), by default the ROI mask
+            :limits:    unused, kept for compatibility
+            :verbose:   unused, kept for compatibility
+            :signed:    if True, compute the signed distance to the mask surface: positive
+                outside of the mask, negative inside, and 0 on its edge voxels.
+                Otherwise, compute the distance to the nearest voxel of the mask.
+            :workers:   number of threads used to process the rows of each axis.
+                By default, all rows are processed in the calling thread.
+        Returns:
+            Image of distances, or None if there is no mask
         """
-        import time
         if msk is None:
             msk = self.mask
         if msk is None:
             return None
 
-        ND = len(msk.data.shape)  # Number of Dimensions
-        edt = np.empty_like(msk.data, dtype=np.float)
-        edt.fill(np.inf)
-        root = np.zeros(msk.data.shape + (ND, ), dtype=np.uint16)
-
-        idx = Index(np.nonzero(msk.data))
-        edt[idx] = 0
-        root[idx] = idx.array
-        counter = 0
-        total_voxels = 0
-        while idx:
-            counter += 1
-            total_voxels += idx.array.shape[0]
-            t0 = time.clock()
-            newidx = None
-            if verbose:
-                print('Iteration {0}: {1} voxels, {2} total voxels, '.format(
-                counter, idx.array.shape[0], total_voxels))
-            for dim in range(ND):
-                for offset in [-1, 1]:
-                    (idx_off, inbounds) = idx.offset(dim, offset, msk)
-                    idx_inbounds = idx.apply_mask(inbounds)
-                    idx_off = idx_off.apply_mask(inbounds)
-
-                    dist = idx_off.array - root[idx_inbounds]
-                    for dim2 in range(ND):
-                        dist[:, dim2] *= msk.spacing[dim2]
-                    dist = np.sum(np.square(dist), axis=1)
-
-                    update_edt = (dist < edt[idx_off])
-                    idx_update = idx_inbounds.apply_mask(update_edt)
-                    idx_off = idx_off.apply_mask(update_edt)
-                    edt[idx_off] = dist[update_edt]
-                    root[idx_off] = root[idx_update]
-
-                    if idx_off.array.size:
-                        if newidx is None:
-                            newidx = idx_off.array
-                        else:
-                            newidx = np.vstack((newidx, idx_off.array))
-            if newidx is None:
-                idx = None
-            else:
-                unique_idx = np.unique(
-                    np.ravel_multi_index(tuple(newidx.T), msk.data.shape))
-                idx = Index(np.unravel_index(unique_idx, msk.data.shape))
-            if verbose:
-                print(time.clock() - t0, 'seconds')
-        if verbose:
-            print('Total iterations:', counter)
-            print('Total voxels:', total_voxels)
+        # The spacing is given in [X,Y,Z] order, and the data in [Z,Y,X] order
+        spacing = np.array(msk.spacing, dtype=float)[::-1]
+        if signed:
+            edt = distance.signed_distance_transform(msk.data, spacing, workers)
+        else:
+            edt = distance.distance_transform(msk.data, spacing, workers)
         edt_out = image.Image()
         edt_out.copy_information(msk)
-        edt_out.set_image(np.sqrt(edt))
+        edt_out.set_image(edt)
         return edt_out
-
-
-class Index(tuple):
-    def __init__(self, tpl):
-        tuple.__init__(self, tpl)
-        self.array = np.array(np.transpose(tpl))
-
-    def offset(self, dim, offset, img=None):
-        idx_offset = list(self)
-        idx_offset[dim] = idx_offset[dim] + offset
-        if img is not None:
-            if offset < 0:
-                inbounds = idx_offset[dim] >= 0
-            else:
-                inbounds = idx_offset[dim] < img.data.shape[dim]
-        else:
-            inbounds = None
-        return (Index(idx_offset), inbounds)
-
-    def apply_mask(self, inbounds):
-        return Index(tuple(x[inbounds] for x in list(self)))
@@ -9,7 +9,7 @@ and will split the mask into 8 separate masks, each representing an octant.
 import numpy as np
 
 from .. import transform as tf
-from ..data_elements.dose_map import DoseMask
+from ..data_elements.dose_map import DoseMask, DoseLabelMap
 from ..radio_morphology.feature import Feature
 
 class ComFeature(Feature):
@@ -54,21 +54,24 @@ class ComFeature(Feature):
 
     Keyword arguments:
         :dvh:       list of dvh volumes to look up
+        :labels:    compute all sub-regions as one LabelMap (see DoseLabelMap)
     '''
 
     def __init__(self, featureID, feature_type=None,
-                 mask=None, dose=None, dvh=[]):
+                 mask=None, dose=None, dvh=[], labels=False):
         super(ComFeature, self).__init__(
             featureID, feature_type if feature_type else 'ComFeature',
             mask, dose
         )
         self.dvh_vals = dvh
+        self.labels = labels
 
     def process_mask(self):
         '''
         Partition the mask into octants
         '''
-        self.feature_mask = tf.partition.octants_around_point(self.mask, self.mask.center_of_mass)
+        self.feature_mask = tf.partition.octants_around_point(
+            self.mask, self.mask.center_of_mass, labels=self.labels)
         return self.feature_mask
 
     def process_dose(self):
@@ -77,8 +80,12 @@ class ComFeature(Feature):
         '''
         if self.feature_mask is None:
             self.process_mask()
-        self.feature_dosemask = [
-            DoseMask(octant, self.dose) for octant in self.feature_mask]
+        if self.labels:
+            # Compute the statistics of all sub-regions in a single pass
+            self.feature_dosemask = DoseLabelMap(self.feature_mask, self.dose)
+        else:
+            # Interpolate the dose once for all sub-regions
+            self.feature_dosemask = DoseMask.from_masks(self.feature_mask, self.dose)
         return self.feature_dosemask
 
     def process(self):
@@ -118,9 +125,9 @@ class ComFeature(Feature):
         # If there are specified dvh parameters, look thmm up
         if len(self.dvh_vals) > 0:
             # If there are specified dvh parameters, look them up
-            self.output['dvh'] = [np.asarray([[
-                dm.get_dose_to_volume(v) for v in self.dvh_vals
-            ], self.dvh_vals]).T for dm in self.feature_dosemask]
+            self.output['dvh'] = [np.asarray([
+                dm.get_dose_to_volume(self.dvh_vals), self.dvh_vals
+            ]).T for dm in self.feature_dosemask]
         else:
             # Otherwise, just return the entire DVH
             self.output['dvh'] = [dm.dvh_data for dm in self.feature_dosemask]
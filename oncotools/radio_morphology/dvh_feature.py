@@ -79,9 +79,9 @@ class DVHFeature(Feature):
 
         if len(self.dvh_vals) > 0:
             # If there are specified dvh parameters, look them up
-            self.output['dvh'] = np.asarray([[
-                self.feature_dosemask.get_dose_to_volume(v) for v in self.dvh_vals
-            ], self.dvh_vals]).T
+            self.output['dvh'] = np.asarray([
+                self.feature_dosemask.get_dose_to_volume(self.dvh_vals), self.dvh_vals
+            ]).T
         else:
             # Otherwise, just return the entire DVH
             self.output['dvh'] = self.feature_dosemask.dvh_data
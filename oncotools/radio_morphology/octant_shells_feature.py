@@ -8,7 +8,8 @@ along the x, y, and z axes.
 import numpy as np
 
 from .. import transform as tf
-from ..data_elements.dose_map import DoseMask
+from ..data_elements.dose_map import DoseMask, DoseLabelMap
+from ..data_elements.image import LabelMap
 from ..radio_morphology.feature import Feature
 
 class OctantShellsFeature(Feature):
@@ -26,6 +27,8 @@ class OctantShellsFeature(Feature):
         :contract:  list of contractions to be performed on the mask
         :expand:    list of expansions to be performed on the mask
         :dvh:       list of dvh volumes to look up
+        :labels:    compute all sub-regions as one LabelMap (see DoseLabelMap)
+        :method:    'margin' or 'distance', how to create the shells (see ScaleTransform.shells)
 
     Note: Contraction and Expansion values may be given as:
         - A single number:       uniform expansion in all dimensions
@@ -43,14 +46,17 @@ class OctantShellsFeature(Feature):
             Given `n` total expansions and contractions, there will be `n+1` average dose values.
     '''
     def __init__(self, featureID, feature_type=None,
-                 mask=None, dose=None, contract=[], expand=[], dvh=[]):
+                 mask=None, dose=None, contract=[], expand=[], dvh=[], labels=False,
+                 method='margin'):
         super(OctantShellsFeature, self).__init__(
             featureID, feature_type if feature_type else 'OctantShellsFeature',
             mask, dose
         )
         self.dvh_vals = dvh
+        self.labels = labels
         self.contractions = contract
         self.expansions = expand
+        self.method = method
 
     def process_mask(self):
         '''
@@ -58,7 +64,11 @@ class OctantShellsFeature(Feature):
         '''
         # Create shells using given contractions and expansions
         self.bounds, shls = tf.scale.shells(
-            self.mask, contractions=self.contractions, expansions=self.expansions)
+            self.mask, contractions=self.contractions, expansions=self.expansions,
+            labels=self.labels, method=self.method)
+        if self.labels:
+            self.feature_mask = self.__octant_shells_label_map(shls)
+            return self.feature_mask
         # Cut each shell into octants
         octs = []
         for s in shls:
@@ -67,14 +77,35 @@ class OctantShellsFeature(Feature):
         del shls
         return self.feature_mask
 
+    def __octant_shells_label_map(self, shell_map):
+        '''
+        Cut each shell of a shell LabelMap into octants around its own center of mass.
+        Octant o of shell s has the label 8 * s + o + 1, matching the order of the masks.
+        '''
+        label_map = LabelMap.from_template(
+            shell_map, [str(o + 1) + str(b) + 'r' for b in self.bounds for o in range(8)])
+        for s in range(shell_map.num_regions):
+            shell = shell_map.get_mask(s)
+            if shell.count_voxels() == 0:
+                continue
+            octants = tf.partition.octants_around_point(
+                shell, shell.center_of_mass, labels=True)
+            inside = octants.data != 0
+            label_map.data[inside] = 8 * s + octants.data[inside]
+        return label_map
+
     def process_dose(self):
         '''
         Map dose onto each derived substructure
         '''
         if self.feature_mask is None:
             self.process_mask()
-        self.feature_dosemask = [
-            DoseMask(m, self.dose) for m in self.feature_mask]
+        if self.labels:
+            # Compute the statistics of all sub-regions in a single pass
+            self.feature_dosemask = DoseLabelMap(self.feature_mask, self.dose)
+        else:
+            # Interpolate the dose once for all sub-regions
+            self.feature_dosemask = DoseMask.from_masks(self.feature_mask, self.dose)
         return self.feature_dosemask
 
     def process(self):
@@ -117,9 +148,9 @@ class OctantShellsFeature(Feature):
         # If there are specified dvh parameters, look thmm up
         if len(self.dvh_vals) > 0:
             # If there are specified dvh parameters, look them up
-            self.output['dvh'] = [np.asarray([[
-                dm.get_dose_to_volume(v) for v in self.dvh_vals
-            ], self.dvh_vals]).T for dm in self.feature_dosemask]
+            self.output['dvh'] = [np.asarray([
+                dm.get_dose_to_volume(self.dvh_vals), self.dvh_vals
+            ]).T for dm in self.feature_dosemask]
         else:
             # Otherwise, just return the entire DVH
             self.output['dvh'] = [dm.dvh_data for dm in self.feature_dosemask]
@@ -102,10 +102,8 @@ class SectorFeature(Feature):
     def process_dose(self):
         if self.feature_mask is None:
             self.process_mask()
-        # Map the dose masks onto each sector
-        self.feature_dosemask = [
-            DoseMask(m, self.dose) for m in self.feature_mask
-        ]
+        # Map the dose masks onto each sector, interpolating the dose only once
+        self.feature_dosemask = DoseMask.from_masks(self.feature_mask, self.dose)
         return self.feature_dosemask
 
     def process(self):
@@ -137,9 +135,9 @@ class SectorFeature(Feature):
         # If there are specified dvh parameters, look thmm up
         if len(self.dvh_vals) > 0:
             # If there are specified dvh parameters, look them up
-            self.output['dvh'] = [np.asarray([[
-                dm.get_dose_to_volume(v) for v in self.dvh_vals
-            ], self.dvh_vals]).T for dm in self.feature_dosemask]
+            self.output['dvh'] = [np.asarray([
+                dm.get_dose_to_volume(self.dvh_vals), self.dvh_vals
+            ]).T for dm in self.feature_dosemask]
         else:
             # Otherwise, just return the entire DVH
             self.output['dvh'] = [dm.dvh_data for dm in self.feature_dosemask]
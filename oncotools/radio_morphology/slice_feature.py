@@ -6,7 +6,7 @@ This feature uses the bounds of the mask to create a specified number of slices
 import numpy as np
 
 from .. import transform as tf
-from ..data_elements.dose_map import DoseMask
+from ..data_elements.dose_map import DoseMask, DoseLabelMap
 from ..radio_morphology.feature import Feature
 
 class SliceFeature(Feature):
@@ -20,15 +20,17 @@ class SliceFeature(Feature):
         :num_slices:    number of slices to create, default=2
         :axis:          axis along which to be cut ('x', 'y', or 'z'), default='z'
         :dvh:           list of dvh volumes to look up
+        :labels:        compute all sub-regions as one LabelMap (see DoseLabelMap)
     '''
 
     def __init__(self, featureID, feature_type=None,
-                 mask=None, dose=None, num_slices=2, axis='z', dvh=[]):
+                 mask=None, dose=None, num_slices=2, axis='z', dvh=[], labels=False):
         super(SliceFeature, self).__init__(
             featureID, feature_type if feature_type else 'SliceFeature',
             mask, dose
         )
         self.dvh_vals = dvh
+        self.labels = labels
         self.num_slices = num_slices
         self.axis = axis
 
@@ -36,7 +38,7 @@ class SliceFeature(Feature):
         '''
         Create slices of equal thickness along the specified axis
         '''
-        self.feature_mask = tf.partition.slices(self.mask, self.num_slices, self.axis)
+        self.feature_mask = tf.partition.slices(self.mask, self.num_slices, self.axis, labels=self.labels)
         return self.feature_mask
 
     def process_dose(self):
@@ -45,9 +47,12 @@ class SliceFeature(Feature):
         '''
         if self.feature_mask is None:
             self.process_mask()
-        # Map the dose masks onto each sector
-        self.feature_dosemask = [
-            DoseMask(m, self.dose) for m in self.feature_mask]
+        if self.labels:
+            # Compute the statistics of all sub-regions in a single pass
+            self.feature_dosemask = DoseLabelMap(self.feature_mask, self.dose)
+        else:
+            # Map the dose masks onto each sector, interpolating the dose only once
+            self.feature_dosemask = DoseMask.from_masks(self.feature_mask, self.dose)
         return self.feature_dosemask
 
     def process(self):
@@ -87,9 +92,9 @@ class SliceFeature(Feature):
         # If there are specified dvh parameters, look thmm up
         if len(self.dvh_vals) > 0:
             # If there are specified dvh parameters, look them up
-            self.output['dvh'] = [np.asarray([[
-                dm.get_dose_to_volume(v) for v in self.dvh_vals
-            ], self.dvh_vals]).T for dm in self.feature_dosemask]
+            self.output['dvh'] = [np.asarray([
+                dm.get_dose_to_volume(self.dvh_vals), self.dvh_vals
+            ]).T for dm in self.feature_dosemask]
         else:
             # Otherwise, just return the entire DVH
             self.output['dvh'] = [dm.dvh_data for dm in self.feature_dosemask]
@@ -9,7 +9,7 @@ the feature will calculate split the original dose map into superior and inferio
 import numpy as np
 
 from .. import transform as tf
-from ..data_elements.dose_map import DoseMask
+from ..data_elements.dose_map import DoseMask, DoseLabelMap
 from ..radio_morphology.feature import Feature
 
 class SIFeature(Feature):
@@ -23,21 +23,23 @@ class SIFeature(Feature):
 
     Keyword arguments:
         :dvh:       list of dvh volumes to look up
+        :labels:    compute all sub-regions as one LabelMap (see DoseLabelMap)
     '''
 
     def __init__(self, featureID, feature_type=None,
-                 mask=None, dose=None, dvh=[]):
+                 mask=None, dose=None, dvh=[], labels=False):
         super(SIFeature, self).__init__(
             featureID, feature_type if feature_type else 'SIFeature',
             mask, dose
         )
         self.dvh_vals = dvh
+        self.labels = labels
 
     def process_mask(self):
         '''
         Separate a mask into superior and inferior halves.
         '''
-        self.feature_mask = tf.partition.halves(self.mask, self.mask.center_of_mass)
+        self.feature_mask = tf.partition.halves(self.mask, self.mask.center_of_mass, labels=self.labels)
         return self.feature_mask
 
     def process_dose(self):
@@ -46,8 +48,12 @@ class SIFeature(Feature):
         '''
         if self.feature_mask is None:
             self.process_mask()
-        self.feature_dosemask = [
-            DoseMask(m, self.dose) for m in self.feature_mask]
+        if self.labels:
+            # Compute the statistics of all sub-regions in a single pass
+            self.feature_dosemask = DoseLabelMap(self.feature_mask, self.dose)
+        else:
+            # Interpolate the dose once for all sub-regions
+            self.feature_dosemask = DoseMask.from_masks(self.feature_mask, self.dose)
         return self.feature_dosemask
 
     def process(self):
@@ -87,9 +93,9 @@ class SIFeature(Feature):
         # If there are specified dvh parameters, look thmm up
         if len(self.dvh_vals) > 0:
             # If there are specified dvh parameters, look them up
-            self.output["dvh"] = [np.asarray([[
-                dm.get_dose_to_volume(v) for v in self.dvh_vals
-            ], self.dvh_vals]).T for dm in self.feature_dosemask]
+            self.output["dvh"] = [np.asarray([
+                dm.get_dose_to_volume(self.dvh_vals), self.dvh_vals
+            ]).T for dm in self.feature_dosemask]
         else:
             # Otherwise, just return the entire DVH
             self.output["dvh"] = [dm.dvh_data for dm in self.feature_dosemask]
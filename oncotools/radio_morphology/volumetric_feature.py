@@ -9,7 +9,7 @@ and specified DVH values.
 import numpy as np
 
 from .. import transform as tf
-from ..data_elements.dose_map import DoseMask
+from ..data_elements.dose_map import DoseMask, DoseLabelMap
 from ..radio_morphology.feature import Feature
 
 class VolumetricFeature(Feature):
@@ -25,6 +25,8 @@ class VolumetricFeature(Feature):
         :contract:  list of contractions to be performed on the mask
         :expand:    list of expansions to be performed on the mask
         :dvh:       list of dvh volumes to look up
+        :labels:    compute all sub-regions as one LabelMap (see DoseLabelMap)
+        :method:    'margin' or 'distance', how to create the shells (see ScaleTransform.shells)
 
     Note: Contraction and Expansion values may be given as:
         - A single number:       uniform expansion in all dimensions
@@ -43,14 +45,17 @@ class VolumetricFeature(Feature):
     '''
 
     def __init__(self, featureID, feature_type=None,
-                 mask=None, dose=None, contract=[], expand=[], dvh=[]):
+                 mask=None, dose=None, contract=[], expand=[], dvh=[], labels=False,
+                 method='margin'):
         super(VolumetricFeature, self).__init__(
             featureID, feature_type if feature_type else 'VolumetricFeature',
             mask, dose
         )
         self.dvh_vals = dvh
+        self.labels = labels
         self.contractions = contract
         self.expansions = expand
+        self.method = method
 
     def process_mask(self):
         '''
@@ -58,7 +63,8 @@ class VolumetricFeature(Feature):
         '''
         # Create shells using given contractions and expansions
         self.bounds, self.feature_mask = tf.scale.shells(
-            self.mask, contractions=self.contractions, expansions=self.expansions)
+            self.mask, contractions=self.contractions, expansions=self.expansions,
+            labels=self.labels, method=self.method)
         return self.feature_mask
 
     def process_dose(self):
@@ -67,8 +73,12 @@ class VolumetricFeature(Feature):
         '''
         if self.feature_mask is None:
             self.process_mask()
-        self.feature_dosemask = [
-            DoseMask(m, self.dose) for m in self.feature_mask]
+        if self.labels:
+            # Compute the statistics of all sub-regions in a single pass
+            self.feature_dosemask = DoseLabelMap(self.feature_mask, self.dose)
+        else:
+            # Interpolate the dose once for all sub-regions
+            self.feature_dosemask = DoseMask.from_masks(self.feature_mask, self.dose)
         return self.feature_dosemask
 
     def process(self):
@@ -112,9 +122,9 @@ class VolumetricFeature(Feature):
         # If there are specified dvh parameters, look thmm up
         if len(self.dvh_vals) > 0:
             # If there are specified dvh parameters, look them up
-            self.output['dvh'] = [np.asarray([[
-                dm.get_dose_to_volume(v) for v in self.dvh_vals
-            ], self.dvh_vals]).T for dm in self.feature_dosemask]
+            self.output['dvh'] = [np.asarray([
+                dm.get_dose_to_volume(self.dvh_vals), self.dvh_vals
+            ]).T for dm in self.feature_dosemask]
         else:
             # Otherwise, just return the entire DVH
             self.output['dvh'] = [dm.dvh_data for dm in self.feature_dosemask]
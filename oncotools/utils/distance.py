@@ -0,0 +1,256 @@
+'''
+Exact Euclidean distance transforms on regular voxel grids.
+
+The transform is computed one axis at a time, using the lower envelope of parabolas
+of Felzenszwalb and Huttenlocher ("Distance Transforms of Sampled Functions"), so
+its cost is linear in the number of voxels. Every axis has its own weight (e.g., the
+voxel spacing), and the weight may differ on the negative and the positive side of
+a voxel. This gives anisotropic and asymmetric metrics, such as the ellipsoidal
+margins of the scaling transformations.
+
+Arrays are in [Z,Y,X] order, like the image buffers.
+'''
+
+import numpy as np
+
+
+def _axis_weights(weights, ndim):
+    '''
+    Expand the weights into one (negative, positive) pair per axis.
+
+    Positional arguments:
+        :weights:   a single number, one number per axis, or one pair of numbers per axis
+        :ndim:      number of axes
+    Returns:
+        list of (negative, positive) weights, one per axis
+    '''
+    w = np.asarray(weights, dtype=float)
+    if w.ndim == 0:
+        w = np.full((ndim, 2), float(w))
+    elif w.ndim == 1 and w.size == ndim:
+        w = np.repeat(w[:, np.newaxis], 2, axis=1)
+    if w.shape != (ndim, 2):
+        raise ValueError('Invalid weights for a {}-D array: {}'.format(ndim, weights))
+    if np.any(w <= 0) or not np.all(np.isfinite(w)):
+        raise ValueError('Weights must be positive: {}'.format(weights))
+    return [(float(n), float(p)) for n, p in w]
+
+
+def _intersection(f1, q1, f2, q2, a, b):
+    '''
+    Position after which the parabola rooted at q2 lies below the parabola rooted at q1.
+
+    The parabolas are f + a * d**2 for d < 0 and f + b * d**2 for d >= 0, where d is
+    the offset from their root. Two such parabolas cross only once.
+
+    Positional arguments:
+        :f1, q1:    values and roots of the first parabolas
+        :f2, q2:    values and roots of the second parabolas (q2 > q1)
+        :a, b:      squared weights on the negative and the positive side
+    Returns:
+        array of crossing positions
+    '''
+    d = (q2 - q1).astype(float)
+    c = f2 - f1
+    mid = 0.5 * (q1 + q2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Crossing before q1: both parabolas are on their negative side
+        s = mid + c / (2 * a * d)
+        # Crossing after q2: both parabolas are on their positive side
+        right = c - b * d * d >= 0
+        s[right] = mid[right] + c[right] / (2 * b * d[right])
+        # Crossing in between: a * (t - d)**2 - b * t**2 + c = 0, with t = s - q1
+        between = np.logical_and(c + a * d * d > 0, np.logical_not(right))
+        if np.any(between):
+            db, cb = d[between], c[between]
+            disc = np.maximum((a * db)**2 - (a - b) * (a * db * db + cb), 0)
+            s[between] = q1[between] + (a * db * db + cb) / (a * db + np.sqrt(disc))
+    return s
+
+
+def _lower_envelope(f, wn, wp):
+    '''
+    One-dimensional distance transform of sampled functions, along the first axis.
+
+    Computes min_q f[q] + h(p - q) for every p, where h(d) = (wn * d)**2 for d < 0 and
+    h(d) = (wp * d)**2 for d >= 0. All lines are processed together.
+
+    Positional arguments:
+        :f:         2-D array (samples x lines), with numpy.inf where there is no sample
+        :wn, wp:    weights on the negative and the positive side
+    Returns:
+        2-D array of the same shape as f
+    '''
+    # Lines without samples stay at infinity
+    has_samples = np.isfinite(f).any(axis=0)
+    if not np.all(has_samples):
+        out = np.full(f.shape, np.inf)
+        if np.any(has_samples):
+            out[:, has_samples] = _lower_envelope(f[:, has_samples], wn, wp)
+        return out
+
+    a, b = wn * wn, wp * wp
+    n, num_lines = f.shape
+    lines = np.arange(num_lines)
+    # Roots, values and left boundaries of the parabolas of the envelope, and
+    # the index of the last parabola of each line (-1 while the line is empty)
+    v = np.zeros((n, num_lines), dtype=np.intp)
+    fv = np.zeros((n, num_lines))
+    z = np.full((n + 1, num_lines), np.inf)
+    k = np.full(num_lines, -1, dtype=np.intp)
+
+    for q in range(n):
+        fq = f[q]
+        todo = np.flatnonzero(np.isfinite(fq))
+        while todo.size:
+            kt = k[todo]
+            empty = todo[kt < 0]
+            k[empty] = 0
+            v[0, empty] = q
+            fv[0, empty] = fq[empty]
+            z[0, empty] = -np.inf
+
+            todo, kt = todo[kt >= 0], kt[kt >= 0]
+            if todo.size == 0:
+                break
+            q1 = v[kt, todo]
+            s = _intersection(fv[kt, todo], q1, fq[todo], np.full_like(q1, q), a, b)
+            # The last parabola is hidden by the new one: drop it and try again
+            hidden = s <= z[kt, todo]
+            k[todo[hidden]] -= 1
+            push, kp = todo[~hidden], kt[~hidden] + 1
+            k[push] = kp
+            v[kp, push] = q
+            fv[kp, push] = fq[push]
+            z[kp, push] = s[~hidden]
+            z[kp + 1, push] = np.inf
+            todo = todo[hidden]
+
+    # Parabola j of a line covers the samples p with z[j] < p <= z[j + 1]. Count the
+    # left boundaries up to every sample to find the parabola that covers it.
+    rank = np.arange(1, n)[:, np.newaxis]
+    starts = np.clip(np.floor(z[1:n]) + 1, 0, n).astype(np.intp)
+    valid = np.logical_and(rank <= k, starts < n)
+    counts = np.bincount(starts[valid] * num_lines + np.nonzero(valid)[1],
+                         minlength=n * num_lines)
+    j = np.cumsum(counts.reshape(n, num_lines), axis=0)
+
+    d = np.arange(n)[:, np.newaxis] - v[j, lines]
+    return fv[j, lines] + (d * np.where(d < 0, wn, wp))**2
+
+
+def _parallel_lower_envelope(f, wn, wp, workers=None):
+    '''
+    Run _lower_envelope on groups of lines in parallel threads.
+    '''
+    num_lines = f.shape[1]
+    if workers is None or workers <= 1 or num_lines < 2:
+        return _lower_envelope(f, wn, wp)
+    from concurrent.futures import ThreadPoolExecutor
+    out = np.empty(f.shape)
+    bounds = np.linspace(0, num_lines, min(workers, num_lines) + 1).astype(int)
+
+    def run(group):
+        lines = slice(bounds[group], bounds[group + 1])
+        out[:, lines] = _lower_envelope(f[:, lines], wn, wp)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(run, range(len(bounds) - 1)))
+    return out
+
+
+def squared_distance_transform(features, weights=1.0, workers=None):
+    '''
+    Squared weighted distance from every voxel to the nearest feature voxel.
+
+    The squared distance between voxels i and j is the sum over the axes of
+    (w * (i - j))**2, where w is the weight of the axis on the side of j where i lies.
+
+    Positional arguments:
+        :features:  N-D array, nonzero at the feature voxels
+    Keyword arguments:
+        :weights:   a single number, one number per axis, or one (negative, positive)
+                    pair of numbers per axis (e.g., the voxel spacing in [Z,Y,X] order)
+        :workers:   number of threads that process the lines of each axis.
+                    By default, all lines are processed in the calling thread.
+    Returns:
+        N-D float array of squared distances (numpy.inf if there are no feature voxels)
+    '''
+    features = np.asarray(features)
+    axis_weights = _axis_weights(weights, features.ndim)
+    dist = np.where(features != 0, 0.0, np.inf)
+    if dist.size == 0:
+        return dist
+    # The metric is a sum of one term per axis, so the axes can be processed one at a time
+    for axis in reversed(range(features.ndim)):
+        lines = np.moveaxis(dist, axis, 0)
+        shape = lines.shape
+        lines = _parallel_lower_envelope(
+            lines.reshape(shape[0], -1), *axis_weights[axis], workers=workers)
+        dist = np.moveaxis(lines.reshape(shape), 0, axis)
+    return np.ascontiguousarray(dist)
+
+
+def distance_transform(features, spacing=1.0, workers=None):
+    '''
+    Exact Euclidean distance from every voxel to the nearest feature voxel.
+
+    Positional arguments:
+        :features:  N-D array, nonzero at the feature voxels
+    Keyword arguments:
+        :spacing:   voxel spacing, as a single number or one number per axis ([Z,Y,X] order)
+        :workers:   number of threads (see squared_distance_transform)
+    Returns:
+        N-D float array of distances (numpy.inf if there are no feature voxels)
+    '''
+    return np.sqrt(squared_distance_transform(features, spacing, workers))
+
+
+def interior(inside):
+    '''
+    Find the voxels of a binary mask whose 2*N neighbours are all inside of the mask.
+
+    The grid boundary does not count as outside of the mask, like in
+    Mask.get_mask_edge_voxels.
+
+    Positional arguments:
+        :inside:    N-D array, nonzero inside of the mask
+    Returns:
+        N-D boolean array
+    '''
+    inside = np.asarray(inside) != 0
+    padded = np.pad(inside, 1, mode='edge')
+    result = inside.copy()
+    center = tuple(slice(1, -1) for _ in range(inside.ndim))
+    for axis in range(inside.ndim):
+        for shift in (0, 2):
+            neighbour = list(center)
+            neighbour[axis] = slice(shift, shift + inside.shape[axis])
+            result &= padded[tuple(neighbour)]
+    return result
+
+
+def signed_distance_transform(inside, spacing=1.0, workers=None):
+    '''
+    Signed Euclidean distance to the surface of a binary mask.
+
+    Voxels outside of the mask are at a positive distance, the distance to the nearest
+    voxel of the mask. Voxels inside of the mask are at a negative distance, minus the
+    distance to the nearest voxel on the edge of the mask (see interior). Edge voxels are
+    at distance 0.
+
+    Positional arguments:
+        :inside:    N-D array, nonzero inside of the mask
+    Keyword arguments:
+        :spacing:   voxel spacing, as a single number or one number per axis ([Z,Y,X] order)
+        :workers:   number of threads (see squared_distance_transform)
+    Returns:
+        N-D float array of signed distances (numpy.inf if the mask is empty)
+    '''
+    inside = np.asarray(inside) != 0
+    dist = distance_transform(inside, spacing, workers)
+    inner = interior(inside)
+    if np.any(inner):
+        # The nearest voxel outside of the interior is always on the edge
+        dist[inner] = -distance_transform(np.logical_not(inner), spacing, workers)[inner]
+    return dist
@@ -0,0 +1,109 @@
+'''
+Binary dilation and erosion with box and ellipsoid structuring elements.
+
+Structuring elements are given by their radii in voxels, one (negative, positive)
+pair per axis, so that they may extend further on one side of a voxel than on the
+other. Both kernels are applied to the whole array at once, one axis at a time:
+box kernels with running sums along every axis, and ellipsoid kernels by
+thresholding a weighted distance transform, whose passes are also separable.
+
+Arrays are in [Z,Y,X] order, like the image buffers.
+'''
+
+import numpy as np
+
+from . import distance
+
+
+def _axis_radii(radii, ndim):
+    '''
+    Expand the radii into one (negative, positive) pair of voxel counts per axis.
+
+    Positional arguments:
+        :radii: a single number, one number per axis, or one pair of numbers per axis
+        :ndim:  number of axes
+    Returns:
+        list of (negative, positive) radii, one per axis
+    '''
+    r = np.asarray(radii, dtype=float)
+    if r.ndim == 0:
+        r = np.full((ndim, 2), float(r))
+    elif r.ndim == 1 and r.size == ndim:
+        r = np.repeat(r[:, np.newaxis], 2, axis=1)
+    if r.shape != (ndim, 2):
+        raise ValueError('Invalid radii for a {}-D array: {}'.format(ndim, radii))
+    if np.any(r < 0) or np.any(r != np.round(r)):
+        raise ValueError('Radii must be non-negative voxel counts: {}'.format(radii))
+    return [(int(n), int(p)) for n, p in r]
+
+
+def _box_pass(data, axis, n, p):
+    '''
+    Dilate along one axis: a voxel is set if any voxel from n voxels after it to
+    p voxels before it is set.
+    '''
+    lines = np.moveaxis(data, axis, 0)
+    size = lines.shape[0]
+    counts = np.zeros((size + 1,) + lines.shape[1:], dtype=np.int32)
+    np.cumsum(lines, axis=0, out=counts[1:])
+    index = np.arange(size)
+    upper = np.minimum(index + n + 1, size)
+    lower = np.maximum(index - p, 0)
+    return np.moveaxis(counts[upper] > counts[lower], 0, axis)
+
+
+def dilate(data, radii, kernel='box'):
+    '''
+    Dilate a binary array.
+
+    A voxel of the result is set if a set voxel lies within the structuring element
+    around it. Radii on the negative side extend the set voxels towards lower indices.
+
+    Positional arguments:
+        :data:      N-D binary array
+        :radii:     radii of the structuring element in voxels, as a single number,
+                    one number per axis, or one (negative, positive) pair per axis
+    Keyword arguments:
+        :kernel:    'box' or 'ellipsoid'
+    Returns:
+        N-D boolean array
+    Raises:
+        :ValueError:    if the radii or the kernel are invalid
+    '''
+    data = np.asarray(data) != 0
+    axis_radii = _axis_radii(radii, data.ndim)
+    if kernel == 'box':
+        for axis, (n, p) in enumerate(axis_radii):
+            if n or p:
+                data = _box_pass(data, axis, n, p)
+        return data
+    if kernel == 'ellipsoid':
+        # An offset d lies within the ellipsoid if the sum of (d / r)**2 is at most 1.
+        # A radius of 0 only keeps d = 0, which any weight above 1 achieves.
+        weights = [(1.0 / max(n, 0.5), 1.0 / max(p, 0.5)) for n, p in axis_radii]
+        return distance.squared_distance_transform(data, weights) <= 1 + 1e-9
+    raise ValueError('Unknown kernel: ' + str(kernel))
+
+
+def erode(data, radii, kernel='box'):
+    '''
+    Erode a binary array.
+
+    A voxel of the result is set if the structuring element around it only covers set
+    voxels. Radii on the negative side shrink the set voxels from lower indices. Voxels
+    beyond the array bounds count as set.
+
+    Positional arguments:
+        :data:      N-D binary array
+        :radii:     radii of the structuring element in voxels (see dilate)
+    Keyword arguments:
+        :kernel:    'box' or 'ellipsoid'
+    Returns:
+        N-D boolean array
+    Raises:
+        :ValueError:    if the radii or the kernel are invalid
+    '''
+    data = np.asarray(data)
+    # Erosion is the complement of the dilation of the complement by the reflected element
+    reflected = [(p, n) for n, p in _axis_radii(radii, data.ndim)]
+    return np.logical_not(dilate(data == 0, reflected, kernel))
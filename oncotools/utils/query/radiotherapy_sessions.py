@@ -108,11 +108,22 @@ class RadiotherapySessionsQueries(object):
         Returns:
             Dictionary of RTS description: Dose object
         '''
+        return dict(self.iter_doses(patientRepID))
+
+    def iter_doses(self, patientRepID):
+        '''
+        Iterate over the Dose objects associated with a patient representation,
+        loading one dose grid at a time (e.g. to stream them through a
+        dose_map.DoseAccumulator).
+
+        Positional arguments:
+            :patientRepID:  patient representation ID
+        Returns:
+            Generator of (RTS description, Dose object) tuples
+        '''
         rts_ids = self.get_session_ids(patientRepID)
-        doses = {}
         for row in rts_ids.rows:
             if hasattr(row, 'compositeType') and row.compositeType == 'lifetime':
-                doses['lifetime'] = self.get_dose_grid(row.ID)
+                yield 'lifetime', self.get_dose_grid(row.ID)
             else:
-                doses[str(row.description)] = self.get_dose_grid(row.ID)
-        return doses
+                yield str(row.description), self.get_dose_grid(row.ID)
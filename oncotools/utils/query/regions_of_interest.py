@@ -7,7 +7,8 @@ class, for direct access to all the predefined procedures.
 import numpy as np
 
 from ...data_elements.roi import Roi
-from ...data_elements.dvh import Dvh
+from ...data_elements.image import run_length_to_indices
+from ...data_elements.dvh import Dvh, DvhCollection
 
 # RegionsOfInterest ======================================================
 
@@ -217,7 +218,7 @@ class RegionsOfInterestQueries(object):
             raise Exception(msg)
         return maskRLE
 
-    def get_roi(self, roiID=None, mask=None):
+    def get_roi(self, roiID=None, mask=None, representation='dense'):
         '''
         Get an ROI object corresponding to a roiID.
 
@@ -226,6 +227,8 @@ class RegionsOfInterestQueries(object):
         Keyword arguments:
             :roiID:     ID corresponding to the ROI mask
             :mask:      run-length-encoded representation of the ROI mask
+            :representation:    'dense' (Mask), 'cropped' (CroppedMask),
+                'packed' (PackedMask) or 'sparse' (SparseMask) binary mask
         Returns:
             `roi` instance related to the roi ID
         '''
@@ -240,22 +243,46 @@ class RegionsOfInterestQueries(object):
         dim = [rep['zDimension'], rep['yDimension'], rep['xDimension']]
         spacing = [rep['xVoxelSize'], rep['yVoxelSize'], rep['zVoxelSize']]
         origin = [rep['xStart'], rep['yStart'], rep['zStart']]
-        r.run_length_decode(mask, dim)
+        r.run_length_decode(mask, dim, representation)
         r.mask.set_spacing(spacing)
         r.mask.set_origin(origin)
         r.mask.update_end()
         return r
 
-    def get_mask(self, roiID):
+    def get_mask_indices(self, roiID, zyx=False):
+        '''
+        Get the indices of the voxels inside an ROI binary mask.
+
+        The run-length encoded mask is decoded straight into voxel indices,
+        without allocating the full binary mask.
+
+        Positional arguments:
+            :roiID:     ID corresponding to the ROI mask
+        Keyword arguments:
+            :zyx:       boolean value. If True, return an N x 3 array of [Z,Y,X] indices
+        Returns:
+            Sorted array of flat [Z,Y,X] indices into the patient representation grid
+        '''
+        rep = self.get_mask_representation(roiID=roiID)
+        dim = [int(rep['zDimension']), int(rep['yDimension']), int(rep['xDimension'])]
+        indices = run_length_to_indices(self.get_mask_rle(roiID), int(np.prod(dim)))
+        if zyx:
+            return np.transpose(np.unravel_index(indices, dim))
+        return indices
+
+    def get_mask(self, roiID, representation='dense'):
         '''
         Get an ROI object corresponding to a roiID.
 
         Positional arguments:
             :roiID:     ID corresponding to the ROI mask
+        Keyword arguments:
+            :representation:    'dense' (Mask), 'cropped' (CroppedMask),
+                'packed' (PackedMask) or 'sparse' (SparseMask) binary mask
         Returns:
             Mask associated with the roi ID
         '''
-        r = self.get_roi(roiID)
+        r = self.get_roi(roiID, representation=representation)
         if r is not None:
             return r.mask
         return None
@@ -344,25 +371,22 @@ class RegionsOfInterestQueries(object):
         queryString = '''
             SELECT X, Y
             FROM DVHData dvh
-            JOIN RoiDoseSummaries rds ON rds.ID = dvh.roiDoseSummaryID'''
+            JOIN RoiDoseSummaries rds ON rds.ID = dvh.roiDoseSummaryID
+            WHERE rds.type = ?'''
+        params = [_dvh_type(cumulative)]
         if doseSummaryID is not None:
-            queryString += 'where rds.ID = {0}'.format(doseSummaryID)
+            queryString += ' AND rds.ID = ?'
+            params.append(int(doseSummaryID))
         elif rtSessionID is not None and roiID is not None:
-            queryString += 'where rds.radiotherapySessionID = {0} \
-                and rds.roiID = {1}'.format(rtSessionID, roiID)
+            queryString += ' AND rds.radiotherapySessionID = ? AND rds.roiID = ?'
+            params += [int(rtSessionID), int(roiID)]
         else:
             raise Exception('Error in query.RegionsOfInterestClass.get_dvh: \
                 either the doseSummaryID \
                 or both rtSessionID and roiID must be specified')
 
-        if cumulative:
-            queryString += " and rds.type = 'Cumulative DVH, Norm Volume'"
-        else:
-            queryString += " and rds.type = 'Differential DVH'"
-
-        points = np.array(self.oncospace.run(queryString).rows)
-        d = Dvh()
-        d.set_data(points)
+        points = np.array(self.oncospace.run(queryString, params=params).rows)
+        d = Dvh(data=points)
         if cumulative:
             d.dose_type = 'cum'
             d.dose_units = 'cGy'
@@ -374,3 +398,140 @@ class RegionsOfInterestQueries(object):
             d.volume_type = 'diff'
             d.volume_units = 'cm3'
         return d
+
+    def get_dvhs(self,
+                 doseSummaryIDs=None,
+                 rtSessionIDs=None,
+                 roiIDs=None,
+                 cumulative=True,
+                 chunk_size=1000):
+        '''
+        Query for many DVHs at once and store them in a columnar `DvhCollection`.
+
+        The DVHs are selected either by dose summary ID, or by (rtSessionID, roiID)
+        pairs. The IDs are sent as query parameters, chunk_size DVHs per query, so
+        there is no round trip per DVH. The rows of each query are streamed from the
+        server (see Database.iterate) and converted to arrays before the next query
+        runs, so only one query's rows are held as Python objects at a time.
+
+        Keyword arguments:
+            :doseSummaryIDs:    list of doseSummaryIDs
+            :rtSessionIDs:      list of radiotherapySessionIDs
+            :roiIDs:            list of regionOfInterestIDs, paired with rtSessionIDs
+            :cumulative:        True/False for cumulative or differential DVHs
+            :chunk_size:        maximum number of DVHs selected by each query
+                                (at most 1000)
+        Returns:
+            `DvhCollection` with key columns 'dose_summary', 'session' and 'roi',
+            in the order of the requested IDs (or pairs). Repeated IDs are returned
+            once, and DVHs that were not found are left out. DVHs that match the same
+            (session, ROI) pair are ordered by dose summary ID.
+        '''
+        queryString = '''
+            SELECT rds.ID, rds.radiotherapySessionID, rds.roiID, X, Y
+            FROM DVHData dvh
+            JOIN RoiDoseSummaries rds ON rds.ID = dvh.roiDoseSummaryID
+            {0}
+            WHERE rds.type = ?{1}
+            ORDER BY rds.ID, X'''
+        chunk_size = max(1, min(int(chunk_size), 1000))
+        if doseSummaryIDs is not None:
+            ids = _unique([int(i) for i in doseSummaryIDs])
+            chunks = [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+            queries = [(queryString.format('', ' AND rds.ID IN ({0})'.format(
+                ', '.join(['?'] * len(chunk)))), [_dvh_type(cumulative)] + chunk)
+                       for chunk in chunks]
+            key_columns = ['dose_summary']
+        elif rtSessionIDs is not None and roiIDs is not None:
+            if len(rtSessionIDs) != len(roiIDs):
+                raise ValueError('rtSessionIDs and roiIDs must have the same length')
+            ids = _unique([(int(s), int(r)) for s, r in zip(rtSessionIDs, roiIDs)])
+            chunks = [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+            queries = []
+            for chunk in chunks:
+                join = '''JOIN (VALUES {0}) AS pairs (radiotherapySessionID, roiID)
+                ON rds.radiotherapySessionID = pairs.radiotherapySessionID
+                AND rds.roiID = pairs.roiID'''.format(', '.join(['(?, ?)'] * len(chunk)))
+                params = [i for pair in chunk for i in pair] + [_dvh_type(cumulative)]
+                queries.append((queryString.format(join, ''), params))
+            key_columns = ['session', 'roi']
+        else:
+            raise Exception('Error in query.RegionsOfInterestClass.get_dvhs: \
+                either the doseSummaryIDs \
+                or both rtSessionIDs and roiIDs must be specified')
+
+        collections = [_rows_to_dvh_collection(self.oncospace.iterate(query, params=params))
+                       for query, params in queries]
+        return _merge_dvh_collections(collections, ids, key_columns)
+
+
+def _unique(values):
+    '''
+    Helper function: values without repeats, in the order of their first occurrence
+    '''
+    unique, seen = [], set()
+    for v in values:
+        if v not in seen:
+            seen.add(v)
+            unique.append(v)
+    return unique
+
+
+def _dvh_type(cumulative):
+    '''
+    Helper function: type of the RoiDoseSummaries holding cumulative or differential DVHs
+    '''
+    return 'Cumulative DVH, Norm Volume' if cumulative else 'Differential DVH'
+
+
+def _rows_to_dvh_collection(rows):
+    '''
+    Helper function: group (roiDoseSummaryID, radiotherapySessionID, roiID, X, Y)
+    rows, ordered by roiDoseSummaryID, into a DvhCollection
+    '''
+    columns = [[], [], [], [], []]
+    for row in rows:
+        for column, value in zip(columns, row):
+            column.append(value)
+    ids = np.array(columns[0], dtype=np.int64)
+    # A new curve starts wherever the dose summary ID changes
+    starts = np.flatnonzero(np.diff(ids)) + 1
+    offsets = np.concatenate(([0], starts, [len(ids)])) if len(ids) else np.zeros(1)
+    first = offsets[:-1].astype(np.int64)
+    keys = {
+        'dose_summary': ids[first],
+        'session': np.array(columns[1], dtype=np.int64)[first],
+        'roi': np.array(columns[2], dtype=np.int64)[first],
+    }
+    return DvhCollection(np.array(columns[3], dtype=np.float64),
+                         np.array(columns[4], dtype=np.float64), offsets, keys=keys)
+
+
+def _merge_dvh_collections(collections, ids, key_columns):
+    '''
+    Helper function: concatenate the DvhCollections of several queries, and order
+    the curves like the requested ids (values, or tuples of values, of key_columns)
+    '''
+    dose_data = np.concatenate([c.dose_data for c in collections] + [np.zeros(0)])
+    volume_data = np.concatenate([c.volume_data for c in collections] + [np.zeros(0)])
+    lengths = np.concatenate([c.lengths for c in collections] + [np.zeros(0, dtype=np.int64)])
+    keys = {name: np.concatenate([c.keys[name] for c in collections]
+                                 + [np.zeros(0, dtype=np.int64)])
+            for name in ['dose_summary', 'session', 'roi']}
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+
+    # Position of each curve in the request. Curves with the same position keep
+    # their order (by dose summary ID)
+    position = {key: i for i, key in enumerate(ids)}
+    curve_ids = list(zip(*[keys[name].tolist() for name in key_columns]))
+    if len(key_columns) == 1:
+        curve_ids = [key[0] for key in curve_ids]
+    order = np.argsort(np.array([position[key] for key in curve_ids], dtype=np.int64),
+                       kind='mergesort')
+
+    lengths = lengths[order]
+    offsets = np.zeros(len(order) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(lengths)
+    points = np.repeat(starts[order] - offsets[:-1], lengths) + np.arange(offsets[-1])
+    return DvhCollection(dose_data[points], volume_data[points], offsets,
+                         keys={name: values[order] for name, values in keys.items()})
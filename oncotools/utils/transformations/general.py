@@ -172,7 +172,5 @@ class GeneralTransform(object):
             :points:    list of (x,y,z) indices that correspond to voxels in the mask
         '''
         mask = deepcopy(inmask)
-        mask.data = np.zeros(mask.data.shape)
-        for pt in points:
-            mask.data[pt[2], pt[1], pt[0]] = 1
+        mask.set_data_with_indices(points)
         return mask
@@ -5,12 +5,17 @@ This module contains methods for the transformations module.
 from copy import deepcopy
 import numpy as np
 
+from ...data_elements.image import LabelMap, CroppedMask, get_bounding_box
+
+# Octant index of each (z >= pt, y >= pt, x >= pt) combination, see octants_around_point
+_OCTANT_LOOKUP = np.array([6, 7, 5, 4, 2, 3, 1, 0], dtype=np.int8)
+
 class PartitionTransform(object):
     '''
     Partitioning transformations
     '''
 
-    def octants_around_point(self, msk, pt):
+    def octants_around_point(self, msk, pt, labels=False, dense=False):
         '''
         Create octants around a point in the dose grid.
         Specify a point to be the center of the octants.
@@ -18,8 +23,13 @@ class PartitionTransform(object):
         Positional arguments:
             :msk:   binary mask to contract to create octants
             :pt:    center of octants to cut around, specified as XYZ indices
+        Keyword arguments:
+            :labels:    return a single LabelMap instead of a list of masks
+            :dense:     return copies of the mask with their own data buffers
+                        instead of read-only views (see regions)
         Returns:
-            List of mask objects representing each octant.
+            List of mask objects representing each octant,
+            or a LabelMap where octant i has the label i + 1.
 
         Note:
             Octants are defined as follows:
@@ -48,9 +58,21 @@ class PartitionTransform(object):
             |  7     | (+,-,-)   |
             +--------+-----------+
         '''
-        octantMasks = []
-
         pt = np.asarray(np.round(pt), dtype=int)
+        if labels:
+            label_map = LabelMap.from_template(msk, [str(i + 1) for i in range(8)])
+            zyx = self.__positive_sides(msk, pt)
+            octant = 4 * zyx[0] + 2 * zyx[1] + zyx[2]
+            label_map.data[...] = (_OCTANT_LOOKUP[octant] + 1) * (msk.data != 0)
+            return label_map
+        if not dense:
+            limits = np.clip(pt[::-1], 0, np.asarray(msk.size[::-1]).astype(int))
+            z, y, x = [(slice(p, None), slice(0, p)) for p in limits]
+            return self.regions(msk, [
+                (z[0], y[0], x[0]), (z[0], y[0], x[1]), (z[0], y[1], x[1]), (z[0], y[1], x[0]),
+                (z[1], y[0], x[0]), (z[1], y[0], x[1]), (z[1], y[1], x[1]), (z[1], y[1], x[0])])
+
+        octantMasks = []
         for i in range(8):
             aMask = deepcopy(msk)
             if i != 0:
@@ -74,19 +96,34 @@ class PartitionTransform(object):
         return octantMasks
 
 
-    def halves(self, msk, pt):
+    def halves(self, msk, pt, labels=False, dense=False):
         '''
         Cut into superior and inferior halves along the z-axis.
 
         Positional arguments:
             :msk:   mask object to be cut
             :pt:    point (x,y,z) around which to cut the mask
+        Keyword arguments:
+            :labels:    return a single LabelMap instead of a list of masks
+            :dense:     return copies of the mask with their own data buffers
+                        instead of read-only views (see regions)
         Returns:
-            List of mask objects representing inferior and superior halves
+            List of mask objects representing inferior and superior halves,
+            or a LabelMap with the labels 1 and 2 in the same order.
         '''
-        halfMasks = []
-
         pt = np.asarray(np.round(pt), dtype=int)
+        if labels:
+            label_map = LabelMap.from_template(msk, ['1', '2'])
+            positive_z = self.__positive_sides(msk, pt)[0]
+            label_map.data[...] = (2 - positive_z) * (msk.data != 0)
+            return label_map
+        if not dense:
+            everything = slice(None)
+            z = min(max(pt[2], 0), int(msk.size[2]))
+            return self.regions(msk, [(slice(z, None), everything, everything),
+                                      (slice(0, z), everything, everything)])
+
+        halfMasks = []
         for i in range(2):
             aMask = deepcopy(msk)
             if i == 0:
@@ -98,7 +135,7 @@ class PartitionTransform(object):
         return halfMasks
 
 
-    def slices(self, msk, numSlices, axis):
+    def slices(self, msk, numSlices, axis, labels=False, dense=False):
         '''
         Cut a mask into slices of equal thickness along a specified axis.
 
@@ -106,8 +143,13 @@ class PartitionTransform(object):
             :msk:       mask object to be cut
             :numSlices: number of slices to be created
             :axis:      axis along which to be cut ("x", "y", or "z")
+        Keyword arguments:
+            :labels:    return a single LabelMap instead of a list of masks
+            :dense:     return copies of the mask with their own data buffers
+                        instead of read-only views (see regions)
         Returns:
-            List of mask objects representing each slice
+            List of mask objects representing each slice,
+            or a LabelMap where slice i has the label i + 1.
         '''
         if axis.lower() == "x":
             ax = 0
@@ -130,6 +172,25 @@ class PartitionTransform(object):
             sliceBounds.append(b)
         sliceBounds.append(-1)
         sliceBounds = np.round(sliceBounds).astype(int)
+
+        if labels:
+            label_map = LabelMap.from_template(msk, [str(i + 1) for i in range(numSlices)])
+            # Label of each position along the cutting axis, broadcast over the mask
+            axis_labels = np.zeros(msk.data.shape[2 - ax], dtype=label_map.data.dtype)
+            for i in range(numSlices):
+                axis_labels[sliceBounds[i]:sliceBounds[i + 1]] = i + 1
+            shape = [1, 1, 1]
+            shape[2 - ax] = -1
+            label_map.data[...] = axis_labels.reshape(shape) * (msk.data != 0)
+            return label_map
+        if not dense:
+            boxes = []
+            for i in range(numSlices):
+                box = [slice(None)] * 3
+                box[2 - ax] = slice(sliceBounds[i], sliceBounds[i + 1])
+                boxes.append(tuple(box))
+            return self.regions(msk, boxes)
+
         sliceMasks = []
 
         for i in range(numSlices):
@@ -146,3 +207,39 @@ class PartitionTransform(object):
             slMask.data = np.logical_xor(msk.data, dataA)
             sliceMasks.append(slMask)
         return sliceMasks
+
+    def regions(self, msk, boxes):
+        '''
+        Cut boxes out of a mask without copying its data.
+
+        Each region is a CroppedMask whose crop is a read-only view of the mask data,
+        restricted to the bounding box of the mask. The regions share their voxels with
+        the mask: a region only allocates its own data buffer when its 'data' attribute
+        is accessed, and changes to the mask data show through until then.
+
+        Positional arguments:
+            :msk:   mask object to be cut
+            :boxes: list of tuples of slices in [Z,Y,X] order
+        Returns:
+            List of CroppedMask objects, one per box
+        '''
+        if not (isinstance(msk, CroppedMask) and msk._data is None):
+            bbox = get_bounding_box(msk.data)
+            if bbox is None:
+                bbox = (slice(0, 0),) * 3
+            msk = CroppedMask.from_region(msk, bbox)
+        return [CroppedMask.from_region(msk, box) for box in boxes]
+
+    @staticmethod
+    def __positive_sides(msk, pt):
+        '''
+        Helper function: for each of the [Z,Y,X] axes, flag the voxels that lie on
+        the positive side of the point (as broadcastable arrays).
+        '''
+        shape = msk.data.shape
+        sides = []
+        for axis, p in enumerate(pt[::-1]):
+            side_shape = [1, 1, 1]
+            side_shape[axis] = -1
+            sides.append((np.arange(shape[axis]) >= p).astype(np.int8).reshape(side_shape))
+        return sides
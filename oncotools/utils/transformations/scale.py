@@ -5,20 +5,22 @@ This module contains methods for the transformations module.
 from copy import deepcopy
 import numpy as np
 
+from .. import distance, morphology
+from ...data_elements.image import Mask, LabelMap, get_bounding_box
+
 class ScaleTransform(object):
     '''
     Scaling transformations
     '''
 
-    def __expand_contract_helper(self, msk, expansion):
+    def __parse_margins(self, expansion):
         '''
-        Expand the binary mask surface by the given expansion in physical units (e.g., mm, cm, ...)
-
-        Note that all expansions should be positive values!
+        Convert an expansion or contraction to negative (n) and positive (p) x, y, and z.
 
         Positional arguments:
-            :msk:       mask to transform
             :expansion: float or list of floats defining the expansion
+        Returns:
+            tuple of floats (nx, px, ny, py, nz, pz)
 
         Note: Expansion may be given as:
             - A single number:       uniform expansion in all dimensions
@@ -26,7 +28,6 @@ class ScaleTransform(object):
             - A list of 3 numbers:   expansion in x, y, and z, respectively
             - A list of 6 numbers:   expansion in -x, +x, -y, +y, -z, and +z, respectively
         '''
-        # Process the expansion. Convert to negative (n) and positive (p) x, y, and z
         if isinstance(expansion, str):
             expansion = float(expansion)
 
@@ -49,71 +50,39 @@ class ScaleTransform(object):
             nx, px, ny, py, nz, pz = [float(e) for e in expansion]
         else:
             raise TypeError('Invalid expansion: ' + str(expansion))
+        return nx, px, ny, py, nz, pz
 
-        # Convert physical expansions to voxel expansions
-        nix = int(round(nx / msk.spacing[0]))
-        pix = int(round(px / msk.spacing[0]))
-        niy = int(round(ny / msk.spacing[1]))
-        piy = int(round(py / msk.spacing[1]))
-        niz = int(round(nz / msk.spacing[2]))
-        piz = int(round(pz / msk.spacing[2]))
-
-        # Determine the indices of all neighboring voxels within the bounds of the voxel expansions
-        shape = (niz + piz + 1, niy + piy + 1, nix + pix + 1)
-        kernel = np.zeros(shape, dtype=bool)
-        for iz in range(-niz, piz + 1):
-            for iy in range(-niy, piy + 1):
-                for ix in range(-nix, pix + 1):
-                    # For a voxel to be inside the expansion surface, do NOT assume
-                    # that the expansion surface must contain the voxel center. Instead,
-                    # assume that the expansion surface overlaps the ellipse positioned
-                    # at the center of the voxel having radii equal to 1/4 the voxel size.
-                    if ix < 0:
-                        x = nx + msk.spacing[0] / 4
-                    else:
-                        x = px + msk.spacing[0] / 4
-                    if iy < 0:
-                        y = ny + msk.spacing[1] / 4
-                    else:
-                        y = py + msk.spacing[1] / 4
-                    if iz < 2:
-                        z = nz + msk.spacing[2] / 4
-                    else:
-                        z = pz + msk.spacing[2] / 4
-
-                    sum_of_squares = 0.0
-                    if x != 0:
-                        sum_of_squares += (ix * msk.spacing[0] / x)**2
-                    if y != 0:
-                        sum_of_squares += (iy * msk.spacing[1] / y)**2
-                    if z != 0:
-                        sum_of_squares += (iz * msk.spacing[2] / z)**2
-                    if sum_of_squares <= 1:
-                        kernel[iz + niz, iy + niy, ix + nix] = 1
-
-        expansion_voxels = np.transpose(np.nonzero(kernel))
-        expansion_voxels[:, 0] -= niz
-        expansion_voxels[:, 1] -= niy
-        expansion_voxels[:, 2] -= nix
-
-        # Apply expansion voxels to mask surface
-        expansion_mask = msk.get_mask_edge_voxels(exclude_z=False)
-        expansion_mask_idx = np.transpose(np.nonzero(expansion_mask.data))
-        for i in range(expansion_mask_idx.shape[0]):
-            new_mask_idx = expansion_mask_idx[i, :] + expansion_voxels
-            in_bounds = np.logical_and(
-                new_mask_idx[:, 0] >= 0,
-                np.logical_and(
-                    new_mask_idx[:, 0] < msk.size[2],
-                    np.logical_and(
-                        new_mask_idx[:, 1] >= 0,
-                        np.logical_and(
-                            new_mask_idx[:, 1] < msk.size[1],
-                            np.logical_and(new_mask_idx[:, 2] >= 0,
-                                        new_mask_idx[:, 2] < msk.size[0])))))
-            z, y, x = np.transpose(new_mask_idx[in_bounds, :])
-            expansion_mask.data[z, y, x] = 1
-        return expansion_mask
+    def __margin_weights(self, msk, expansion):
+        '''
+        Convert an expansion or contraction into distance transform weights.
+
+        A voxel lies within the margin of another voxel if it overlaps the ellipsoid
+        centered on that voxel, with radii equal to the margin. The voxel is approximated
+        by the ellipsoid positioned at its center, with radii equal to 1/4 the voxel size.
+        With these weights, this is the case when the squared distance is at most 1.
+
+        Positional arguments:
+            :msk:       mask to transform
+            :expansion: float or list of floats defining the expansion (see expand)
+        Returns:
+            list of (negative, positive) weights for each axis, in [Z,Y,X] order
+        '''
+        nx, px, ny, py, nz, pz = self.__parse_margins(expansion)
+        sx, sy, sz = [float(s) for s in msk.spacing]
+        return [(sz / (nz + sz / 4), sz / (pz + sz / 4)),
+                (sy / (ny + sy / 4), sy / (py + sy / 4)),
+                (sx / (nx + sx / 4), sx / (px + sx / 4))]
+
+    @staticmethod
+    def __padded_box(box, weights, shape):
+        '''
+        Grow a bounding box by the largest number of voxels within the margin.
+        '''
+        padded = []
+        for b, (wn, wp), n in zip(box, weights, shape):
+            pad = int(np.floor(1.0 / min(wn, wp))) + 1
+            padded.append(slice(max(b.start - pad, 0), min(b.stop + pad, n)))
+        return tuple(padded)
 
 
     def expand(self, msk, expansion):
@@ -132,8 +101,18 @@ class ScaleTransform(object):
             - A list of 3 numbers:   expansion in x, y, and z, respectively
             - A list of 6 numbers:   expansion in -x, +x, -y, +y, -z, and +z, respectively
         '''
-        expansion_mask = self.__expand_contract_helper(deepcopy(msk), expansion)
-        expansion_mask.data = np.logical_or(expansion_mask.data, msk.data)
+        weights = self.__margin_weights(msk, expansion)
+        expansion_mask = Mask()
+        expansion_mask.copy_information(msk)
+        expansion_mask.fill_buffer(0, np.bool)
+
+        # Voxels farther than the margin from the bounding box cannot be reached
+        box = get_bounding_box(msk.data)
+        if box is None:
+            return expansion_mask
+        box = self.__padded_box(box, weights, msk.data.shape)
+        dist = distance.squared_distance_transform(msk.data[box], weights)
+        expansion_mask.data[box] = dist <= 1
         return expansion_mask
 
 
@@ -151,25 +130,133 @@ class ScaleTransform(object):
             - A list of 3 numbers:   contraction in x, y, and z, respectively
             - A list of 6 numbers:   contraction in -x, +x, -y, +y, -z, and +z, respectively
         '''
-        contraction_mask = self.__expand_contract_helper(deepcopy(msk), contraction)
-        contraction_mask.data = np.logical_and(msk.data, np.logical_not(contraction_mask.data))
+        weights = self.__margin_weights(msk, contraction)
+        contraction_mask = Mask()
+        contraction_mask.copy_information(msk)
+        contraction_mask.fill_buffer(0, np.bool)
+
+        box = get_bounding_box(msk.data)
+        if box is None:
+            return contraction_mask
+        # The voxels closest to the inside of the mask are on its edge, so the
+        # distance to the voxels outside of the interior is the distance to the edge
+        inside = msk.data[box] != 0
+        edges = msk.get_edges(exclude_z=False).mask.data[box] != 0
+        dist = distance.squared_distance_transform(
+            np.logical_or(np.logical_not(inside), edges), weights)
+        contraction_mask.data[box] = np.logical_and(inside, dist > 1)
         return contraction_mask
 
 
-    def shells(self, msk, expansions=[], contractions=[]):
+    def dilate(self, msk, radius, kernel='box'):
+        '''
+        Dilate the binary mask with a box or ellipsoid structuring element.
+
+        Positional arguments:
+            :msk:       mask to transform
+            :radius:    int or list of ints defining the radius of the kernel in voxels
+        Keyword arguments:
+            :kernel:    'box' or 'ellipsoid'
+        Returns:
+            dilated mask
+        Raises:
+            :ValueError:    if the radius is not a voxel count, or the kernel is unknown
+
+        Note: The radius is given like the expansion (see expand), in voxels instead of
+        physical units.
+        '''
+        radii = self.__voxel_radii(radius)
+        dilated_mask = Mask()
+        dilated_mask.copy_information(msk)
+        dilated_mask.fill_buffer(0, np.bool)
+
+        box = get_bounding_box(msk.data)
+        if box is None:
+            return dilated_mask
+        box = self.__grow_box(box, radii, msk.data.shape)
+        dilated_mask.data[box] = morphology.dilate(msk.data[box], radii, kernel)
+        return dilated_mask
+
+    def erode(self, msk, radius, kernel='box'):
+        '''
+        Erode the binary mask with a box or ellipsoid structuring element.
+
+        Voxels beyond the image bounds are considered inside of the mask.
+
+        Positional arguments:
+            :msk:       mask to transform
+            :radius:    int or list of ints defining the radius of the kernel in voxels
+        Keyword arguments:
+            :kernel:    'box' or 'ellipsoid'
+        Returns:
+            eroded mask
+        Raises:
+            :ValueError:    if the radius is not a voxel count, or the kernel is unknown
+
+        Note: The radius is given like the contraction (see contract), in voxels instead of
+        physical units.
+        '''
+        radii = self.__voxel_radii(radius)
+        eroded_mask = Mask()
+        eroded_mask.copy_information(msk)
+        eroded_mask.fill_buffer(0, np.bool)
+
+        box = get_bounding_box(msk.data)
+        if box is None:
+            return eroded_mask
+        # Keep the voxels outside of the mask around the bounding box in the erosion
+        box = self.__grow_box(box, radii, msk.data.shape)
+        eroded_mask.data[box] = morphology.erode(msk.data[box], radii, kernel)
+        return eroded_mask
+
+    def __voxel_radii(self, radius):
+        '''
+        Convert a radius in voxels to (negative, positive) pairs in [Z,Y,X] order.
+        '''
+        nx, px, ny, py, nz, pz = self.__parse_margins(radius)
+        radii = [(nz, pz), (ny, py), (nx, px)]
+        if any([r != int(r) for pair in radii for r in pair]):
+            raise ValueError('Radius must be given in voxels: ' + str(radius))
+        return [(int(n), int(p)) for n, p in radii]
+
+    @staticmethod
+    def __grow_box(box, radii, shape):
+        '''
+        Grow a bounding box by a number of voxels on each side.
+        '''
+        return tuple(slice(max(b.start - n, 0), min(b.stop + p, size))
+                     for b, (n, p), size in zip(box, radii, shape))
+
+    def shells(self, msk, expansions=[], contractions=[], labels=False, method='margin'):
         '''
         Create shells from a list of contractions and expansions.
 
         Positional arguments:
             :msk:   binary mask to contract to create shells
         Keyword arguments:
-            :cts:   list of contractions
-            :exp:   list of expansions
+            :cts:       list of contractions
+            :exp:       list of expansions
+            :labels:    return a single LabelMap instead of a list of masks
+            :method:    'margin' to expand and contract the mask for every shell, or
+                        'distance' to threshold a single signed distance map of the mask
         Returns:
             - List of expansion and contraction factors, and
             - List of masks representing the shells, where each shell sits inside the previous.
-            The index of each mask corresponds to the index of each expansion/contraction factor
+            The index of each mask corresponds to the index of each expansion/contraction factor.
+            If labels is set, a LabelMap where shell i has the label i + 1 replaces the list.
+        Raises:
+            :ValueError:    if the method is unknown
+
+        Note: With the 'distance' method, expansions and contractions must be single numbers.
+        A voxel is within a margin of the mask if its Euclidean distance to the mask surface
+        is at most the margin plus 1/4 of the smallest voxel size. With isotropic voxels, the
+        shells are the same as with the 'margin' method.
         '''
+        if method == 'distance':
+            return self.__distance_shells(msk, expansions, contractions, labels)
+        if method != 'margin':
+            raise ValueError('Unknown shells method: ' + str(method))
+
         orig = deepcopy(msk)
         # Order the expansions and contractions
         exp = deepcopy(expansions)
@@ -182,6 +269,21 @@ class ScaleTransform(object):
         bounds.extend(["+0.0"])
         bounds.extend(["-" + str(c) for c in cts])
 
+        if labels:
+            # Paint the shells from the outermost to the innermost, so that each
+            # shell only keeps the voxels that are not part of the next one. Only
+            # one expanded or contracted mask is held in memory at a time.
+            label_map = LabelMap.from_template(msk, bounds)
+            for idx in range(len(bounds)):
+                if idx < len(exp):
+                    s = self.expand(orig, exp[idx])
+                elif idx == len(exp):
+                    s = orig
+                else:
+                    s = self.contract(orig, cts[idx - len(exp) - 1])
+                label_map.data[s.data != 0] = idx + 1
+            return bounds, label_map
+
         # Create expanded and contracted masks
         exps = [self.expand(orig, e) for e in exp]
         cons = [self.contract(orig, c) for c in cts]
@@ -196,3 +298,40 @@ class ScaleTransform(object):
                 s.data = np.logical_and(s.data, np.logical_not(shls[idx + 1].data))
 
         return bounds, shls
+
+    def __distance_shells(self, msk, expansions, contractions, labels):
+        '''
+        Create shells as bands of the signed distance to the mask surface (see shells).
+        '''
+        try:
+            exp = sorted([float(e) for e in expansions], reverse=True)
+            cts = sorted([float(c) for c in contractions])
+        except TypeError:
+            raise TypeError('Distance shells need single number expansions and contractions')
+        if any([e < 0 for e in exp + cts]):
+            raise TypeError('Expansions and contractions cannot be negative')
+        bounds = ["+" + str(e) for e in exp]
+        bounds.extend(["+0.0"])
+        bounds.extend(["-" + str(c) for c in cts])
+
+        # Label each voxel with the number of expanded and contracted masks that contain it
+        label_map = LabelMap.from_template(msk, bounds)
+        box = get_bounding_box(msk.data)
+        if box is not None:
+            spacing = np.array(msk.spacing, dtype=float)[::-1]
+            tolerance = spacing.min() / 4
+            reach = (exp[0] if exp else 0.0) + tolerance
+            box = tuple(slice(max(b.start - int(np.ceil(reach / sp)) - 1, 0),
+                              min(b.stop + int(np.ceil(reach / sp)) + 1, n))
+                        for b, sp, n in zip(box, spacing, msk.data.shape))
+            dist = distance.signed_distance_transform(msk.data[box], spacing)
+            # Expanded masks (and the mask itself) hold the voxels up to their
+            # bound, contracted masks the voxels beyond their bound
+            outer = np.sort([0.0] + [e + tolerance for e in exp])
+            inner = np.sort([-(c + tolerance) for c in cts])
+            label_map.data[box] = \
+                (outer.size - np.searchsorted(outer, dist, side='left')) + \
+                (inner.size - np.searchsorted(inner, dist, side='right'))
+        if labels:
+            return bounds, label_map
+        return bounds, [label_map.get_mask(i) for i in range(len(bounds))]
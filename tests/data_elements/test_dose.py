@@ -103,5 +103,24 @@ class TestDose(unittest.TestCase):
         for f in fields:
             self.assertEqual(getattr(new_dg, f), getattr(self.dg, f))
 
+    def test_sample(self):
+        '''
+        Trilinear sampling returns the voxel values on the grid, and averages between voxels
+        '''
+        rng = np.random.RandomState(0)
+        size = np.asarray(self.dg.size, dtype=int)
+        voxels = np.vstack([rng.randint(0, n - 1, 50) for n in size]).T
+        points = voxels + np.asarray(self.dg.index)
+        on_grid = self.dg.data[voxels[:, 2], voxels[:, 1], voxels[:, 0]]
+        self.assertTrue(np.allclose(self.dg.sample(points, chunk_size=16), on_grid))
+        # Halfway between two neighbors along x
+        next_x = self.dg.data[voxels[:, 2], voxels[:, 1], voxels[:, 0] + 1]
+        halfway = self.dg.sample(points + [0.5, 0, 0])
+        self.assertTrue(np.allclose(halfway, 0.5 * (on_grid + next_x)))
+        # Scaled dose in single precision
+        sampled32 = self.dg_scaled.sample(points, dtype=np.float32)
+        self.assertEqual(sampled32.dtype, np.float32)
+        self.assertTrue(np.allclose(sampled32, 0.5 * on_grid, rtol=1e-5))
+
 if __name__ == '__main__':
     unittest.main()
@@ -2,9 +2,12 @@ import base64
 import pickle
 import unittest
 import numpy as np
+from copy import deepcopy
 
 from oncotools.connect import Database
-from oncotools.data_elements.dose_map import DoseMask
+from oncotools.data_elements.dose_map import DoseMask, DoseLabelMap, DoseAccumulator, \
+    interpolate_dose
+from oncotools import transform as tf
 
 class TestDoseMap(unittest.TestCase):
     '''
@@ -144,5 +147,100 @@ class TestDoseMap(unittest.TestCase):
         y = self.dm.get_volume_with_dose(self.dm.max_dose+1)
         self.assertEqual(y, 0)
 
+    def test_from_masks(self):
+        '''
+        Batched dose masks match the dose masks computed one at a time
+        '''
+        octants = tf.partition.octants_around_point(self.mask, self.mask.center_of_mass)
+        octants = [o for o in octants if o.get_volume() > 0]
+        batch = DoseMask.from_masks(octants, self.dg)
+        self.assertEqual(len(batch), len(octants))
+        for o, dm in zip(octants, batch):
+            single = DoseMask(o, self.dg)
+            self.assertTrue(np.all(single.data == dm.data))
+            self.assertEqual(single.mean_dose, dm.mean_dose)
+            self.assertEqual(single.fraction_outside_dosegrid, dm.fraction_outside_dosegrid)
+
+    def test_dose_label_map(self):
+        '''
+        Per-region statistics of a label map match the dose masks of each region
+        '''
+        octants = tf.partition.octants_around_point(self.mask, self.mask.center_of_mass)
+        label_map = tf.partition.octants_around_point(
+            self.mask, self.mask.center_of_mass, labels=True)
+        dose_label_map = DoseLabelMap(label_map, self.dg)
+        self.assertEqual(len(dose_label_map), 8)
+        for o, region in zip(octants, dose_label_map):
+            if o.get_volume() == 0:
+                self.assertTrue(np.isnan(region.mean_dose))
+                continue
+            dm = DoseMask(o, self.dg)
+            self.assertAlmostEqual(dm.mean_dose, region.mean_dose, places=6)
+            self.assertAlmostEqual(dm.std_dose, region.std_dose, places=6)
+            self.assertEqual(dm.min_dose, region.min_dose)
+            self.assertEqual(dm.max_dose, region.max_dose)
+            self.assertAlmostEqual(dm.fraction_outside_dosegrid, region.fraction_outside_dosegrid)
+            self.assertTrue(np.allclose(dm.dvh_data, region.dvh_data))
+
+    def test_interpolate_dose(self):
+        '''
+        Dose sampled at the mask voxels matches the dose mask
+        '''
+        indices = np.transpose(self.mask.nonzero_indices())
+        dose_data, inbounds = interpolate_dose(self.dg, self.mask, indices)
+        self.assertEqual(len(dose_data), np.count_nonzero(inbounds))
+        inside = indices[inbounds]
+        self.assertTrue(np.array_equal(
+            dose_data, self.dm.data[inside[:, 0], inside[:, 1], inside[:, 2]]))
+
+    def test_float32_dose(self):
+        '''
+        Dose masks can keep the dose in float32 with the same statistics and DVH
+        '''
+        dose = deepcopy(self.dg)
+        dose.dose_dtype = np.float32
+        dm = DoseMask(self.mask, dose)
+        self.assertEqual(dm.data.dtype, np.float32)
+        self.assertEqual(self.dm.data.dtype, np.float64)
+        self.assertAlmostEqual(dm.mean_dose, self.dm.mean_dose, places=2)
+        self.assertTrue(np.allclose(dm.dvh_data, self.dm.dvh_data, rtol=1e-5))
+        dose_mask, _ = DoseAccumulator(self.mask).add(dose).get_dose_mask()
+        self.assertEqual(dose_mask.data.dtype, np.float32)
+        self.assertTrue(np.allclose(dose_mask.data, self.dm.data, rtol=1e-5))
+
+    def test_dose_accumulator(self):
+        '''
+        Doses accumulated at the mask voxels match the dose mask of the summed dose
+        '''
+        accumulator = DoseAccumulator(self.mask).add(self.dg)
+        dose_mask, fraction_outside_dosegrid = accumulator.get_dose_mask()
+        self.assertTrue(np.allclose(dose_mask.data, self.dm.data))
+        self.assertEqual(fraction_outside_dosegrid, self.dm.fraction_outside_dosegrid)
+        (dose, volume), _ = accumulator.compute_dvh()
+        self.assertTrue(np.allclose(dose, self.dm.dvh_data[:, 0]))
+        self.assertTrue(np.allclose(volume, self.dm.dvh_data[:, 1]))
+
+        # Plan sum of two sessions
+        accumulator.add_doses([self.dg], weights=[0.5])
+        self.assertEqual(accumulator.num_doses, 2)
+        dose_mask, _ = accumulator.get_dose_mask()
+        self.assertTrue(np.allclose(dose_mask.data, 1.5 * self.dm.data))
+
+        # Voxels outside of one of the dose grids count as outside the dose grid
+        shifted = deepcopy(self.dg)
+        center = self.mask.transform_index_to_physical_point(
+            np.transpose(self.mask.nonzero_indices())[:, ::-1].mean(axis=0))
+        shifted.origin[0] = center[0]
+        accumulator.add(shifted)
+        self.assertTrue(np.any(accumulator.coverage < 3))
+        self.assertGreater(accumulator.get_dose_mask()[1], self.dm.fraction_outside_dosegrid)
+
+        # Dose grids are corrected for Pinnacle's LH coordinates
+        uncorrected = deepcopy(self.dg)
+        uncorrected.origin_modified = False
+        DoseAccumulator(self.mask).add(uncorrected)
+        self.assertTrue(uncorrected.origin_modified)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,229 @@
+import unittest
+import numpy as np
+
+from oncotools.data_elements.image import Mask, LabelMap, get_mask_edge_voxels
+from oncotools.data_elements.dose import Dose
+from oncotools.data_elements.dose_map import DoseMask, DoseLabelMap, DoseAccumulator, \
+    compute_dose_mask, correct_dose_grid_origin
+from oncotools.data_elements.dvh import Dvh, compute_dvh, compute_dvhs, exact_dose_to_volume
+
+
+def make_mask(center, radii, shape=(20, 40, 50), spacing=(0.3, 0.3, 0.5), origin=(-5., -4., -3.)):
+    '''
+    Ellipsoid mask (center and radii in [Z,Y,X] voxels)
+    '''
+    mask = Mask()
+    mask.size = np.array(shape[::-1])
+    mask.spacing = np.array(spacing)
+    mask.origin = np.array(origin)
+    mask.index = np.zeros(3)
+    mask.update_end()
+    mask.fill_buffer(0, dtype=np.uint8)
+    z, y, x = np.ogrid[:shape[0], :shape[1], :shape[2]]
+    inside = ((z - center[0]) / radii[0])**2 + ((y - center[1]) / radii[1])**2 \
+        + ((x - center[2]) / radii[2])**2 <= 1
+    mask.data[inside] = 1
+    return mask
+
+
+def make_dose(shape=(15, 30, 35), spacing=(0.45, 0.4, 0.7), origin=(-6., -5., -4.),
+              dose_dtype=np.float64):
+    '''
+    Smooth dose grid covering the masks, already corrected for the Pinnacle origin
+    '''
+    dose = Dose()
+    dose.dose_dtype = dose_dtype
+    dose.size = np.array(shape[::-1])
+    dose.spacing = np.array(spacing)
+    dose.origin = np.array(origin)
+    dose.index = np.zeros(3)
+    dose.update_end()
+    z, y, x = np.mgrid[:shape[0], :shape[1], :shape[2]]
+    dose.data = (1000 + 500 * np.sin(x / 5.) * np.cos(y / 7.) + 30 * z).astype(np.float32)
+    dose.scaled_data = dose.data
+    dose.dose_units = 'cGy'
+    dose.origin_modified = True
+    return dose
+
+
+class TestDoseSynthetic(unittest.TestCase):
+    '''
+    Test data elements: dose masks and DVHs on synthetic masks and dose grids
+    (no database required)
+    '''
+
+    def setUp(self):
+        self.mask = make_mask((10, 20, 25), (5, 9, 11))
+        self.dose = make_dose()
+
+    def test_dose_masks_from_masks(self):
+        '''
+        Dose masks built together match the ones built one mask at a time
+        '''
+        masks = [self.mask, make_mask((8, 12, 30), (3, 6, 8))]
+        dose_masks = DoseMask.from_masks(masks, self.dose)
+        self.assertEqual(len(dose_masks), 2)
+        for m, dose_mask in zip(masks, dose_masks):
+            expected = DoseMask(m, self.dose)
+            self.assertTrue(np.array_equal(dose_mask.data, expected.data))
+            self.assertEqual(dose_mask.mean_dose, expected.mean_dose)
+            self.assertEqual(dose_mask.fraction_outside_dosegrid,
+                             expected.fraction_outside_dosegrid)
+            self.assertTrue(np.array_equal(dose_mask.dvh_data, expected.dvh_data))
+
+    def test_dose_label_map(self):
+        '''
+        The regions of a dose label map have the statistics and DVHs of dose masks
+        '''
+        # The second mask lies partly outside the dose grid
+        masks = [self.mask, make_mask((4, 33, 10), (2, 4, 6))]
+        dose_label_map = DoseLabelMap(LabelMap.from_masks(masks, ['a', 'b']), self.dose)
+        self.assertEqual(len(dose_label_map), 2)
+        for m, region in zip(masks, dose_label_map):
+            expected = DoseMask(m, self.dose)
+            self.assertAlmostEqual(region.min_dose, expected.min_dose)
+            self.assertAlmostEqual(region.max_dose, expected.max_dose)
+            self.assertAlmostEqual(region.mean_dose, expected.mean_dose)
+            self.assertAlmostEqual(region.std_dose, expected.std_dose)
+            self.assertAlmostEqual(region.fraction_outside_dosegrid,
+                                   expected.fraction_outside_dosegrid)
+            self.assertTrue(np.allclose(region.dvh_data, expected.dvh_data))
+        self.assertGreater(dose_label_map[1].fraction_outside_dosegrid, 0)
+        self.assertEqual(dose_label_map[-1].region['name'], 'b')
+
+    def test_compute_dvhs(self):
+        '''
+        DVHs computed in one dose pass match the ones computed one mask at a time
+        '''
+        masks = {
+            'a': self.mask,
+            'b': make_mask((8, 12, 30), (3, 6, 8)),
+            # Different geometry
+            'c': make_mask((6, 10, 12), (4, 6, 6), shape=(12, 20, 25), spacing=(0.5, 0.5, 0.8))
+        }
+        for exact in (False, True):
+            dvhs = compute_dvhs(self.dose, masks, workers=2, exact=exact)
+            self.assertEqual(sorted(dvhs), sorted(masks))
+            for key, m in masks.items():
+                expected = Dvh(mask=m, dose=self.dose, exact=exact)
+                self.assertTrue(np.array_equal(dvhs[key].data, expected.data))
+
+    def test_dose_accumulator(self):
+        '''
+        Accumulated doses are the weighted sum of the doses of each grid
+        '''
+        # A single dose grid gives the dose mask of compute_dose_mask
+        accumulator = DoseAccumulator(self.mask).add(self.dose)
+        dose_mask, fraction_outside = accumulator.get_dose_mask()
+        expected, _ = compute_dose_mask(dose=self.dose, mask=self.mask)
+        self.assertTrue(np.allclose(dose_mask.data, expected.data))
+        self.assertEqual(fraction_outside, 0.0)
+
+        # The second grid only covers the upper part of the mask
+        shifted = make_dose(origin=(-6., -5., 1.5))
+        accumulator.add(shifted, weight=2.0)
+        self.assertEqual(accumulator.num_doses, 2)
+        covered = accumulator.coverage == 2
+        self.assertTrue(np.any(covered) and not np.all(covered))
+        self.assertTrue(np.all(accumulator.coverage >= 1))
+        self.assertAlmostEqual(accumulator.fraction_outside_dosegrid,
+                               1.0 - np.count_nonzero(covered) / float(covered.size))
+
+        single = DoseAccumulator(self.mask).add(self.dose).dose_data
+        dose_mask, _ = compute_dose_mask(dose=shifted, mask=self.mask)
+        shifted_dose = dose_mask.data[self.mask.nonzero_indices()]
+        self.assertTrue(np.allclose(accumulator.dose_data[covered],
+                                    single[covered] + 2.0 * shifted_dose[covered]))
+        self.assertTrue(np.allclose(accumulator.dose_data[~covered], single[~covered]))
+
+        # Dose grids that have not been corrected yet are corrected when added
+        uncorrected = make_dose()
+        uncorrected.origin_modified = False
+        expected = make_dose()
+        correct_dose_grid_origin(self.mask, expected)
+        DoseAccumulator(self.mask).add(uncorrected)
+        self.assertTrue(uncorrected.origin_modified)
+        self.assertTrue(np.allclose(uncorrected.origin, expected.origin))
+
+    def test_float32_dose(self):
+        '''
+        A float32 dose_dtype keeps the dose values in float32 through the pipeline
+        '''
+        dose32 = make_dose(dose_dtype=np.float32)
+        dose_mask, _ = compute_dose_mask(dose=self.dose, mask=self.mask)
+        dose_mask32, _ = compute_dose_mask(dose=dose32, mask=self.mask)
+        self.assertEqual(dose_mask.data.dtype, np.float64)
+        self.assertEqual(dose_mask32.data.dtype, np.float32)
+        self.assertTrue(np.allclose(dose_mask32.data, dose_mask.data, rtol=1e-6))
+
+        # Statistics and DVH volumes are still accumulated in float64
+        expected = DoseMask(self.mask, self.dose)
+        dose_mask32 = DoseMask(self.mask, dose32)
+        self.assertAlmostEqual(dose_mask32.mean_dose / expected.mean_dose, 1.0, places=6)
+        self.assertEqual(dose_mask32.dvh_data.dtype, np.float64)
+        (dose, volume), _ = compute_dvh(mask=self.mask, dose=dose32, exact=True)
+        self.assertEqual(dose.dtype, np.float32)
+        self.assertEqual(volume.dtype, np.float64)
+
+        masks = [self.mask, make_mask((4, 33, 10), (2, 4, 6))]
+        label_map = LabelMap.from_masks(masks)
+        regions = DoseLabelMap(label_map, self.dose)
+        regions32 = DoseLabelMap(label_map, dose32)
+        self.assertTrue(np.allclose(regions32.mean_dose, regions.mean_dose, rtol=1e-6))
+
+        accumulator = DoseAccumulator(self.mask).add(dose32).add(dose32)
+        self.assertEqual(accumulator.dose_data.dtype, np.float32)
+        self.assertTrue(np.allclose(accumulator.dose_data,
+                                    2 * dose_mask.data[self.mask.nonzero_indices()], rtol=1e-6))
+
+    def test_exact_dvh(self):
+        '''
+        An exact DVH has one point per voxel, with the sorted voxel doses
+        '''
+        dose_mask, _ = compute_dose_mask(dose=self.dose, mask=self.mask)
+        voxel_dose = np.sort(dose_mask.data[dose_mask.data.nonzero()])
+        n = voxel_dose.size
+
+        (dose, volume), fraction_outside = compute_dvh(
+            mask=self.mask, dose=self.dose, exact=True)
+        self.assertEqual(fraction_outside, 0.0)
+        self.assertTrue(np.array_equal(dose, voxel_dose))
+        self.assertTrue(np.allclose(volume, np.arange(n, 0, -1) / float(n)))
+        self.assertEqual(exact_dose_to_volume(dose, volume, 1.0), voxel_dose[0])
+        self.assertEqual(exact_dose_to_volume(dose, volume, 0.5 / n), voxel_dose[-1])
+
+        dvh = Dvh(mask=self.mask, dose=self.dose, exact=True)
+        self.assertEqual(len(dvh.dose_data), n)
+        self.assertTrue(np.array_equal(dvh.dose_data, voxel_dose))
+
+    def test_edge_weighted_dvh(self):
+        '''
+        Edge-weighted DVHs match a histogram with the weight applied to each edge voxel
+        '''
+        weight = 0.5
+        dose_mask, _ = compute_dose_mask(dose=self.dose, mask=self.mask)
+        mask_voxel_indices = dose_mask.data.nonzero()
+        voxel_dose = dose_mask.data[mask_voxel_indices]
+        weights = np.ones(voxel_dose.size)
+        edge_mask = get_mask_edge_voxels(self.mask, exclude_z=True)
+        weights[edge_mask.data[mask_voxel_indices] > 0] *= weight
+        self.assertTrue(np.any(weights != 1))
+
+        hist, edges = np.histogram(voxel_dose, bins=99, weights=weights)
+        volume = np.cumsum(np.append(hist, 0)[::-1])[::-1]
+        (dose, dvh_volume), _ = compute_dvh(
+            mask=self.mask, dose=self.dose, edge_voxel_weight=weight, bins=100)
+        self.assertTrue(np.allclose(dose, edges))
+        self.assertTrue(np.allclose(dvh_volume, volume / volume[0]))
+
+        # Exact DVHs use the same weights
+        order = np.argsort(voxel_dose, kind='mergesort')
+        volume = np.cumsum(weights[order][::-1])[::-1]
+        (dose, dvh_volume), _ = compute_dvh(
+            mask=self.mask, dose=self.dose, edge_voxel_weight=weight, exact=True)
+        self.assertTrue(np.array_equal(dose, voxel_dose[order]))
+        self.assertTrue(np.allclose(dvh_volume, volume / volume[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
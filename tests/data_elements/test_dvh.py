@@ -1,10 +1,14 @@
 import base64
 import pickle
+import shutil
+import tempfile
 import unittest
 import numpy as np
 
 from oncotools.connect import Database
-from oncotools.data_elements.dvh import Dvh
+from oncotools.data_elements.image import Image
+from oncotools.data_elements.dvh import Dvh, DvhCollection, compute_dvh, compute_dvhs, cumulate_dose, cumulate_volume, \
+    dose_to_volume, volume_with_dose, sort_dose, exact_dose_to_volume, exact_volume_with_dose
 
 class TestDVH(unittest.TestCase):
     '''
@@ -61,6 +65,60 @@ class TestDVH(unittest.TestCase):
         self.assertEqual(self.dvh.data.shape[1], 2)
         self.assertGreater(self.dvh.data.shape[0], 0)
 
+    def test_read_only_views(self):
+        '''
+        DVH holds read-only views of the mask and dose grid instead of copies
+        '''
+        self.assertTrue(np.shares_memory(self.dvh.dose.data, self.dg.data))
+        self.assertFalse(self.dvh.dose.data.flags.writeable)
+        self.assertFalse(self.dvh.mask.data.flags.writeable)
+        self.assertTrue(self.dg.data.flags.writeable)
+
+        # Deep copies give the same DVH
+        dvh = Dvh(mask=self.mask, dose=self.dg, copy=True)
+        self.assertFalse(np.shares_memory(dvh.dose.data, self.dg.data))
+        self.assertTrue(np.array_equal(dvh.data, self.dvh.data))
+
+    def test_compute_dvhs(self):
+        '''
+        DVHs of several masks computed in one dose pass match the DVH of each mask
+        '''
+        edge_mask = self.mask.get_mask_edge_voxels()
+        masks = {'roi': self.mask, 'edge': edge_mask}
+        for workers in [None, 2]:
+            dvhs = compute_dvhs(self.dg, masks, workers=workers)
+            self.assertEqual(set(dvhs), set(masks))
+            self.assertTrue(np.array_equal(dvhs['roi'].data, self.dvh.data))
+            self.assertTrue(np.array_equal(
+                dvhs['edge'].data, Dvh(mask=edge_mask, dose=self.dg).data))
+
+    def test_dvh_collection(self):
+        '''
+        Metrics of a columnar DVH collection match the metrics of each DVH
+        '''
+        dvhs = [self.dvh.data, self.dvh.data[::2], [[0, 1], [100, 0.5], [200, 0]]]
+        collection = DvhCollection.from_curves(dvhs, keys={'roi': ['a', 'b', 'a']})
+        self.assertEqual(len(collection), 3)
+        self.assertTrue(np.array_equal(collection[1], self.dvh.data[::2]))
+        doses = collection.get_dose_to_volume(0.5)
+        volumes = collection.get_volume_with_dose([50, 50, 50])
+        for i, data in enumerate(dvhs):
+            data = np.asarray(data, dtype=float)
+            self.assertAlmostEqual(doses[i], dose_to_volume(data[:, 0], data[:, 1], 0.5))
+            self.assertAlmostEqual(volumes[i], volume_with_dose(data[:, 0], data[:, 1], 50))
+        self.assertEqual(collection.estimate_mean()[2], 50)
+        self.assertEqual(len(collection.select(roi='a')), 2)
+
+        # Memory-mapped copy
+        directory = tempfile.mkdtemp()
+        try:
+            collection.save(directory)
+            loaded = DvhCollection.load(directory)
+            self.assertTrue(np.array_equal(loaded.get_dose_to_volume(0.5), doses))
+            self.assertTrue(np.array_equal(loaded.keys['roi'], ['a', 'b', 'a']))
+        finally:
+            shutil.rmtree(directory)
+
     def test_dose_to_volume(self):
         '''
         Can get the dose to a volume
@@ -114,5 +172,84 @@ class TestDVH(unittest.TestCase):
         y = self.dvh.get_volume_with_dose(self.dvh.max_dose+1)
         self.assertEqual(y, 0)
 
+    def test_cumulate(self):
+        '''
+        Dose and volume bins are accumulated in place
+        '''
+        d = np.array([1.0, 2.0, 3.0])
+        self.assertTrue(cumulate_dose(d) is d)
+        self.assertTrue(np.array_equal(d, [1, 3, 6]))
+        v = np.array([1.0, 2.0, 3.0])
+        self.assertTrue(cumulate_volume(v) is v)
+        self.assertTrue(np.array_equal(v, [6, 5, 3]))
+
+    def test_compute_dvh_bin_edges(self):
+        '''
+        Can compute a DVH from an array of bin edges
+        '''
+        edges = np.linspace(0, self.dvh.dose_mask.data.max() + 1, 51)
+        (dose, volume), _ = compute_dvh(dose_mask=self.dvh.dose_mask, bins=edges)
+        self.assertTrue(np.array_equal(dose, edges))
+        self.assertEqual(volume[0], 1)
+        self.assertEqual(volume[-1], 0)
+        self.assertTrue(np.all(np.diff(volume) <= 0))
+
+    def test_compute_dvh_partial_bin_edges(self):
+        '''
+        Bin edges that do not span the dose range are normalized by the whole volume
+        '''
+        dose_mask = Image()
+        dose_mask.spacing = [2, 1, 1]
+        dose_mask.data = np.array([[[5, 15, 60, -5]]])
+        (dose, volume), _ = compute_dvh(dose_mask=dose_mask, bins=[0, 10, 20])
+        self.assertTrue(np.array_equal(dose, [0, 10, 20]))
+        self.assertTrue(np.allclose(volume, [0.75, 0.5, 0.25]))
+        (dose, volume), _ = compute_dvh(dose_mask=dose_mask, bins=[0, 10, 20], type='diff')
+        self.assertTrue(np.array_equal(volume, [2, 2, 2]))
+
+    def test_batch_metrics(self):
+        '''
+        Vectors of DVH metrics match the metrics queried one at a time
+        '''
+        volumes = [0, 0.1, 0.5, 0.9, 1]
+        doses = self.dvh.get_dose_to_volume(volumes)
+        self.assertEqual(doses.shape, (5,))
+        for v, d in zip(volumes, doses):
+            self.assertEqual(self.dvh.get_dose_to_volume(v), d)
+        self.assertTrue(np.all(np.diff(doses) <= 0))
+        fractions = self.dvh.get_volume_with_dose(doses)
+        self.assertTrue(np.all(np.diff(fractions) >= 0))
+
+    def test_metric_interpolation(self):
+        '''
+        DVH metrics are interpolated between the points of the curve
+        '''
+        dose = [0.0, 10.0, 20.0, 30.0]
+        volume = [1.0, 0.5, 0.5, 0.0]
+        self.assertEqual(dose_to_volume(dose, volume, 0.75), 5)
+        self.assertEqual(dose_to_volume(dose, volume, 0.25), 25)
+        # Highest dose received by the volume on a plateau
+        self.assertEqual(dose_to_volume(dose, volume, 0.5), 20)
+        self.assertTrue(np.array_equal(
+            volume_with_dose(dose, volume, [-1, 5, 15, 25, 31]), [1, 0.75, 0.5, 0.25, 0]))
+
+    def test_exact_metrics(self):
+        '''
+        Exact DVH metrics are looked up on the sorted voxel doses
+        '''
+        dose, weights = sort_dose([3.0, 1.0, 2.0, 2.0])
+        self.assertTrue(np.array_equal(dose, [1, 2, 2, 3]))
+        volume = cumulate_volume(weights) / len(weights)
+        self.assertTrue(np.array_equal(
+            exact_dose_to_volume(dose, volume, [0, 0.25, 0.5, 0.75, 0.8, 1]), [3, 3, 2, 2, 1, 1]))
+        self.assertTrue(np.array_equal(
+            exact_volume_with_dose(dose, volume, [0, 1, 1.5, 2, 3, 4]), [1, 1, 0.75, 0.75, 0.25, 0]))
+
+        # Every voxel is kept in the exact DVH of a mask
+        (dose, volume), _ = compute_dvh(mask=self.mask, dose=self.dg, exact=True)
+        self.assertEqual(len(dose), len(volume))
+        self.assertTrue(np.all(np.diff(dose) >= 0))
+        self.assertEqual(volume[0], 1)
+
 if __name__ == '__main__':
     unittest.main()
@@ -4,7 +4,7 @@ import unittest
 import numpy as np
 
 from oncotools.connect import Database
-from oncotools.data_elements.image import Mask
+from oncotools.data_elements.image import Mask, CroppedMask, PackedMask, SparseMask, run_length_decode
 from copy import deepcopy
 
 class TestImage(unittest.TestCase):
@@ -166,6 +166,22 @@ class TestImage(unittest.TestCase):
         len_mask = len(mask_nonzero[0])
         self.assertGreaterEqual(len_mask, len_edge)
 
+    def test_edge_cache(self):
+        '''
+        Edge voxels are cached per neighbourhood
+        '''
+        mask = deepcopy(self.test_mask)
+        edges_3d = mask.get_mask_edge_voxels()
+        edges_2d = mask.get_mask_edge_voxels(exclude_z=True)
+        self.assertIs(mask.get_mask_edge_voxels(), edges_3d)
+        self.assertIs(mask.get_mask_edge_voxels(exclude_z=True), edges_2d)
+        # In-plane edges are a subset of the 3D edges
+        self.assertFalse(np.any(np.logical_and(edges_2d.data, np.logical_not(edges_3d.data))))
+        edges = mask.get_edges(exclude_z=True)
+        self.assertEqual(edges.num_edge_voxels + edges.num_interior_voxels, mask.count_voxels())
+        self.assertEqual(len(edges.interior_indices[0]), edges.num_interior_voxels)
+        self.assertEqual(len(pickle.loads(pickle.dumps(mask))._edges), 0)
+
     def test_get_lower_bound(self):
         '''
         Get a mask's lower bound
@@ -207,6 +223,80 @@ class TestImage(unittest.TestCase):
         mask_vol1 = self.test_mask.get_volume(edge_voxel_weight=0.5)
         self.assertGreaterEqual(mask_vol0, mask_vol1)
 
+    def test_crop(self):
+        '''
+        A cropped mask only stores the bounding box, but matches the full mask
+        '''
+        cropped = self.test_mask.crop()
+        self.assertTrue(isinstance(cropped, CroppedMask))
+        self.assertLessEqual(cropped.crop_data.size, self.test_mask.data.size)
+        self.assertEqual(cropped.get_volume(), self.test_mask.get_volume())
+        self.assertTrue(np.all(cropped.center_of_mass == self.test_mask.center_of_mass))
+        self.assertTrue(np.all(cropped.data == self.test_mask.data))
+
+    def test_crop_deepcopy(self):
+        '''
+        Copying a cropped mask does not copy the full data buffer
+        '''
+        cropped = self.test_mask.crop()
+        cropped.data
+        temp_mask = deepcopy(cropped)
+        self.assertIsNone(temp_mask._data)
+        self.assertTrue(np.all(temp_mask.data == self.test_mask.data))
+
+    def test_pack(self):
+        '''
+        A bit-packed mask has the same voxels and volume as the original mask
+        '''
+        packed = self.test_mask.pack()
+        self.assertTrue(isinstance(packed, PackedMask))
+        self.assertEqual(packed.count_voxels(), len(self.test_mask.data.nonzero()[0]))
+        self.assertEqual(packed.get_volume(), self.test_mask.get_volume())
+        self.assertTrue(np.all(packed.data == (self.test_mask.data != 0)))
+
+    def test_pack_set_operations(self):
+        '''
+        Union, intersection and difference of bit-packed masks
+        '''
+        packed = self.test_mask.pack()
+        count = packed.count_voxels()
+        self.assertEqual(packed.union(self.test_mask).count_voxels(), count)
+        self.assertEqual(packed.intersection(packed).count_voxels(), count)
+        self.assertEqual(packed.difference(packed).count_voxels(), 0)
+
+        # Two different masks: the mask and a shifted copy
+        shifted = deepcopy(self.test_mask)
+        shifted.data = np.roll(shifted.data, 2, axis=2)
+        a, b = self.test_mask.data != 0, shifted.data != 0
+        other = shifted.pack()
+        self.assertTrue(np.array_equal(packed.union(other).data, np.logical_or(a, b)))
+        self.assertTrue(np.array_equal(packed.intersection(other).data, np.logical_and(a, b)))
+        self.assertTrue(np.array_equal(packed.difference(other).data, np.logical_and(a, ~b)))
+        self.assertTrue(np.array_equal(packed.union(shifted).data, np.logical_or(a, b)))
+
+    def test_run_length_round_trip(self):
+        '''
+        Encode and decode a mask into every representation
+        '''
+        runlength = self.test_mask.run_length_encode()
+        dimZYX = self.test_mask.data.shape
+        for representation in ['dense', 'cropped', 'packed', 'sparse']:
+            msk = run_length_decode(runlength, dimZYX, representation)
+            self.assertTrue(np.all((msk.data != 0) == (self.test_mask.data != 0)))
+            self.assertEqual(msk.run_length_encode(), runlength)
+
+    def test_sparsify(self):
+        '''
+        A sparse mask has the same voxels, volume and point cloud as the original mask
+        '''
+        sparse = self.test_mask.sparsify()
+        self.assertTrue(isinstance(sparse, SparseMask))
+        self.assertEqual(sparse.count_voxels(), len(self.test_mask.data.nonzero()[0]))
+        self.assertEqual(sparse.get_volume(), self.test_mask.get_volume())
+        self.assertTrue(np.all(sparse.transform_to_point_cloud() ==
+                               self.test_mask.transform_to_point_cloud()))
+        self.assertIsNone(sparse._data)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,7 @@
 import base64
 import pickle
 import unittest
+import numpy as np
 
 from oncotools.connect import Database
 from oncotools.data_elements.image import Mask
@@ -79,6 +80,16 @@ class TestRoi(unittest.TestCase):
         roi_volume = self.test_roi.get_volume()
         self.assertGreaterEqual(roi_volume, 0)
 
+    def test_get_mask_workers(self):
+        '''
+        Rasterizing the mask slices in parallel gives the same mask
+        '''
+        roi = Roi(contours=self.test_roi.contours)
+        mask = roi.get_mask()
+        roi = Roi(contours=self.test_roi.contours)
+        mask_parallel = roi.get_mask(workers=4)
+        self.assertTrue((mask.data == mask_parallel.data).all())
+
     def test_get_mask_information(self):
         '''
         Get a Mask from an ROI
@@ -102,6 +113,21 @@ class TestRoi(unittest.TestCase):
         edge_count1 = self.test_roi.count_mask_edge_voxels(exclude_z=True)
         self.assertGreaterEqual(edge_count0, edge_count1)
 
+    def test_compute_edt(self):
+        '''
+        Distances to the mask are zero inside, and signed distances are negative inside
+        '''
+        mask = self.test_roi.get_mask()
+        inside = mask.data != 0
+        edt = self.test_roi.compute_edt()
+        self.assertEqual(edt.data.shape, mask.data.shape)
+        self.assertTrue(np.all(edt.data[inside] == 0))
+        self.assertTrue(np.all(edt.data[np.logical_not(inside)] >= min(mask.spacing)))
+        signed = self.test_roi.compute_edt(signed=True, workers=2)
+        self.assertTrue(np.all(signed.data[inside] <= 0))
+        self.assertTrue(np.allclose(signed.data[np.logical_not(inside)],
+                                    edt.data[np.logical_not(inside)]))
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,54 @@
+import unittest
+import numpy as np
+
+from oncotools.data_elements.image import Mask
+from oncotools.data_elements.roi import Roi
+
+
+class TestRoiMask(unittest.TestCase):
+    '''
+    Test data elements: ROI masks from synthetic contours (no database required)
+    '''
+
+    @staticmethod
+    def ring_roi():
+        '''
+        ROI with an outer circle and a clockwise inner circle on each plane
+        '''
+        roi = Roi()
+        theta = np.linspace(0, 2 * np.pi, 40, endpoint=False)
+        for z in np.arange(0, 10, 2.5):
+            outer = 20 + 12 * np.cos(theta), 15 + 9 * np.sin(theta)
+            inner = 21 + 4 * np.cos(theta[::-1]), 14 + 3 * np.sin(theta[::-1])
+            roi.add_contour(outer[0], outer[1], [z] * theta.size)
+            roi.add_contour(inner[0], inner[1], [z] * theta.size)
+        return roi
+
+    @staticmethod
+    def template():
+        '''
+        Mask geometry covering the ROI
+        '''
+        template = Mask()
+        template.origin = np.array([6.0, 4.0, 0.0])
+        template.spacing = np.array([0.7, 0.6, 2.5])
+        template.size = np.array([41, 38, 4])
+        template.index = np.zeros(3)
+        template.update_end()
+        return template
+
+    def test_get_mask_workers(self):
+        '''
+        Rasterizing the mask slices in a pool of processes gives the same mask
+        '''
+        mask = self.ring_roi().get_mask(template=self.template())
+        mask_parallel = self.ring_roi().get_mask(template=self.template(), workers=2)
+        self.assertGreater(np.count_nonzero(mask.data), 0)
+        self.assertTrue((mask.data == mask_parallel.data).all())
+        # The inner contour removes voxels from every plane
+        self.assertFalse(mask.data[:, 17, 21].any())
+        self.assertTrue(mask.data[:, 17, 5].all())
+
+
+if __name__ == '__main__':
+    unittest.main()
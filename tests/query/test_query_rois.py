@@ -1,6 +1,7 @@
 import base64
 import pickle
 import unittest
+import numpy as np
 
 from oncotools.connect import Database
 from oncotools.data_elements.roi import Roi
@@ -206,6 +207,18 @@ class TestQueryRegionsOfInterest(unittest.TestCase):
         myROI = self.db.regions_of_interest.get_mask(res)
         self.assertTrue(isinstance(myROI, Mask))
 
+    def test_get_mask_indices(self):
+        '''
+        Get the voxel indices of a mask without decoding the full mask
+        '''
+        res = self.db.regions_of_interest.get_id_by_patient_rep_id_name(
+            self.one_roi[0], self.one_roi[1])
+        mask = self.db.regions_of_interest.get_mask(res)
+        indices = self.db.regions_of_interest.get_mask_indices(res)
+        self.assertTrue(np.all(indices == np.flatnonzero(mask.data)))
+        indices = self.db.regions_of_interest.get_mask_indices(res, zyx=True)
+        self.assertTrue(np.all(indices == np.transpose(mask.data.nonzero())))
+
     def test_get_rois_one(self):
         '''
         Get many ROI's, specifying only one
@@ -278,6 +291,34 @@ class TestQueryRegionsOfInterest(unittest.TestCase):
         self.assertTrue(isinstance(rois[list(rois.keys())[0]], list))
         self.assertTrue(isinstance(not_found, list))
 
+    def test_get_dvhs(self):
+        '''
+        Get many DVHs at once, by dose summary ID or by (session, ROI) pairs
+        '''
+        query = '''
+            SELECT TOP(3) ID, radiotherapySessionID, roiID
+            FROM RoiDoseSummaries
+            WHERE type = 'Cumulative DVH, Norm Volume'
+            ORDER BY ID
+        '''
+        rows = self.db.run(query).rows
+        by_id = self.db.regions_of_interest.get_dvhs(
+            doseSummaryIDs=[r.ID for r in rows], chunk_size=2)
+        by_pair = self.db.regions_of_interest.get_dvhs(
+            rtSessionIDs=[r.radiotherapySessionID for r in rows],
+            roiIDs=[r.roiID for r in rows])
+        self.assertTrue(np.array_equal(by_id.keys['dose_summary'], [r.ID for r in rows]))
+        self.assertTrue(np.array_equal(by_id.dose_data, by_pair.dose_data))
+        # DVHs are returned in the order of the request
+        reversed_ids = [r.ID for r in rows][::-1]
+        by_reversed_id = self.db.regions_of_interest.get_dvhs(
+            doseSummaryIDs=reversed_ids + reversed_ids[:1], chunk_size=2)
+        self.assertTrue(np.array_equal(by_reversed_id.keys['dose_summary'], reversed_ids))
+        self.assertTrue(np.array_equal(by_reversed_id[0], by_id[len(rows) - 1]))
+        for i, r in enumerate(rows):
+            single = self.db.regions_of_interest.get_dvh(doseSummaryID=r.ID).data
+            single = single[np.argsort(single[:, 0], kind='mergesort')]
+            self.assertTrue(np.allclose(by_id[i], single))
 
 if __name__ == '__main__':
     unittest.main()
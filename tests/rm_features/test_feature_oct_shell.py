@@ -228,5 +228,19 @@ class TestOctantShellsFeature(unittest.TestCase):
         except SchemaError:
             self.fail('Output does not match given schema')
 
+    def test_process_labels(self):
+        '''
+        Label map processing gives the same values as the list of masks
+        '''
+        dvh_vals = [0, 0.2, 0.4, 0.6, 0.8, 1]
+        output = OctantShellsFeature(
+            'test', mask=self.mask, dose=self.dg, expand=[0.2], dvh=dvh_vals).process()
+        label_output = OctantShellsFeature(
+            'test', mask=self.mask, dose=self.dg, expand=[0.2], dvh=dvh_vals,
+            labels=True).process()
+        self.assertEqual(output['bounds'], label_output['bounds'])
+        for key in ['mean', 'min', 'max', 'dvh']:
+            self.assertTrue(np.allclose(output[key], label_output[key]))
+
 if __name__ == '__main__':
     unittest.main()
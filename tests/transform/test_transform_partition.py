@@ -4,7 +4,7 @@ import unittest
 import numpy as np
 
 from oncotools.connect import Database
-from oncotools.data_elements.image import Mask
+from oncotools.data_elements.image import Mask, LabelMap, CroppedMask
 from oncotools import transform as tf
 
 class TestPartitionTransform(unittest.TestCase):
@@ -163,6 +163,51 @@ class TestPartitionTransform(unittest.TestCase):
             self.__slice_test_helper_1(slices, n)
             self.__slice_test_helper_2(slices, 2)
 
+    def test_label_maps(self):
+        '''
+        Label maps hold the same regions as the partition masks
+        '''
+        base_com = self.masks[0].center_of_mass
+        partitions = [
+            (tf.partition.octants_around_point, (self.masks[0], base_com)),
+            (tf.partition.halves, (self.masks[0], base_com)),
+            (tf.partition.slices, (self.masks[0], 3, 'x')),
+            (tf.partition.slices, (self.masks[0], 4, 'z'))
+        ]
+        for partition, args in partitions:
+            masks = partition(*args)
+            label_map = partition(*args, labels=True)
+            self.assertTrue(isinstance(label_map, LabelMap))
+            self.assertEqual(label_map.data.dtype, np.int8)
+            self.assertEqual(label_map.num_regions, len(masks))
+            for i, m in enumerate(masks):
+                self.assertTrue(np.array_equal(label_map.get_mask(i).data != 0, m.data != 0))
+                self.assertEqual(label_map.count_voxels()[i], m.count_voxels())
+
+    def test_views(self):
+        '''
+        Partitions are read-only views of the mask unless dense copies are requested
+        '''
+        base_com = self.masks[0].center_of_mass
+        partitions = [
+            (tf.partition.octants_around_point, (self.masks[0], base_com)),
+            (tf.partition.halves, (self.masks[0], base_com)),
+            (tf.partition.slices, (self.masks[0], 3, 'y'))
+        ]
+        for partition, args in partitions:
+            views = partition(*args)
+            copies = partition(*args, dense=True)
+            self.assertEqual(len(views), len(copies))
+            for view, copy in zip(views, copies):
+                self.assertTrue(isinstance(view, CroppedMask))
+                self.assertFalse(view.crop_data.flags.writeable)
+                self.assertEqual(view.count_voxels(), copy.count_voxels())
+                self.assertTrue(np.array_equal(view.data != 0, copy.data != 0))
+            # Writing to the full data buffer of a view leaves the mask untouched
+            count = self.masks[0].count_voxels()
+            views[0].data[...] = 0
+            self.assertEqual(self.masks[0].count_voxels(), count)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,9 +1,10 @@
 import base64
 import pickle
 import unittest
+import numpy as np
 
 from oncotools.connect import Database
-from oncotools.data_elements.image import Mask
+from oncotools.data_elements.image import Mask, LabelMap
 from oncotools import transform as tf
 
 class TestScaleTransform(unittest.TestCase):
@@ -101,6 +102,17 @@ class TestScaleTransform(unittest.TestCase):
         self.assertGreater(mask_a.get_volume(), self.masks[0].get_volume())
         self.assertEqual(mask_b.get_volume(), mask_a.get_volume())
 
+    def test_expand_6(self):
+        '''
+        Expand in one direction only
+        '''
+        mask = self.masks[0]
+        mask_a = tf.scale.expand(mask, [0, 0, 0, 0, 0, 1.0])
+        self.assertGreater(mask_a.get_volume(), mask.get_volume())
+        self.assertTrue(np.array_equal(mask_a.lower_bound, mask.lower_bound))
+        self.assertTrue(np.array_equal(mask_a.upper_bound[:2], mask.upper_bound[:2]))
+        self.assertGreater(mask_a.upper_bound[2], mask.upper_bound[2])
+
     def test_contract_1(self):
         '''
         Contract by a certain amount
@@ -158,5 +170,57 @@ class TestScaleTransform(unittest.TestCase):
         self.assertLess(mask_a.get_volume(), self.masks[0].get_volume())
         self.assertEqual(mask_b.get_volume(), mask_a.get_volume())
 
+    def test_dilate_erode(self):
+        '''
+        Dilate and erode by a number of voxels with box and ellipsoid kernels
+        '''
+        mask = self.masks[0]
+        for kernel in ('box', 'ellipsoid'):
+            dilated = tf.scale.dilate(mask, 2, kernel=kernel)
+            eroded = tf.scale.erode(mask, [1, 1, 0], kernel=kernel)
+            self.assertTrue(isinstance(dilated, Mask))
+            self.assertTrue(isinstance(eroded, Mask))
+            self.assertGreater(dilated.get_volume(), mask.get_volume())
+            self.assertLess(eroded.get_volume(), mask.get_volume())
+            self.assertFalse(np.any(np.logical_and(mask.data != 0, dilated.data == 0)))
+            self.assertFalse(np.any(np.logical_and(eroded.data != 0, mask.data == 0)))
+        box = tf.scale.dilate(mask, 1, kernel='box')
+        ellipsoid = tf.scale.dilate(mask, 1, kernel='ellipsoid')
+        self.assertGreaterEqual(box.get_volume(), ellipsoid.get_volume())
+        with self.assertRaises(ValueError):
+            tf.scale.dilate(mask, 0.5)
+
+    def test_shells_label_map(self):
+        '''
+        Shells as a label map match the list of shell masks
+        '''
+        bounds, shells = tf.scale.shells(self.masks[0], expansions=[0.5], contractions=[0.3])
+        label_bounds, label_map = tf.scale.shells(
+            self.masks[0], expansions=[0.5], contractions=[0.3], labels=True)
+        self.assertTrue(isinstance(label_map, LabelMap))
+        self.assertEqual(bounds, label_bounds)
+        self.assertEqual(label_map.get_region_names(), bounds)
+        for i, s in enumerate(shells):
+            self.assertTrue(np.array_equal(label_map.get_mask(i).data != 0, s.data != 0))
+
+    def test_shells_distance(self):
+        '''
+        Shells from a single distance map are nested like the expanded and contracted masks
+        '''
+        bounds, shells = tf.scale.shells(self.masks[0], expansions=[0.5], contractions=[0.3])
+        dist_bounds, dist_shells = tf.scale.shells(
+            self.masks[0], expansions=[0.5], contractions=[0.3], method='distance')
+        _, label_map = tf.scale.shells(
+            self.masks[0], expansions=[0.5], contractions=[0.3], labels=True, method='distance')
+        self.assertEqual(bounds, dist_bounds)
+        self.assertEqual(len(shells), len(dist_shells))
+        for i, s in enumerate(dist_shells):
+            self.assertTrue(np.array_equal(label_map.get_mask(i).data != 0, s.data != 0))
+        # The original mask is the union of the shells inside the expansion
+        inside = np.logical_or(dist_shells[1].data != 0, dist_shells[2].data != 0)
+        self.assertTrue(np.array_equal(inside, self.masks[0].data != 0))
+        with self.assertRaises(ValueError):
+            tf.scale.shells(self.masks[0], expansions=[0.5], method='unknown')
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+import numpy as np
+
+from oncotools.utils.distance import distance_transform, squared_distance_transform, \
+    signed_distance_transform
+
+
+class TestDistance(unittest.TestCase):
+    '''
+    Test utils: exact distance transforms
+    '''
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.features = rng.rand(6, 9, 11) < 0.05
+        self.features[3, 4, 5] = True
+
+    def brute_force(self, weights):
+        '''
+        Squared distances computed from every pair of voxels
+        '''
+        weights = np.asarray(weights, dtype=float)
+        grid = np.indices(self.features.shape).reshape(3, -1).T
+        offsets = grid[:, np.newaxis, :] - np.transpose(np.nonzero(self.features))[np.newaxis]
+        w = np.where(offsets < 0, weights[:, 0], weights[:, 1])
+        return ((offsets * w)**2).sum(axis=-1).min(axis=1).reshape(self.features.shape)
+
+    def test_anisotropic(self):
+        '''
+        Euclidean distances with anisotropic spacing
+        '''
+        spacing = [3.0, 1.0, 0.5]
+        dist = distance_transform(self.features, spacing)
+        expected = np.sqrt(self.brute_force([[s, s] for s in spacing]))
+        self.assertTrue(np.allclose(dist, expected))
+        self.assertTrue(np.all(dist[self.features] == 0))
+        self.assertTrue(np.array_equal(distance_transform(self.features, spacing, workers=3), dist))
+
+    def test_asymmetric(self):
+        '''
+        Different weights on either side of the feature voxels
+        '''
+        weights = [[0.5, 2.0], [1.0, 0.3], [0.7, 0.7]]
+        dist = squared_distance_transform(self.features, weights)
+        self.assertTrue(np.allclose(dist, self.brute_force(weights)))
+
+    def test_no_features(self):
+        '''
+        Without feature voxels, every voxel is infinitely far
+        '''
+        dist = distance_transform(np.zeros((3, 4, 5), dtype=bool))
+        self.assertTrue(np.all(np.isinf(dist)))
+
+    def test_signed(self):
+        '''
+        Signed distances are positive outside of a mask and negative inside
+        '''
+        inside = np.zeros((7, 7, 7), dtype=bool)
+        inside[1:6, 1:6, 1:6] = True
+        dist = signed_distance_transform(inside, [2.0, 1.0, 1.0])
+        self.assertEqual(dist[3, 3, 3], -2.0)
+        self.assertEqual(dist[1, 3, 3], 0)
+        self.assertEqual(dist[0, 3, 3], 2.0)
+        self.assertEqual(dist[3, 3, 0], 1.0)
+        self.assertTrue(np.all(dist[inside] <= 0))
+        self.assertTrue(np.all(dist[np.logical_not(inside)] > 0))
+
+if __name__ == '__main__':
+    unittest.main()
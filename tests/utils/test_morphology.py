@@ -0,0 +1,63 @@
+import unittest
+
+import numpy as np
+
+from oncotools.utils.morphology import dilate, erode
+
+
+class TestMorphology(unittest.TestCase):
+    '''
+    Test utils: binary dilation and erosion
+    '''
+
+    def setUp(self):
+        self.data = np.zeros((7, 9, 11), dtype=bool)
+        self.data[3, 4, 5] = True
+        self.block = np.zeros((7, 9, 11), dtype=bool)
+        self.block[1:6, 2:7, 2:9] = True
+
+    def test_dilate_box(self):
+        '''
+        Dilating a single voxel with a box gives the box
+        '''
+        result = dilate(self.data, [(1, 2), (0, 1), (2, 0)])
+        expected = np.zeros_like(self.data)
+        expected[2:6, 4:6, 3:6] = True
+        self.assertTrue(np.array_equal(result, expected))
+
+    def test_dilate_ellipsoid(self):
+        '''
+        Dilating a single voxel with an ellipsoid gives the ellipsoid
+        '''
+        radii = np.array([1, 2, 3])
+        result = dilate(self.data, radii, kernel='ellipsoid')
+        offsets = np.indices(self.data.shape) - np.array([3, 4, 5])[:, np.newaxis, np.newaxis, np.newaxis]
+        expected = ((offsets / radii[:, np.newaxis, np.newaxis, np.newaxis].astype(float))**2).sum(axis=0) <= 1
+        self.assertTrue(np.array_equal(result, expected))
+
+    def test_erode(self):
+        '''
+        Erosion shrinks a block on each side by the radii, and undoes dilation
+        '''
+        result = erode(self.block, [(1, 0), (0, 2), (1, 1)])
+        expected = np.zeros_like(self.block)
+        expected[2:6, 2:5, 3:8] = True
+        self.assertTrue(np.array_equal(result, expected))
+        block = np.pad(self.block, 2, mode='constant')
+        for kernel in ('box', 'ellipsoid'):
+            closed = erode(dilate(block, 2, kernel=kernel), 2, kernel=kernel)
+            self.assertTrue(np.array_equal(closed, block))
+
+    def test_invalid(self):
+        '''
+        Radii must be non-negative voxel counts
+        '''
+        with self.assertRaises(ValueError):
+            dilate(self.data, 0.5)
+        with self.assertRaises(ValueError):
+            erode(self.data, [1, -1, 1])
+        with self.assertRaises(ValueError):
+            dilate(self.data, 1, kernel='disk')
+
+if __name__ == '__main__':
+    unittest.main()
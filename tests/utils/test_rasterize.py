@@ -0,0 +1,90 @@
+import unittest
+
+import numpy as np
+
+from oncotools.utils.rasterize import rasterize_path, scanline_fill, polygon_contains_polygon
+
+
+class TestRasterize(unittest.TestCase):
+    '''
+    Test utils: scanline polygon rasterization
+    '''
+
+    def setUp(self):
+        self.square = np.array([[1.5, 1.5], [6.5, 1.5], [6.5, 4.5], [1.5, 4.5]])
+        self.hole = np.array([[2.5, 2.5], [3.5, 2.5], [3.5, 3.5], [2.5, 3.5]])
+
+    def test_fill_square(self):
+        '''
+        Fill an axis-aligned rectangle
+        '''
+        inside = scanline_fill(self.square, (8, 10))
+        expected = np.zeros((8, 10), dtype=bool)
+        expected[2:5, 2:7] = True
+        self.assertTrue(np.array_equal(inside, expected))
+
+    def test_fill_ring(self):
+        '''
+        XOR-ing an inner polygon removes it from the outer polygon
+        '''
+        inside = scanline_fill(self.square, (8, 10))
+        inside ^= scanline_fill(self.hole, (8, 10))
+        self.assertEqual(np.count_nonzero(inside), 14)
+        self.assertFalse(inside[3, 3])
+
+    def contains_points(self, path, shape, origin, spacing, radius, offset=(0, 0)):
+        '''
+        Call path.contains_points at every grid point
+        '''
+        x = origin[0] + (offset[0] + np.arange(shape[1])) * spacing[0]
+        y = origin[1] + (offset[1] + np.arange(shape[0])) * spacing[1]
+        points = np.vstack(np.meshgrid(x, y)).reshape(2, -1).T
+        return path.contains_points(points, radius=radius).reshape(shape)
+
+    def test_path(self):
+        '''
+        Rasterizing a path matches path.contains_points, with and without a radius
+        '''
+        from matplotlib.path import Path
+
+        rng = np.random.RandomState(0)
+        t = np.linspace(0, 2 * np.pi, 60, endpoint=False)
+        r = 2 + 0.5 * np.sin(3 * t) + rng.rand(t.size)
+        origin, spacing, shape = (-4.1, -3.3), (0.097, 0.12), (60, 85)
+        for direction in (1, -1):
+            path = Path(np.column_stack((r * np.cos(t), r * np.sin(t)))[::direction])
+            for radius in (0.0, 0.3, -0.3, 1.0, -1.0):
+                inside = rasterize_path(path, shape, origin, spacing, radius=radius)
+                expected = self.contains_points(path, shape, origin, spacing, radius)
+                self.assertTrue(np.array_equal(inside, expected))
+
+        # A window of the grid
+        inside = rasterize_path(path, (30, 40), origin, spacing, radius=0.3, offset=(20, 15))
+        expected = self.contains_points(path, (30, 40), origin, spacing, 0.3, offset=(20, 15))
+        self.assertTrue(np.array_equal(inside, expected))
+
+    def test_path_on_grid_points(self):
+        '''
+        Vertices mapped to grid points leave many grid points on the edges, whose
+        result matches path.contains_points
+        '''
+        from matplotlib.path import Path
+
+        origin, spacing, shape = np.array([-2.3, 1.7]), np.array([0.1, 0.3]), (20, 30)
+        t = np.linspace(0, 2 * np.pi, 40, endpoint=False)
+        index = np.rint(np.column_stack((15 + 11 * np.cos(t), 10 + 7 * np.sin(t))))
+        path = Path(origin + index * spacing)
+        for radius in (0.0, 0.2, -0.2):
+            inside = rasterize_path(path, shape, origin, spacing, radius=radius)
+            expected = self.contains_points(path, shape, origin, spacing, radius)
+            self.assertTrue(np.array_equal(inside, expected))
+
+    def test_contains(self):
+        '''
+        Check polygon containment
+        '''
+        self.assertTrue(polygon_contains_polygon(self.square, self.hole))
+        self.assertFalse(polygon_contains_polygon(self.hole, self.square))
+
+if __name__ == '__main__':
+    unittest.main()